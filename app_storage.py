@@ -0,0 +1,118 @@
+"""Module contains asynchronous access layer to the application SQLite database."""
+
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional
+
+from loguru import logger
+
+from config import APP_DB_NAME, APP_DB_SYNCHRONOUS, APP_DB_TIMEOUT
+
+
+class AsyncSQLiteDB:
+    """SQLite database accessed from coroutines.
+
+    Connection is owned by single dedicated worker thread and every operation runs there with its own cursor,
+    so disk I/O never blocks the event loop and cursor state is never shared between operations.
+    """
+
+    def __init__(self, db_name: str):
+        self._db_name = db_name
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="app-db")
+        self._connection: Optional[sqlite3.Connection] = None
+        self._executor.submit(self._connect).result()
+
+    def _connect(self) -> None:
+        logger.info(f"Opening SQLite DB '{self._db_name}'...")
+        # write transactions take the lock up front, so concurrent writers (e.g. other bot worker processes) wait
+        # for it within the timeout instead of failing on lock upgrade
+        self._connection = sqlite3.connect(self._db_name, timeout=APP_DB_TIMEOUT, isolation_level="IMMEDIATE")
+        # WAL lets readers work in parallel with a writer, NORMAL sync level skips fsync on every commit
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(f"PRAGMA synchronous={APP_DB_SYNCHRONOUS}")
+
+    def enable_incremental_auto_vacuum(self) -> None:
+        """Switches DB file to incremental auto-vacuum, so maintenance job returns free pages to the file system in
+        small steps. Switching existing DB file requires one full VACUUM, which locks the whole DB, so it is a
+        start-up step run once by the launching process before bot workers are started."""
+        self.run_sync(_enable_incremental_auto_vacuum)
+
+    def _call(self, func: Callable[..., Any], *args) -> Any:
+        return func(self._connection, *args)
+
+    def run_sync(self, func: Callable[..., Any], *args) -> Any:
+        """Runs func(connection, *args) in DB worker thread and waits for the result.
+        Intended for start-up code (e.g. schema creation) which runs before the event loop."""
+        return self._executor.submit(self._call, func, *args).result()
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """Runs func(connection, *args) in DB worker thread without blocking the event loop."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._call, func, *args)
+
+    async def fetchone(self, sql_query: str, parameters: Iterable = ()) -> Optional[tuple]:
+        return await self.run(_fetchone, sql_query, tuple(parameters))
+
+    async def fetchall(self, sql_query: str, parameters: Iterable = ()) -> List[tuple]:
+        return await self.run(_fetchall, sql_query, tuple(parameters))
+
+    async def execute(self, sql_query: str, parameters: Iterable = ()) -> int:
+        """Executes and commits modifying statement, returns number of affected rows."""
+        return await self.run(_execute, sql_query, tuple(parameters))
+
+    async def executescript(self, sql_script: str) -> None:
+        """Executes SQL script, each statement runs until completion (unlike 'execute' which steps only once for
+        statements like 'PRAGMA incremental_vacuum')."""
+        await self.run(_executescript, sql_script)
+
+    def close(self) -> None:
+        logger.info(f"Closing SQLite DB '{self._db_name}'...")
+        self._executor.submit(self._connection.close).result()
+        self._executor.shutdown(wait=True)
+
+
+def _enable_incremental_auto_vacuum(connection: sqlite3.Connection) -> None:
+    if connection.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        logger.info("Enabling incremental auto-vacuum...")
+        connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        connection.execute("VACUUM")
+
+
+def _fetchone(connection: sqlite3.Connection, sql_query: str, parameters: tuple) -> Optional[tuple]:
+    cursor = connection.cursor()
+    try:
+        return cursor.execute(sql_query, parameters).fetchone()
+    finally:
+        cursor.close()
+
+
+def _fetchall(connection: sqlite3.Connection, sql_query: str, parameters: tuple) -> List[tuple]:
+    cursor = connection.cursor()
+    try:
+        return cursor.execute(sql_query, parameters).fetchall()
+    finally:
+        cursor.close()
+
+
+def _execute(connection: sqlite3.Connection, sql_query: str, parameters: tuple) -> int:
+    cursor = connection.cursor()
+    try:
+        cursor.execute(sql_query, parameters)
+        connection.commit()
+        return cursor.rowcount
+    except sqlite3.Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def _executescript(connection: sqlite3.Connection, sql_script: str) -> None:
+    cursor = connection.cursor()
+    try:
+        cursor.executescript(sql_script)
+    finally:
+        cursor.close()
+
+
+app_storage = AsyncSQLiteDB(APP_DB_NAME)
@@ -13,8 +13,117 @@ GEOCODING_API_KEY = os.environ.get("GEOCODING_API_KEY")
 METEOMATICS_USERNAME = os.environ.get("METEOMATICS_USERNAME")
 METEOMATICS_PASSWORD = os.environ.get("METEOMATICS_PASSWORD")
 
+# "polling" or "webhook", may be overridden with '--mode' command line option
+BOT_MODE = os.environ.get("BOT_MODE", "polling")
+# public base URL Telegram sends updates to, webhook is not registered if it is empty (e.g. for local testing)
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL")
+WEBHOOK_SECRET_TOKEN = os.environ.get("WEBHOOK_SECRET_TOKEN")
+
 logger.debug("Specifying general app variables...")
 # local configuration related to the application
-APP_DB_NAME = "app_db.db"
+APP_DB_NAME = os.environ.get("APP_DB_NAME", "app_db.db")
 WEATHER_CACHE_TABLE_NAME = "weather_cache"
+WEATHER_RESPONSE_CACHE_TABLE_NAME = "weather_response_cache"
+WEATHER_HOT_KEYS_TABLE_NAME = "weather_hot_keys"
+GEOCODING_CACHE_TABLE_NAME = "geocoding_cache"
+FSM_STORAGE_TABLE_NAME = "fsm_storage"
 USER_OPTIONS_TABLE_NAME = "user_options"
+SINOPTIK_PAGES_TABLE_NAME = "sinoptik_pages"
+# SQLite 'synchronous' level used together with WAL journal mode (NORMAL is durable enough for cache data)
+APP_DB_SYNCHRONOUS = os.environ.get("APP_DB_SYNCHRONOUS", "NORMAL")
+# seconds to wait for a lock held by another connection
+APP_DB_TIMEOUT = float(os.environ.get("APP_DB_TIMEOUT", 30))
+
+# conversation (FSM) state storage: "sqlite" keeps it in the application DB across restarts, "memory" - in process
+FSM_STORAGE = os.environ.get("FSM_STORAGE", "sqlite")
+# states not updated (or, for "memory" storage, not accessed) for this number of seconds are treated as abandoned
+# and evicted
+FSM_STATE_TTL = int(os.environ.get("FSM_STATE_TTL", 24 * 3600))
+FSM_STORAGE_CACHE_SIZE = int(os.environ.get("FSM_STORAGE_CACHE_SIZE", 10000))
+# changed states are written to the DB in batches every flush interval (seconds) or once batch size is reached
+FSM_STORAGE_FLUSH_INTERVAL = float(os.environ.get("FSM_STORAGE_FLUSH_INTERVAL", 0.5))
+FSM_STORAGE_FLUSH_BATCH_SIZE = int(os.environ.get("FSM_STORAGE_FLUSH_BATCH_SIZE", 200))
+# how often (seconds) idle states are purged from memory
+FSM_STORAGE_PURGE_INTERVAL = int(os.environ.get("FSM_STORAGE_PURGE_INTERVAL", 300))
+
+# in-memory user options cache
+USER_OPTIONS_CACHE_SIZE = int(os.environ.get("USER_OPTIONS_CACHE_SIZE", 10000))
+USER_OPTIONS_CACHE_TTL = int(os.environ.get("USER_OPTIONS_CACHE_TTL", 24 * 3600))
+
+# shared HTTP session options used by async weather providers
+HTTP_REQUEST_TIMEOUT = float(os.environ.get("HTTP_REQUEST_TIMEOUT", 10))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 3))
+HTTP_CONNECTIONS_LIMIT = int(os.environ.get("HTTP_CONNECTIONS_LIMIT", 100))
+HTTP_CONNECTIONS_LIMIT_PER_HOST = int(os.environ.get("HTTP_CONNECTIONS_LIMIT_PER_HOST", 20))
+HTTP_KEEPALIVE_TIMEOUT = float(os.environ.get("HTTP_KEEPALIVE_TIMEOUT", 30))
+
+# Meteomatics API, base URL may point to a local stand-in serving recorded responses
+# (python -m weather_providers.meteomatics_stand_in)
+METEOMATICS_BASE_URL = os.environ.get("METEOMATICS_BASE_URL", "https://api.meteomatics.com")
+# locations queried in one request, e.g. when hot locations are prefetched
+METEOMATICS_MAX_LOCATIONS_PER_REQUEST = int(os.environ.get("METEOMATICS_MAX_LOCATIONS_PER_REQUEST", 50))
+# sinoptik.ua forecast pages are located by place name, names of requested locations are remembered for prefetch
+SINOPTIK_BASE_URL = os.environ.get("SINOPTIK_BASE_URL", "https://ua.sinoptik.ua")
+SINOPTIK_PAGE_NAMES_CACHE_SIZE = int(os.environ.get("SINOPTIK_PAGE_NAMES_CACHE_SIZE", 5000))
+# Sinoptik pages are named after Ukrainian place names, locations are served by the page of the nearest gazetteer
+# place having such name within max distance (km)
+SINOPTIK_PAGE_LANGUAGE = os.environ.get("SINOPTIK_PAGE_LANGUAGE", "uk")
+SINOPTIK_PLACE_MAX_DISTANCE = float(os.environ.get("SINOPTIK_PLACE_MAX_DISTANCE", 15))
+
+# webhook mode web application options
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HEALTH_PATH = os.environ.get("WEBHOOK_HEALTH_PATH", "/health")
+WEBAPP_HOST = os.environ.get("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.environ.get("WEBAPP_PORT", os.environ.get("PORT", 8080)))
+# seconds to wait for updates being processed when the app is stopped
+WEBHOOK_DRAIN_TIMEOUT = float(os.environ.get("WEBHOOK_DRAIN_TIMEOUT", 25))
+# number of worker processes in webhook mode, updates are routed between them by chat id (1 - no supervisor)
+BOT_WORKERS = int(os.environ.get("BOT_WORKERS", 1))
+BOT_WORKER_START_TIMEOUT = float(os.environ.get("BOT_WORKER_START_TIMEOUT", 60))
+
+# geocoding provider options
+GEOCODING_MAX_CONCURRENCY = int(os.environ.get("GEOCODING_MAX_CONCURRENCY", 8))
+GEOCODING_REQUEST_TIMEOUT = float(os.environ.get("GEOCODING_REQUEST_TIMEOUT", 5))
+GEOCODING_DEADLINE = float(os.environ.get("GEOCODING_DEADLINE", 8))
+# geocoding results cache, queries which produced no locations are cached for shorter time
+GEOCODING_CACHE_TTL = int(os.environ.get("GEOCODING_CACHE_TTL", 30 * 24 * 3600))
+GEOCODING_NEGATIVE_CACHE_TTL = int(os.environ.get("GEOCODING_NEGATIVE_CACHE_TTL", 24 * 3600))
+GEOCODING_MEMORY_CACHE_SIZE = int(os.environ.get("GEOCODING_MEMORY_CACHE_SIZE", 2048))
+# offline gazetteer (GeoNames dump imported with 'python -m geocoding.gazetteer import'), queried before ArcGIS
+GAZETTEER_DB_NAME = os.environ.get("GAZETTEER_DB_NAME", "gazetteer.db")
+GAZETTEER_MAX_RESULTS = int(os.environ.get("GAZETTEER_MAX_RESULTS", 10))
+# languages of place names imported from GeoNames alternate names (Ukrainian ones locate sinoptik.ua pages)
+GAZETTEER_LOCAL_NAME_LANGUAGES = os.environ.get("GAZETTEER_LOCAL_NAME_LANGUAGES", "uk").split(",")
+# shared Telegram locations are labelled with the nearest gazetteer place found within max distance (km)
+NEAREST_PLACE_GRID_STEP = float(os.environ.get("NEAREST_PLACE_GRID_STEP", 0.25))
+NEAREST_PLACE_MAX_DISTANCE = float(os.environ.get("NEAREST_PLACE_MAX_DISTANCE", 30))
+NEAREST_PLACE_MIN_POPULATION = int(os.environ.get("NEAREST_PLACE_MIN_POPULATION", 0))
+
+# weather cache options
+WEATHER_CACHE_TTL = int(os.environ.get("WEATHER_CACHE_TTL", 3600))
+WEATHER_MEMORY_CACHE_SIZE = int(os.environ.get("WEATHER_MEMORY_CACHE_SIZE", 1024))
+# rendered weather output memo, weather cache keeps language independent data rendered per user language
+WEATHER_RENDER_CACHE_SIZE = int(os.environ.get("WEATHER_RENDER_CACHE_SIZE", 2048))
+# stale records not older than TTL + grace period are returned right away and refreshed in background
+WEATHER_CACHE_STALE_WHILE_REVALIDATE = os.environ.get("WEATHER_CACHE_STALE_WHILE_REVALIDATE", "true").lower() == "true"
+WEATHER_CACHE_STALE_GRACE = int(os.environ.get("WEATHER_CACHE_STALE_GRACE", 2 * 3600))
+# background weather cache maintenance: rows older than retention period are deleted in batches
+WEATHER_CACHE_RETENTION = int(os.environ.get("WEATHER_CACHE_RETENTION", 24 * 3600))
+WEATHER_CACHE_MAINTENANCE_INTERVAL = int(os.environ.get("WEATHER_CACHE_MAINTENANCE_INTERVAL", 3600))
+WEATHER_CACHE_EVICTION_BATCH_SIZE = int(os.environ.get("WEATHER_CACHE_EVICTION_BATCH_SIZE", 500))
+WEATHER_CACHE_VACUUM_PAGES = int(os.environ.get("WEATHER_CACHE_VACUUM_PAGES", 1000))
+# prefetch of hot locations: top N most requested weather cache keys are refreshed shortly before they expire
+WEATHER_PREFETCH_ENABLED = os.environ.get("WEATHER_PREFETCH_ENABLED", "true").lower() == "true"
+WEATHER_PREFETCH_INTERVAL = int(os.environ.get("WEATHER_PREFETCH_INTERVAL", 60))
+WEATHER_PREFETCH_TOP_N = int(os.environ.get("WEATHER_PREFETCH_TOP_N", 50))
+WEATHER_PREFETCH_LEAD_TIME = int(os.environ.get("WEATHER_PREFETCH_LEAD_TIME", 300))
+# keys with lower current score (about number of requests within the last hot keys half-life) are not prefetched
+WEATHER_PREFETCH_MIN_SCORE = float(os.environ.get("WEATHER_PREFETCH_MIN_SCORE", 2))
+# max number of provider calls made by one prefetch run
+WEATHER_PREFETCH_CALLS_BUDGET = int(os.environ.get("WEATHER_PREFETCH_CALLS_BUDGET", 10))
+WEATHER_HOT_KEYS_HALF_LIFE = int(os.environ.get("WEATHER_HOT_KEYS_HALF_LIFE", 12 * 3600))
+WEATHER_HOT_KEYS_MAX = int(os.environ.get("WEATHER_HOT_KEYS_MAX", 5000))
+# saved hot keys which were not requested for this long are removed (score drops over 1000 times in 10 half-lives)
+WEATHER_HOT_KEYS_RETENTION = int(os.environ.get("WEATHER_HOT_KEYS_RETENTION", 10 * WEATHER_HOT_KEYS_HALF_LIFE))
+# size of the grid cell (in degrees) locations are snapped to for weather cache keys and provider requests
+WEATHER_CACHE_GRID_STEP = float(os.environ.get("WEATHER_CACHE_GRID_STEP", 0.05))
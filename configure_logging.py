@@ -15,7 +15,8 @@ def configure_logger() -> None:
     # Add the arguments to the parser
     ap.add_argument("--level", required=False, help="Logging level to set.")
     logger.debug("Getting list of arguments passed to app on startup")
-    args = vars(ap.parse_args())
+    # other options (e.g. '--mode') are parsed by main module
+    args = vars(ap.parse_known_args()[0])
     logger.debug(f"Lst of arguments passed to app on startup: {args}")
     logger.info("Configuring application logger level...")
     # logger options
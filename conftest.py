@@ -0,0 +1,10 @@
+"""Pytest configuration: tests use temporary application DB instead of 'app_db.db' in the working directory."""
+
+import os
+import tempfile
+
+# set before application modules are imported, as they open the application DB on import
+os.environ["APP_DB_NAME"] = os.path.join(tempfile.mkdtemp(prefix="weather-bot-tests-"), "app_db.db")
+
+# legacy python-telegram-bot script, it is not a test module
+collect_ignore = ["test_main.py"]
@@ -0,0 +1,309 @@
+"""Module contains aiogram FSM storage which keeps conversation states in the application SQLite database."""
+
+import asyncio
+import copy
+import json
+import sqlite3
+import sys
+import time
+import typing
+from typing import Dict, Optional, Tuple
+
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram.dispatcher.storage import BaseStorage
+from loguru import logger
+
+from app_storage import AsyncSQLiteDB
+from config import FSM_STORAGE_TABLE_NAME, FSM_STATE_TTL, FSM_STORAGE_CACHE_SIZE, FSM_STORAGE_FLUSH_INTERVAL, \
+    FSM_STORAGE_FLUSH_BATCH_SIZE, FSM_STORAGE_PURGE_INTERVAL
+from geocoding.geocoding_utils import LocationPoint
+from weather_cache.memory_cache import LRUTTLCache
+
+# (state, data, bucket, timestamp of the last change)
+FSMRecord = Tuple[Optional[str], dict, dict, int]
+LOCATION_POINT_TAG = "@lp"
+
+
+def _encode_value(value: typing.Any) -> typing.Any:
+    if isinstance(value, LocationPoint):
+        return {LOCATION_POINT_TAG: [value.lat_lon, value.address]}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode_value(value: dict) -> typing.Any:
+    if LOCATION_POINT_TAG in value:
+        lat_lon, address = value[LOCATION_POINT_TAG]
+        return LocationPoint(lat_lon=lat_lon, address=address)
+    return value
+
+
+def dump_fsm_data(data: dict) -> str:
+    """Serializes FSM data into compact JSON, LocationPoint items are stored as [lat_lon, address] pairs."""
+    return json.dumps(data, default=_encode_value, ensure_ascii=False, separators=(",", ":"))
+
+
+def load_fsm_data(raw_data: Optional[str]) -> dict:
+    return json.loads(raw_data, object_hook=_decode_value) if raw_data else {}
+
+
+def approximate_size(value: typing.Any) -> int:
+    """Returns approximate number of bytes taken by value together with nested containers and LocationPoint items."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approximate_size(key) + approximate_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(approximate_size(item) for item in value)
+    elif isinstance(value, LocationPoint):
+        size += approximate_size(value.lat_lon) + approximate_size(value.address)
+    return size
+
+
+class ExpiringMemoryStorage(MemoryStorage):
+    """aiogram MemoryStorage which forgets states not accessed for 'ttl' seconds, so abandoned conversations
+    (e.g. location choice user never made) do not pile up in memory."""
+
+    def __init__(self, ttl: int = FSM_STATE_TTL):
+        super().__init__()
+        self._ttl = ttl
+        self._last_access: Dict[Tuple[str, str], float] = {}
+        self._last_purge = time.time()
+
+    def resolve_address(self, chat, user):
+        chat, user = super().resolve_address(chat, user)
+        timestamp = time.time()
+        self._last_access[(chat, user)] = timestamp
+        if timestamp - self._last_purge > FSM_STORAGE_PURGE_INTERVAL:
+            self.purge_expired(timestamp)
+        return chat, user
+
+    def purge_expired(self, timestamp: float) -> int:
+        """Drops states idle for longer than ttl, returns number of dropped states."""
+        self._last_purge = timestamp
+        expired_keys = [key for key, accessed_at in self._last_access.items() if timestamp - accessed_at > self._ttl]
+        for chat, user in expired_keys:
+            del self._last_access[(chat, user)]
+            chat_data = self.data.get(chat, {})
+            chat_data.pop(user, None)
+            if not chat_data:
+                self.data.pop(chat, None)
+        if expired_keys:
+            logger.debug(f"Purged {len(expired_keys)} idle FSM states.")
+        # purge runs every FSM_STORAGE_PURGE_INTERVAL while bot is used, so storage size is reported periodically
+        log_fsm_storage_stats(self)
+        return len(expired_keys)
+
+    def stats(self) -> dict:
+        """Returns number of live states and approximate memory they take."""
+        return {"entries": len(self._last_access),
+                "approx_bytes": approximate_size(self.data) + approximate_size(self._last_access)}
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM storage backed by FSM_STORAGE_TABLE_NAME table of the application DB.
+
+    Reads are served from in-memory LRU tier, changes are kept pending and written in batches by background task,
+    so handlers never wait for disk. States not changed for FSM_STATE_TTL seconds are treated as abandoned.
+    Cached states are not invalidated by other processes, so a chat must be served by a single process at a time
+    (see 'workers_supervisor').
+    """
+
+    def __init__(self, storage: AsyncSQLiteDB, ttl: int = FSM_STATE_TTL):
+        self._storage = storage
+        self._ttl = ttl
+        self._cache = LRUTTLCache(max_size=FSM_STORAGE_CACHE_SIZE, ttl=ttl, name="fsm storage")
+        # pending changes, None means record should be deleted
+        self._pending: Dict[Tuple[str, str], Optional[FSMRecord]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_requested: Optional[asyncio.Event] = None
+        self._last_purge = time.time()
+        # records changed before this timestamp are deleted from the DB with the next flush
+        self._purge_before: Optional[int] = None
+        self._closed = False
+        self._storage.run_sync(self._create_table)
+
+    @staticmethod
+    def _create_table(connection: sqlite3.Connection) -> None:
+        connection.execute(
+            f"""CREATE TABLE IF NOT EXISTS {FSM_STORAGE_TABLE_NAME} (CHAT TEXT, USER TEXT, STATE TEXT, DATA TEXT,
+            BUCKET TEXT, TIMESTAMP INTEGER, PRIMARY KEY (CHAT, USER))""")
+        connection.execute(f"""CREATE INDEX IF NOT EXISTS {FSM_STORAGE_TABLE_NAME}_timestamp_idx
+        ON {FSM_STORAGE_TABLE_NAME} (TIMESTAMP)""")
+        connection.commit()
+
+    def _resolve_key(self, chat: typing.Union[str, int, None], user: typing.Union[str, int, None]) -> Tuple[str, str]:
+        chat, user = self.check_address(chat=chat, user=user)
+        return str(chat), str(user)
+
+    async def _get_record(self, key: Tuple[str, str]) -> FSMRecord:
+        timestamp = int(time.time())
+        if timestamp - self._last_purge > FSM_STORAGE_PURGE_INTERVAL:
+            self._last_purge = timestamp
+            self._cache.purge_expired(timestamp)
+            self._purge_before = timestamp - self._ttl
+            self._schedule_flush()
+            log_fsm_storage_stats(self)
+        if key in self._pending:
+            record = self._pending[key]
+        else:
+            record = self._cache.get(key, current_timestamp=timestamp)
+            if record is None:
+                record = await self._load_record(key, timestamp)
+        if record is None or timestamp - record[3] > self._ttl:
+            return None, {}, {}, timestamp
+        return record
+
+    async def _load_record(self, key: Tuple[str, str], timestamp: int) -> FSMRecord:
+        row = await self._storage.fetchone(
+            f"SELECT STATE, DATA, BUCKET, TIMESTAMP from {FSM_STORAGE_TABLE_NAME} WHERE CHAT = ? AND USER = ?", key)
+        if row is None:
+            # absence of state is cached too, most updates come from users without active conversation
+            record = (None, {}, {}, timestamp)
+        else:
+            state, raw_data, raw_bucket, changed_at = row
+            record = (state, load_fsm_data(raw_data), load_fsm_data(raw_bucket), changed_at)
+        self._cache.set(key, record, timestamp=record[3])
+        return record
+
+    def _set_record(self, key: Tuple[str, str], state: Optional[str], data: dict, bucket: dict) -> None:
+        timestamp = int(time.time())
+        record = (state, data, bucket, timestamp)
+        self._cache.set(key, record, timestamp=timestamp)
+        self._pending[key] = None if state is None and not data and not bucket else record
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self._closed:
+            # the DB may be closed already, changes made after close are kept in memory only
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_requested = asyncio.Event()
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_loop())
+        if len(self._pending) >= FSM_STORAGE_FLUSH_BATCH_SIZE:
+            self._flush_requested.set()
+
+    async def _flush_loop(self) -> None:
+        while self._pending or self._purge_before is not None:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=FSM_STORAGE_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                await self.flush()
+            except Exception as err:
+                logger.error(f"Failed to write FSM states into the DB, retrying later.\n{err}")
+
+    async def flush(self) -> None:
+        """Writes all pending changes to the DB in a single transaction, abandoned states are deleted with them."""
+        if not self._pending and self._purge_before is None:
+            return
+        pending, self._pending = self._pending, {}
+        purge_before, self._purge_before = self._purge_before, None
+        upserts = [(*key, record[0], dump_fsm_data(record[1]), dump_fsm_data(record[2]), record[3])
+                   for key, record in pending.items() if record is not None]
+        deletes = [key for key, record in pending.items() if record is None]
+        try:
+            purged = await self._storage.run(_write_fsm_records, upserts, deletes, purge_before)
+        except Exception:
+            # keep changes made meanwhile, they are newer than the failed ones
+            self._pending = {**pending, **self._pending}
+            if self._purge_before is None:
+                self._purge_before = purge_before
+            raise
+        logger.debug(f"Flushed {len(upserts)} FSM states, deleted {len(deletes)}, purged {purged} abandoned ones.")
+
+    def stats(self) -> dict:
+        """Returns number of states held in memory, not yet flushed ones and approximate memory states take."""
+        # pending records are the same objects as cached ones
+        records = list(self._cache.values())
+        return {"entries": len(self._cache), "pending": len(self._pending), "approx_bytes": approximate_size(records)}
+
+    async def close(self):
+        """Writes pending changes, must be called before the application DB is closed. Later calls do nothing (e.g.
+        aiogram polling executor closes the storage once more after 'on_shutdown' callback closed the DB)."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    async def wait_closed(self):
+        pass
+
+    async def get_state(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                        default: typing.Optional[str] = None) -> typing.Optional[str]:
+        state = (await self._get_record(self._resolve_key(chat, user)))[0]
+        return state if state is not None else self.resolve_state(default)
+
+    async def get_data(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[dict] = None) -> typing.Dict:
+        return copy.deepcopy((await self._get_record(self._resolve_key(chat, user)))[1])
+
+    async def set_state(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                        state: typing.AnyStr = None):
+        key = self._resolve_key(chat, user)
+        _, data, bucket, _ = await self._get_record(key)
+        self._set_record(key, self.resolve_state(state), data, bucket)
+
+    async def set_data(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                       data: typing.Dict = None):
+        key = self._resolve_key(chat, user)
+        state, _, bucket, _ = await self._get_record(key)
+        self._set_record(key, state, copy.deepcopy(data or {}), bucket)
+
+    async def update_data(self, *, chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None, data: typing.Dict = None, **kwargs):
+        key = self._resolve_key(chat, user)
+        state, current_data, bucket, _ = await self._get_record(key)
+        self._set_record(key, state, {**current_data, **copy.deepcopy(data or {}), **kwargs}, bucket)
+
+    def has_bucket(self):
+        return True
+
+    async def get_bucket(self, *, chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         default: typing.Optional[dict] = None) -> typing.Dict:
+        return copy.deepcopy((await self._get_record(self._resolve_key(chat, user)))[2])
+
+    async def set_bucket(self, *, chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None, bucket: typing.Dict = None):
+        key = self._resolve_key(chat, user)
+        state, data, _, _ = await self._get_record(key)
+        self._set_record(key, state, data, copy.deepcopy(bucket or {}))
+
+    async def update_bucket(self, *, chat: typing.Union[str, int, None] = None,
+                            user: typing.Union[str, int, None] = None, bucket: typing.Dict = None, **kwargs):
+        key = self._resolve_key(chat, user)
+        state, data, current_bucket, _ = await self._get_record(key)
+        self._set_record(key, state, data, {**current_bucket, **copy.deepcopy(bucket or {}), **kwargs})
+
+
+def _write_fsm_records(connection: sqlite3.Connection, upserts: list, deletes: list,
+                       purge_before: Optional[int] = None) -> int:
+    """Writes FSM records changes, deletes records changed before 'purge_before' timestamp if it is provided and
+    returns their number."""
+    purged = 0
+    try:
+        connection.executemany(
+            f"""INSERT into {FSM_STORAGE_TABLE_NAME} values (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (CHAT, USER) DO UPDATE SET STATE = excluded.STATE, DATA = excluded.DATA,
+            BUCKET = excluded.BUCKET, TIMESTAMP = excluded.TIMESTAMP""", upserts)
+        connection.executemany(f"DELETE FROM {FSM_STORAGE_TABLE_NAME} WHERE CHAT = ? AND USER = ?", deletes)
+        if purge_before is not None:
+            purged = connection.execute(f"DELETE FROM {FSM_STORAGE_TABLE_NAME} WHERE TIMESTAMP < ?",
+                                        (purge_before,)).rowcount
+        connection.commit()
+    except sqlite3.Error:
+        connection.rollback()
+        raise
+    return purged
+
+
+def log_fsm_storage_stats(storage: BaseStorage) -> None:
+    """Logs size of FSM storage, storages log it on every purge and bot logs it on shutdown."""
+    if hasattr(storage, "stats"):
+        stats = storage.stats()
+        logger.info(f"FSM storage holds {stats['entries']} states in memory, "
+                    f"approximately {stats['approx_bytes'] / 1024:.1f} KiB.")
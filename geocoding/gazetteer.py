@@ -0,0 +1,320 @@
+"""Contains offline gazetteer: GeoNames populated places dump imported into read-only SQLite FTS5 index, so most
+geocoding queries are answered locally and ArcGIS is called only for misses.
+
+Usage:
+    python -m geocoding.gazetteer import cities500.txt [--admin1-codes admin1CodesASCII.txt] [--min-population N]
+        [--alternate-names alternateNamesV2.txt] [--languages uk]
+    python -m geocoding.gazetteer stats
+    python -m geocoding.gazetteer bench Київ Odesa Lviv [--repeat 1000] [--arcgis]
+"""
+
+import argparse
+import csv
+import math
+import os
+import resource
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from config import GAZETTEER_DB_NAME, GAZETTEER_MAX_RESULTS, GAZETTEER_LOCAL_NAME_LANGUAGES
+from geocoding.geocoding_cache import normalize_geocoding_query
+
+PLACES_TABLE_NAME = "places"
+PLACE_NAMES_TABLE_NAME = "place_names"
+# place names in particular languages (e.g. Ukrainian ones used to locate sinoptik.ua pages)
+LOCAL_NAMES_TABLE_NAME = "local_names"
+# GeoNames populated places feature codes which are not actual settlements (historical, abandoned, destroyed, sections)
+EXCLUDED_FEATURE_CODES = {"PPLH", "PPLQ", "PPLW", "PPLX", "PPLCH"}
+IMPORT_BATCH_SIZE = 10000
+KM_PER_DEGREE = math.pi * 6371.0 / 180
+
+
+@dataclass(frozen=True)
+class GazetteerPlace:
+    name: str
+    admin1: str
+    country_code: str
+    latitude: float
+    longitude: float
+    population: int
+
+    @property
+    def address(self) -> str:
+        return ", ".join(item for item in (self.name, self.admin1, self.country_code) if item)
+
+
+class Gazetteer:
+    f"""Read-only lookup over gazetteer SQLite db ('{GAZETTEER_DB_NAME}' by default). Every thread gets its own
+    connection, lookups return nothing if the db was not imported."""
+
+    def __init__(self, db_name: str):
+        self._db_name = db_name
+        self._thread_local = threading.local()
+
+    @property
+    def available(self) -> bool:
+        return os.path.exists(self._db_name)
+
+    def _get_connection(self) -> sqlite3.Connection:
+        connection = getattr(self._thread_local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(f"file:{self._db_name}?mode=ro", uri=True)
+            self._thread_local.connection = connection
+        return connection
+
+    def find_places(self, query: str, limit: int = GAZETTEER_MAX_RESULTS) -> List[GazetteerPlace]:
+        """Returns places having any name (including alternate and localized ones) equal to normalized query, the
+        most populated first. Empty list means the query should be resolved by online geocoding provider."""
+        if not self.available:
+            return []
+        query = normalize_geocoding_query(query)
+        if not query:
+            return []
+        # FTS phrase match narrows candidates by name tokens, exact normalized name equality decides the hit
+        sql_query = f"""SELECT {PLACE_NAMES_TABLE_NAME}.NAME, ADMIN1, COUNTRY_CODE, LATITUDE, LONGITUDE, POPULATION
+        FROM {PLACE_NAMES_TABLE_NAME} JOIN {PLACES_TABLE_NAME} USING (GEONAMEID)
+        WHERE {PLACE_NAMES_TABLE_NAME} MATCH ? AND NORMALIZED_NAME = ?
+        GROUP BY GEONAMEID ORDER BY POPULATION DESC LIMIT ?"""
+        match_query = '"' + query.replace('"', '""') + '"'
+        try:
+            rows = self._get_connection().execute(sql_query, (match_query, query, limit)).fetchall()
+        except sqlite3.Error as err:
+            logger.error(f"Failed to look up '{query}' in the gazetteer.\n{err}")
+            return []
+        return [GazetteerPlace(*row) for row in rows]
+
+    def find_local_place(self, latitude: float, longitude: float, language: str,
+                         max_distance: float) -> Optional[GazetteerPlace]:
+        """Returns the nearest place within 'max_distance' kilometers which has name in 'language', the place is
+        labelled with that name. None means there is no such place or local names were not imported."""
+        if not self.available:
+            return None
+        lat_delta = max_distance / KM_PER_DEGREE
+        # degrees of longitude shrink towards the poles, distances are compared on equirectangular projection
+        lon_scale = max(math.cos(math.radians(latitude)), 1e-6)
+        lon_delta = lat_delta / lon_scale
+        sql_query = f"""SELECT {LOCAL_NAMES_TABLE_NAME}.NAME, ADMIN1, COUNTRY_CODE, LATITUDE, LONGITUDE, POPULATION
+        FROM {PLACES_TABLE_NAME} JOIN {LOCAL_NAMES_TABLE_NAME} USING (GEONAMEID)
+        WHERE LANGUAGE = ? AND LATITUDE BETWEEN ? AND ? AND LONGITUDE BETWEEN ? AND ?
+        ORDER BY (LATITUDE - ?) * (LATITUDE - ?) + (LONGITUDE - ?) * (LONGITUDE - ?) * ? LIMIT 1"""
+        parameters = (language, latitude - lat_delta, latitude + lat_delta, longitude - lon_delta,
+                      longitude + lon_delta, latitude, latitude, longitude, longitude, lon_scale * lon_scale)
+        try:
+            row = self._get_connection().execute(sql_query, parameters).fetchone()
+        except sqlite3.Error as err:
+            logger.error(f"Failed to look up place with '{language}' name near {latitude},{longitude} in the "
+                         f"gazetteer.\n{err}")
+            return None
+        if row is None:
+            return None
+        place = GazetteerPlace(*row)
+        distance = math.hypot(place.latitude - latitude, (place.longitude - longitude) * lon_scale) * KM_PER_DEGREE
+        return place if distance <= max_distance else None
+
+    def iter_places(self, min_population: int = 0) -> Iterator[GazetteerPlace]:
+        """Yields all places with at least 'min_population' inhabitants labelled with their primary names."""
+        sql_query = f"""SELECT NAME, ADMIN1, COUNTRY_CODE, LATITUDE, LONGITUDE, POPULATION FROM {PLACES_TABLE_NAME}
+        WHERE POPULATION >= ?"""
+        for row in self._get_connection().execute(sql_query, (min_population,)):
+            yield GazetteerPlace(*row)
+
+    def stats(self) -> dict:
+        """Returns number of indexed places and names together with db file size figures."""
+        connection = self._get_connection()
+        report = {}
+        for table_name in (PLACES_TABLE_NAME, PLACE_NAMES_TABLE_NAME, LOCAL_NAMES_TABLE_NAME):
+            try:
+                report[table_name] = connection.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+            except sqlite3.OperationalError:
+                # gazetteer imported before local names were kept
+                report[table_name] = 0
+        page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+        cache_size = connection.execute("PRAGMA cache_size").fetchone()[0]
+        report["db_size_bytes"] = os.path.getsize(self._db_name)
+        # page cache is the only memory lookups hold, it is bounded per connection (negative 'cache_size' is in KiB)
+        report["page_cache_limit_bytes"] = -cache_size * 1024 if cache_size < 0 else cache_size * page_size
+        return report
+
+
+gazetteer = Gazetteer(GAZETTEER_DB_NAME)
+
+
+def read_admin1_codes(file_name: str) -> Dict[str, str]:
+    """Reads GeoNames 'admin1CodesASCII.txt' into {"UA.12": "Kyiv City"} mapping."""
+    with open(file_name, encoding="utf-8") as admin1_file:
+        return {row[0]: row[1] for row in csv.reader(admin1_file, delimiter="\t", quoting=csv.QUOTE_NONE)
+                if len(row) > 1}
+
+
+def read_geonames_places(file_name: str, min_population: int = 0) -> Iterator[list]:
+    """Yields populated places rows of GeoNames dump (e.g. 'cities500.txt' or country 'UA.txt' file)."""
+    with open(file_name, encoding="utf-8") as geonames_file:
+        for row in csv.reader(geonames_file, delimiter="\t", quoting=csv.QUOTE_NONE):
+            if len(row) < 15 or row[6] != "P" or row[7] in EXCLUDED_FEATURE_CODES:
+                continue
+            if int(row[14] or 0) < min_population:
+                continue
+            yield row
+
+
+def read_local_names(file_name: str, geoname_ids: Set[int],
+                     languages: Iterable[str]) -> Iterator[Tuple[int, str, str]]:
+    """Yields (geoname id, language, name) of places from GeoNames alternate names file ('alternateNamesV2.txt' or
+    country file of 'alternatenames' directory) in 'languages', one name per place and language. Preferred name
+    is taken if place has several ones, colloquial and historic names are skipped."""
+    languages = set(languages)
+    local_names: Dict[Tuple[int, str], Tuple[bool, str]] = {}
+    with open(file_name, encoding="utf-8") as alternate_names_file:
+        for row in csv.reader(alternate_names_file, delimiter="\t", quoting=csv.QUOTE_NONE):
+            if len(row) < 8 or row[2] not in languages or row[6] == "1" or row[7] == "1":
+                continue
+            geoname_id = int(row[1])
+            if geoname_id not in geoname_ids:
+                continue
+            key, is_preferred = (geoname_id, row[2]), row[4] == "1"
+            if key not in local_names or is_preferred and not local_names[key][0]:
+                local_names[key] = (is_preferred, row[3].strip())
+    for (geoname_id, language), (_, name) in local_names.items():
+        yield geoname_id, language, name
+
+
+def import_gazetteer(file_name: str, db_name: str = GAZETTEER_DB_NAME, admin1_codes_file: Optional[str] = None,
+                     min_population: int = 0, alternate_names_file: Optional[str] = None,
+                     languages: Iterable[str] = GAZETTEER_LOCAL_NAME_LANGUAGES) -> dict:
+    """Builds gazetteer db from GeoNames dump next to the current one and atomically replaces it, so running bot
+    keeps serving lookups during import. Names in 'languages' are imported from 'alternate_names_file' if it is
+    provided. Returns number of imported places and names."""
+    admin1_codes = read_admin1_codes(admin1_codes_file) if admin1_codes_file else {}
+    tmp_db_name = f"{db_name}.tmp"
+    if os.path.exists(tmp_db_name):
+        os.remove(tmp_db_name)
+    connection = sqlite3.connect(tmp_db_name)
+    places_count = names_count = local_names_count = 0
+    geoname_ids = set()
+    try:
+        connection.executescript(f"""PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;
+        CREATE TABLE {PLACES_TABLE_NAME} (GEONAMEID INTEGER PRIMARY KEY, NAME TEXT, ADMIN1 TEXT, COUNTRY_CODE TEXT,
+        LATITUDE REAL, LONGITUDE REAL, POPULATION INTEGER);
+        CREATE INDEX {PLACES_TABLE_NAME}_latitude_idx ON {PLACES_TABLE_NAME} (LATITUDE);
+        CREATE VIRTUAL TABLE {PLACE_NAMES_TABLE_NAME} USING fts5(NAME, NORMALIZED_NAME UNINDEXED,
+        GEONAMEID UNINDEXED, tokenize = "unicode61 remove_diacritics 2");
+        CREATE TABLE {LOCAL_NAMES_TABLE_NAME} (GEONAMEID INTEGER, LANGUAGE TEXT, NAME TEXT,
+        PRIMARY KEY (GEONAMEID, LANGUAGE)) WITHOUT ROWID;""")
+        places, names = [], []
+        for row in read_geonames_places(file_name, min_population):
+            geoname_id, country_code = int(row[0]), row[8]
+            geoname_ids.add(geoname_id)
+            places.append((geoname_id, row[1], admin1_codes.get(f"{country_code}.{row[10]}", ""), country_code,
+                           float(row[4]), float(row[5]), int(row[14] or 0)))
+            place_names = {}
+            for name in (row[1], row[2], *row[3].split(",")):
+                normalized_name = normalize_geocoding_query(name)
+                if normalized_name and normalized_name not in place_names:
+                    place_names[normalized_name] = name.strip()
+            names.extend((name, normalized_name, geoname_id) for normalized_name, name in place_names.items())
+            if len(places) >= IMPORT_BATCH_SIZE:
+                places_count, names_count = __write_batch(connection, places, names, places_count, names_count)
+        places_count, names_count = __write_batch(connection, places, names, places_count, names_count)
+        if alternate_names_file:
+            connection.executemany(f"INSERT INTO {LOCAL_NAMES_TABLE_NAME} values (?, ?, ?)",
+                                   read_local_names(alternate_names_file, geoname_ids, languages))
+            local_names_count = connection.execute(f"SELECT COUNT(*) FROM {LOCAL_NAMES_TABLE_NAME}").fetchone()[0]
+        connection.execute(f"INSERT INTO {PLACE_NAMES_TABLE_NAME}({PLACE_NAMES_TABLE_NAME}) VALUES('optimize')")
+        connection.commit()
+        connection.execute("VACUUM")
+    finally:
+        connection.close()
+    os.replace(tmp_db_name, db_name)
+    report = {"places": places_count, "names": names_count, "local_names": local_names_count,
+              "db_size_bytes": os.path.getsize(db_name)}
+    logger.info(f"Gazetteer '{db_name}' is imported from '{file_name}': {report}")
+    return report
+
+
+def __write_batch(connection: sqlite3.Connection, places: list, names: list, places_count: int,
+                  names_count: int) -> tuple:
+    connection.executemany(f"INSERT OR REPLACE INTO {PLACES_TABLE_NAME} values (?, ?, ?, ?, ?, ?, ?)", places)
+    connection.executemany(f"INSERT INTO {PLACE_NAMES_TABLE_NAME} values (?, ?, ?)", names)
+    connection.commit()
+    places_count, names_count = places_count + len(places), names_count + len(names)
+    places.clear()
+    names.clear()
+    return places_count, names_count
+
+
+def __percentiles(timings: List[float]) -> str:
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    return f"median {statistics.median(timings) * 1e6:.1f} us, p95 {p95 * 1e6:.1f} us"
+
+
+def benchmark_lookups(queries: List[str], repeat: int = 1000, with_arcgis: bool = False) -> None:
+    """Prints gazetteer lookup latency per query. With 'with_arcgis' it also measures live ArcGIS request and the
+    local filtering/parsing of its response done by 'get_available_location_options'."""
+    import geocoder
+    from geocoding import geocoding_utils
+
+    for query in queries:
+        timings = []
+        places = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            places = gazetteer.find_places(query)
+            timings.append(time.perf_counter() - start)
+        print(f"{query!r}: gazetteer {len(places)} places, {__percentiles(timings)}")
+        if not with_arcgis:
+            continue
+        start = time.perf_counter()
+        raw_response = geocoder.arcgis(location=query, maxRows=10)
+        request_time = time.perf_counter() - start
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            filtered_result = geocoding_utils.__filter_geo_locations(raw_response)
+            geocoding_utils.__parse_raw_geo_output(geocoding_utils.__filter_location_duplicates(filtered_result))
+            timings.append(time.perf_counter() - start)
+        print(f"{query!r}: arcgis request {request_time * 1e3:.1f} ms, filter and parse {__percentiles(timings)}")
+    # ru_maxrss is reported in KiB on Linux
+    print(f"max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss} KiB")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m geocoding.gazetteer", description="Offline gazetteer tools.")
+    parser.add_argument("--db", default=GAZETTEER_DB_NAME, help="gazetteer db file name")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="import GeoNames dump")
+    import_parser.add_argument("file_name")
+    import_parser.add_argument("--admin1-codes", help="GeoNames 'admin1CodesASCII.txt' file")
+    import_parser.add_argument("--min-population", type=int, default=0)
+    import_parser.add_argument("--alternate-names", help="GeoNames 'alternateNamesV2.txt' (or country) file")
+    import_parser.add_argument("--languages", nargs="+", default=GAZETTEER_LOCAL_NAME_LANGUAGES,
+                               help="languages of imported alternate names")
+    subparsers.add_parser("stats", help="print gazetteer size figures")
+    bench_parser = subparsers.add_parser("bench", help="measure lookup latency")
+    bench_parser.add_argument("queries", nargs="+")
+    bench_parser.add_argument("--repeat", type=int, default=1000)
+    bench_parser.add_argument("--arcgis", action="store_true", help="compare with live ArcGIS lookups")
+    args = parser.parse_args(argv)
+
+    global gazetteer
+    gazetteer = Gazetteer(args.db)
+    if args.command == "import":
+        print(import_gazetteer(args.file_name, args.db, args.admin1_codes, args.min_population, args.alternate_names,
+                               args.languages))
+    elif not gazetteer.available:
+        sys.exit(f"Gazetteer '{args.db}' is not imported yet.")
+    elif args.command == "stats":
+        print(gazetteer.stats())
+    else:
+        benchmark_lookups(args.queries, args.repeat, args.arcgis)
+
+
+if __name__ == "__main__":
+    main()
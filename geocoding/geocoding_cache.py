@@ -0,0 +1,97 @@
+"""Contains persistent cache of geocoding results keyed by normalized query text."""
+
+import json
+import sqlite3
+import unicodedata
+from typing import Optional, Tuple
+
+from loguru import logger
+
+from app_storage import AsyncSQLiteDB, app_storage
+from config import APP_DB_NAME, GEOCODING_CACHE_TABLE_NAME, GEOCODING_CACHE_TTL, GEOCODING_NEGATIVE_CACHE_TTL, \
+    GEOCODING_MEMORY_CACHE_SIZE
+from weather_cache.memory_cache import LRUTTLCache
+
+# (lat_lon, address) pairs of locations found for the query
+CachedLocations = Tuple[Tuple[str, str], ...]
+
+
+class GeocodingCacheDB:
+    f"""Class to initialize geocoding cache table '{GEOCODING_CACHE_TABLE_NAME}' in the application SQLite db
+    '{APP_DB_NAME}'. Queries which produced no locations are stored with NULL locations."""
+
+    def __init__(self, storage: AsyncSQLiteDB):
+        self._storage = storage
+        self._storage.run_sync(self._create_table)
+
+    @property
+    def storage(self) -> AsyncSQLiteDB:
+        return self._storage
+
+    @staticmethod
+    def _create_table(connection: sqlite3.Connection) -> None:
+        logger.debug(f"Creating geocoding cache '{GEOCODING_CACHE_TABLE_NAME}' table if it is absent...")
+        connection.execute(
+            f"""CREATE TABLE IF NOT EXISTS {GEOCODING_CACHE_TABLE_NAME} (QUERY TEXT PRIMARY KEY, TIMESTAMP INTEGER,
+            LOCATIONS TEXT)""")
+        connection.execute(f"""CREATE INDEX IF NOT EXISTS {GEOCODING_CACHE_TABLE_NAME}_timestamp_idx
+        ON {GEOCODING_CACHE_TABLE_NAME} (TIMESTAMP)""")
+        connection.commit()
+
+
+geocoding_db = GeocodingCacheDB(app_storage)
+geocoding_memory_cache = LRUTTLCache(max_size=GEOCODING_MEMORY_CACHE_SIZE, ttl=GEOCODING_CACHE_TTL,
+                                     name="geocoding cache")
+
+
+def normalize_geocoding_query(query: str) -> str:
+    """Returns Unicode-normalized, case-folded query with collapsed whitespaces, so "  КИЇВ " and "київ" share
+    the same cache key."""
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+async def check_geocoding_cache(query: str, timestamp: int) -> Tuple[bool, Optional[CachedLocations]]:
+    """Looks up normalized query in memory and DB tiers. Returns (True, locations) for cached result, (True, None)
+    for cached query which produced no locations and (False, None) if query is not cached. Cache failures are
+    treated as misses."""
+    result = geocoding_memory_cache.get(query, current_timestamp=timestamp)
+    if result is not None:
+        return True, result or None
+    try:
+        row = await geocoding_db.storage.fetchone(
+            f"SELECT TIMESTAMP, LOCATIONS from {GEOCODING_CACHE_TABLE_NAME} WHERE QUERY = ?", (query,))
+    except Exception as err:
+        logger.error(f"Failed to get geocoding result from the DB.\n {err}")
+        return False, None
+    if not row:
+        return False, None
+    cached_at, raw_locations = row
+    ttl = GEOCODING_CACHE_TTL if raw_locations is not None else GEOCODING_NEGATIVE_CACHE_TTL
+    if int(timestamp) - int(cached_at) > ttl:
+        logger.debug(f"Cached geocoding result for query '{query}' is expired.")
+        return False, None
+    locations = tuple(tuple(item) for item in json.loads(raw_locations)) if raw_locations is not None else ()
+    geocoding_memory_cache.set(query, locations, timestamp=cached_at, ttl=ttl)
+    return True, locations or None
+
+
+async def update_geocoding_cache(query: str, locations: Optional[CachedLocations], timestamp: int) -> None:
+    """Stores locations found for normalized query, None stands for query which produced no locations."""
+    if locations:
+        geocoding_memory_cache.set(query, locations, timestamp=timestamp)
+        raw_locations = json.dumps(locations, ensure_ascii=False)
+    else:
+        # empty tuple marks negative result in memory, so it is distinguishable from a miss
+        geocoding_memory_cache.set(query, (), timestamp=timestamp, ttl=GEOCODING_NEGATIVE_CACHE_TTL)
+        raw_locations = None
+    try:
+        await geocoding_db.storage.execute(
+            f"""INSERT into {GEOCODING_CACHE_TABLE_NAME} values (?, ?, ?)
+            ON CONFLICT (QUERY) DO UPDATE SET TIMESTAMP = excluded.TIMESTAMP, LOCATIONS = excluded.LOCATIONS""",
+            (query, timestamp, raw_locations))
+    except Exception as err:
+        logger.error(f"Failed to write geocoding result into the DB.\n {err}")
+
+
+def log_geocoding_cache_stats() -> None:
+    geocoding_memory_cache.log_stats()
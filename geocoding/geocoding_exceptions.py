@@ -11,3 +11,7 @@ class UnableToLocateCoordinates(GeneralGeocodingError):
 
 class GeocodingDataParseError(GeneralGeocodingError):
     """Failed to parse raw geo data from geocoding provider."""
+
+
+class GeocodingTimeoutError(GeneralGeocodingError):
+    """Geocoding provider did not respond within configured deadline."""
@@ -1,30 +1,190 @@
 """Module contains data to work with positionstack.com API resource."""
 
+import asyncio
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from decimal import Decimal
 from typing import Tuple, Optional, List
 
 import geocoder
+import requests
 from loguru import logger
 
-from geocoding.geocoding_exceptions import GeneralGeocodingError, UnableToLocateCoordinates, GeocodingDataParseError
+from config import GEOCODING_MAX_CONCURRENCY, GEOCODING_REQUEST_TIMEOUT, GEOCODING_DEADLINE, WEATHER_CACHE_GRID_STEP
+from geocoding.geocoding_exceptions import GeneralGeocodingError, UnableToLocateCoordinates, \
+    GeocodingDataParseError, GeocodingTimeoutError
+from geocoding.gazetteer import gazetteer, GazetteerPlace
+from geocoding.nearest_place import find_nearest_place_name
+from geocoding.geocoding_cache import normalize_geocoding_query, check_geocoding_cache, update_geocoding_cache
+from weather_cache.single_flight import SingleFlight
+
+# dedicated pool for blocking geocoder calls, so they never run on the event loop thread
+_geocoding_executor = ThreadPoolExecutor(max_workers=GEOCODING_MAX_CONCURRENCY, thread_name_prefix="geocoding")
+_geocoding_semaphore: Optional[asyncio.Semaphore] = None
+# one keep-alive HTTP session per executor thread
+_thread_local = threading.local()
+# concurrent lookups of the same normalized query share one geocoder call
+geocoding_flights = SingleFlight(name="geocoding")
+
+
+# legacy "46.58807000000007-30.941290000000038" lat-lon format, kept to read previously stored values
+LEGACY_LAT_LON_PATTERN = re.compile(r"^(-?\d+(?:\.\d+)?)-(-?\d+(?:\.\d+)?)$")
+# regular expression matching lat-lon string produced by 'Coordinates.lat_lon'
+LAT_LON_PATTERN = r"^-?\d{1,2}(\.\d+)?,-?\d{1,3}(\.\d+)?$"
+COORDINATES_PRECISION = 5
+
+
+@dataclass(frozen=True)
+class Coordinates:
+    """Canonical WGS-84 coordinates of location, serialized into "46.58807,30.94129" lat-lon string."""
+    latitude: float
+    longitude: float
+
+    @classmethod
+    def from_lat_lon(cls, lat_lon: str) -> "Coordinates":
+        """Parses lat-lon string in canonical or legacy format, raises GeocodingDataParseError if it is malformed."""
+        legacy_match = LEGACY_LAT_LON_PATTERN.match(lat_lon)
+        raw_data = legacy_match.groups() if legacy_match else lat_lon.split(",")
+        try:
+            latitude, longitude = (float(item) for item in raw_data)
+        except ValueError:
+            raise GeocodingDataParseError(f"Unable to parse latitude and longitude from '{lat_lon}'")
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise GeocodingDataParseError(f"Latitude and longitude are out of range: '{lat_lon}'")
+        return cls(latitude=latitude, longitude=longitude)
+
+    @property
+    def lat_lon(self) -> str:
+        return self.format(COORDINATES_PRECISION)
+
+    def format(self, precision: int) -> str:
+        return f"{self.latitude:.{precision}f},{self.longitude:.{precision}f}"
+
+    def quantize(self, grid_step: float = WEATHER_CACHE_GRID_STEP) -> "Coordinates":
+        """Returns coordinates snapped to the centre of fixed-size grid cell, so nearby locations share the same
+        cache key."""
+        latitude = min(90.0, max(-90.0, round(self.latitude / grid_step) * grid_step))
+        longitude = round(self.longitude / grid_step) * grid_step
+        if longitude >= 180:
+            longitude -= 360
+        precision = max(0, -Decimal(str(grid_step)).as_tuple().exponent)
+        return Coordinates(latitude=round(latitude, precision) + 0.0, longitude=round(longitude, precision) + 0.0)
+
+    def quantized_lat_lon(self, grid_step: float = WEATHER_CACHE_GRID_STEP) -> str:
+        """Returns lat-lon string of the grid cell containing these coordinates, used as weather cache key."""
+        precision = max(0, -Decimal(str(grid_step)).as_tuple().exponent)
+        return self.quantize(grid_step).format(precision)
 
 
 @dataclass
 class LocationPoint:
+    # up to 10 points per search are kept in conversation state until user picks one, slots keep them small
+    __slots__ = ("lat_lon", "address")
     lat_lon: str
     address: str
 
 
+async def fetch_available_location_options(city_name: str) -> List[LocationPoint]:
+    """Asynchronously returns list of available options from geocoding provider by supplied city name.
+
+    Results (including queries which produced no locations) are cached by normalized query text. Blocking geocoder
+    call runs in dedicated executor, number of simultaneous calls is limited by GEOCODING_MAX_CONCURRENCY and whole
+    lookup (including waiting for a free slot) by GEOCODING_DEADLINE seconds.
+    """
+    query = normalize_geocoding_query(city_name)
+    timestamp = int(time.time())
+    is_cached, locations = await check_geocoding_cache(query, timestamp)
+    if not is_cached:
+        locations = await geocoding_flights.do(query, __fetch_and_cache_locations, query, timestamp)
+    if not locations:
+        raise UnableToLocateCoordinates(f"No locations were found for city name '{city_name}'.")
+    logger.debug(f"Found {len(locations)} location options for query '{query}'.")
+    return [LocationPoint(lat_lon=lat_lon, address=address) for lat_lon, address in locations]
+
+
+async def __fetch_and_cache_locations(query: str, timestamp: int) -> Optional[Tuple[Tuple[str, str], ...]]:
+    loop = asyncio.get_running_loop()
+    try:
+        location_points = await asyncio.wait_for(__run_limited(loop, query), timeout=GEOCODING_DEADLINE)
+    except asyncio.TimeoutError:
+        err_msg = f"Geocoding provider did not respond in {GEOCODING_DEADLINE} seconds for city name '{query}'."
+        logger.error(err_msg)
+        raise GeocodingTimeoutError(err_msg)
+    except UnableToLocateCoordinates:
+        await update_geocoding_cache(query, None, timestamp)
+        return None
+    locations = tuple((location.lat_lon, location.address) for location in location_points)
+    await update_geocoding_cache(query, locations, timestamp)
+    return locations
+
+
+async def fetch_nearest_location(latitude: float, longitude: float) -> LocationPoint:
+    """Returns location point of shared position snapped to weather cache grid and labelled with the nearest known
+    place (or its coordinates if there is no such place), no geocoding provider is called."""
+    coordinates = Coordinates(latitude=latitude, longitude=longitude)
+    loop = asyncio.get_running_loop()
+    address = await loop.run_in_executor(_geocoding_executor, find_nearest_place_name, latitude, longitude)
+    return LocationPoint(lat_lon=coordinates.quantize().lat_lon, address=address or coordinates.lat_lon)
+
+
+async def fetch_local_place(latitude: float, longitude: float, language: str,
+                            max_distance: float) -> Optional[GazetteerPlace]:
+    """Returns the nearest gazetteer place having name in 'language' (labelled with that name), None if there is no
+    such place within 'max_distance' kilometers."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_geocoding_executor, gazetteer.find_local_place, latitude, longitude, language,
+                                      max_distance)
+
+
+async def __run_limited(loop: asyncio.AbstractEventLoop, city_name: str) -> List[LocationPoint]:
+    global _geocoding_semaphore
+    if _geocoding_semaphore is None:
+        _geocoding_semaphore = asyncio.Semaphore(GEOCODING_MAX_CONCURRENCY)
+    async with _geocoding_semaphore:
+        return await loop.run_in_executor(_geocoding_executor, get_available_location_options, city_name)
+
+
+def shutdown_geocoding_executor() -> None:
+    """Stops geocoding executor, should be called on bot shutdown."""
+    _geocoding_executor.shutdown(wait=False)
+
+
+def __get_requests_session() -> requests.Session:
+    """Returns HTTP session bound to current thread."""
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        _thread_local.session = session
+    return session
+
+
 def get_available_location_options(city_name: str) -> List[LocationPoint]:
-    """Returns list of available options from geocoding provider by supplied city name"""
+    """Returns list of available options by supplied city name (blocking call). Offline gazetteer is queried first,
+    geocoding provider is called only if the city name is not present there."""
+    gazetteer_places = gazetteer.find_places(city_name)
+    if gazetteer_places:
+        logger.debug(f"City name '{city_name}' is found in the gazetteer.")
+        return __parse_gazetteer_output(gazetteer_places)
     try:
-        raw_response = geocoder.arcgis(location=city_name, maxRows=10)
+        raw_response = geocoder.arcgis(location=city_name, maxRows=10, timeout=GEOCODING_REQUEST_TIMEOUT,
+                                       session=__get_requests_session())
+    except requests.Timeout as err:
+        logger.error(err)
+        raise GeocodingTimeoutError("Geocoding provider request timed out.")
     except Exception as err:
         logger.error(err)
         raise GeneralGeocodingError("Failed to get response from geocoding provider.")
     if not raw_response.ok:
         logger.error(raw_response.status)
-        raise UnableToLocateCoordinates(f"Response status is not 'OK': {raw_response.status}")
+        if "timed out" in str(raw_response.status):
+            raise GeocodingTimeoutError(f"Geocoding provider request timed out: {raw_response.status}")
+        if "No results" in str(raw_response.status):
+            raise UnableToLocateCoordinates(f"Response status is not 'OK': {raw_response.status}")
+        # provider side failures must not be cached as locations absence
+        raise GeneralGeocodingError(f"Response status is not 'OK': {raw_response.status}")
     filtered_result = __filter_geo_locations(raw_response)
     if not filtered_result:
         err_msg = f"Response status is 'OK': but filtered list of available locations for city name '{city_name}' " \
@@ -37,13 +197,10 @@ def get_available_location_options(city_name: str) -> List[LocationPoint]:
 
 def get_lat_lon_from_attribute(lat_lon: str) -> Optional[Tuple[str, str]]:
     """Returns tuple of latitude and longitude in WGS-84 decimal format for provided lat-lon argument"""
-    # Using ArcGis as a geocoding provider
-    # Maximum number of available locations limited to 10 for more convenience
-
-    raw_data = lat_lon.split("-")
-    latitude = raw_data[0]
-    longitude = raw_data[1]
-    logger.info(f"Latitude is: '{latitude}', Longitude is: '{longitude}'")
+    coordinates = Coordinates.from_lat_lon(lat_lon)
+    latitude = repr(coordinates.latitude)
+    longitude = repr(coordinates.longitude)
+    logger.debug(f"Latitude is: '{latitude}', Longitude is: '{longitude}'")
     return latitude, longitude
 
 
@@ -71,7 +228,8 @@ def __parse_raw_geo_output(raw_geo_list) -> List[LocationPoint]:
     try:
         for item in raw_geo_list:
             location_points_list.append(
-                LocationPoint(lat_lon=f"{item['properties']['lat']}-{item['properties']['lng']}",
+                LocationPoint(lat_lon=Coordinates(latitude=item['properties']['lat'],
+                                                  longitude=item['properties']['lng']).lat_lon,
                               address=item['properties']["address"]))
     except Exception as exception:
         err_msg = f"Failed to parse raw geolocation data to 'LocationPoint' structure\n{exception}"
@@ -80,6 +238,16 @@ def __parse_raw_geo_output(raw_geo_list) -> List[LocationPoint]:
     return location_points_list
 
 
+def __parse_gazetteer_output(gazetteer_places: List[GazetteerPlace]) -> List[LocationPoint]:
+    """Converts gazetteer places into list of LocationPoint elements dropping places with the same coordinates."""
+    location_points_list = []
+    for place in gazetteer_places:
+        lat_lon = Coordinates(latitude=place.latitude, longitude=place.longitude).lat_lon
+        if lat_lon not in (location.lat_lon for location in location_points_list):
+            location_points_list.append(LocationPoint(lat_lon=lat_lon, address=place.address))
+    return location_points_list
+
+
 def __get_locations_geometry(geo_list: List[dict]) -> List[list]:
     """Method to filters out list of available geolocations"""
     if not geo_list:
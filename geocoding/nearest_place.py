@@ -0,0 +1,97 @@
+"""Contains in-memory grid index over gazetteer places used to label shared locations with the nearest city name
+without external geocoding calls."""
+
+import math
+import threading
+from array import array
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from config import NEAREST_PLACE_GRID_STEP, NEAREST_PLACE_MAX_DISTANCE, NEAREST_PLACE_MIN_POPULATION
+from geocoding.gazetteer import gazetteer
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_distance(latitude: float, longitude: float, other_latitude: float, other_longitude: float) -> float:
+    """Returns great-circle distance between two points in kilometers."""
+    lat, other_lat = math.radians(latitude), math.radians(other_latitude)
+    half_chord = math.sin((other_lat - lat) / 2) ** 2 + \
+        math.cos(lat) * math.cos(other_lat) * math.sin(math.radians(other_longitude - longitude) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(half_chord)))
+
+
+class PlacesGridIndex:
+    """Uniform latitude-longitude grid of places. Nearest place lookup scans only cells overlapping the bounding box
+    of the search radius, coordinates are kept in flat arrays to keep memory footprint low."""
+
+    def __init__(self, grid_step: float = NEAREST_PLACE_GRID_STEP):
+        self._grid_step = grid_step
+        self._columns = math.ceil(360 / grid_step)
+        self._cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        self._latitudes = array("d")
+        self._longitudes = array("d")
+        self._labels: List[str] = []
+
+    def __len__(self):
+        return len(self._labels)
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return math.floor(latitude / self._grid_step), math.floor(longitude / self._grid_step) % self._columns
+
+    def add(self, latitude: float, longitude: float, label: str) -> None:
+        self._cells[self._cell(latitude, longitude)].append(len(self._labels))
+        self._latitudes.append(latitude)
+        self._longitudes.append(longitude)
+        self._labels.append(label)
+
+    def nearest(self, latitude: float, longitude: float,
+                max_distance: float = NEAREST_PLACE_MAX_DISTANCE) -> Optional[Tuple[str, float]]:
+        """Returns label of the nearest place within 'max_distance' kilometers and distance to it."""
+        lat_delta = max_distance / KM_PER_DEGREE
+        lon_delta = min(180.0, lat_delta / max(math.cos(math.radians(min(90.0, abs(latitude) + lat_delta))), 1e-6))
+        first_row, first_column = self._cell(latitude - lat_delta, longitude - lon_delta)
+        last_row = self._cell(latitude + lat_delta, longitude)[0]
+        columns_count = min(self._columns, math.floor(2 * lon_delta / self._grid_step) + 2)
+        best_index, best_distance = None, max_distance
+        for row in range(first_row, last_row + 1):
+            for column_offset in range(columns_count):
+                for index in self._cells.get((row, (first_column + column_offset) % self._columns), ()):
+                    distance = haversine_distance(latitude, longitude, self._latitudes[index], self._longitudes[index])
+                    if distance <= best_distance:
+                        best_index, best_distance = index, distance
+        if best_index is None:
+            return None
+        return self._labels[best_index], best_distance
+
+
+_places_index: Optional[PlacesGridIndex] = None
+_places_index_lock = threading.Lock()
+
+
+def get_places_index() -> PlacesGridIndex:
+    """Builds grid index from gazetteer places on first call (blocking), returns empty index if gazetteer was not
+    imported."""
+    global _places_index
+    with _places_index_lock:
+        if _places_index is None:
+            places_index = PlacesGridIndex()
+            if gazetteer.available:
+                for place in gazetteer.iter_places(NEAREST_PLACE_MIN_POPULATION):
+                    places_index.add(place.latitude, place.longitude, place.address)
+            logger.info(f"Nearest place grid index is built with {len(places_index)} places.")
+            _places_index = places_index
+    return _places_index
+
+
+def find_nearest_place_name(latitude: float, longitude: float) -> Optional[str]:
+    """Returns address of the nearest known place or None if there is no place within NEAREST_PLACE_MAX_DISTANCE."""
+    result = get_places_index().nearest(latitude, longitude)
+    if result is None:
+        return None
+    label, distance = result
+    logger.debug(f"Nearest place to {latitude},{longitude} is '{label}' in {distance:.1f} km.")
+    return label
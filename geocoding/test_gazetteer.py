@@ -0,0 +1,49 @@
+from geocoding.gazetteer import Gazetteer, import_gazetteer
+
+# GeoNames dump rows: geonameid, name, asciiname, alternatenames, latitude, longitude, feature class and code,
+# country code, cc2, admin1 code, admin2-4 codes, population, elevation, dem, timezone, modification date
+PLACES = [
+    ("703448", "Kyiv", "Kyiv", "Kiev,Київ", "50.45466", "30.5238", "P", "PPLC", "UA", "", "12", "", "", "",
+     "2797553", "", "187", "Europe/Kyiv", "2022-05-05"),
+    ("698740", "Odesa", "Odesa", "Odessa,Одеса", "46.47747", "30.73262", "P", "PPLA", "UA", "", "17", "", "", "",
+     "1015826", "", "45", "Europe/Kyiv", "2022-05-05"),
+    ("703446", "Kyiv Suburb", "Kyiv Suburb", "", "50.50000", "30.6000", "P", "PPL", "UA", "", "12", "", "", "",
+     "1000", "", "100", "Europe/Kyiv", "2022-05-05"),
+]
+# alternate names rows: id, geonameid, language, name, preferred, short, colloquial, historic
+ALTERNATE_NAMES = [
+    ("1", "703448", "uk", "Київ", "1", "", "", ""),
+    ("2", "703448", "uk", "Кыёв", "", "", "1", ""),
+    ("3", "703448", "ru", "Киев", "", "", "", ""),
+    ("4", "698740", "uk", "Одеса", "", "", "", ""),
+    ("5", "698740", "uk", "Хаджибей", "", "", "", "1"),
+    ("6", "1", "uk", "Невідоме", "", "", "", ""),
+]
+
+
+def _write_rows(path, rows) -> str:
+    path.write_text("".join("\t".join(row) + "\n" for row in rows), encoding="utf-8")
+    return str(path)
+
+
+def test_nearest_place_is_labelled_with_local_name(tmp_path):
+    db_name = str(tmp_path / "gazetteer.db")
+    report = import_gazetteer(_write_rows(tmp_path / "UA.txt", PLACES), db_name,
+                              alternate_names_file=_write_rows(tmp_path / "alternateNames.txt", ALTERNATE_NAMES),
+                              languages=["uk"])
+    assert report["local_names"] == 2
+    gazetteer = Gazetteer(db_name)
+    # the suburb is closer but has no Ukrainian name
+    place = gazetteer.find_local_place(50.49, 30.59, "uk", max_distance=15)
+    assert (place.name, place.latitude, place.longitude) == ("Київ", 50.45466, 30.5238)
+    assert gazetteer.find_local_place(46.48, 30.74, "uk", max_distance=15).name == "Одеса"
+    assert gazetteer.find_local_place(48.0, 35.0, "uk", max_distance=15) is None
+    # names in languages which were not imported are skipped
+    assert gazetteer.find_local_place(50.49, 30.59, "ru", max_distance=15) is None
+
+
+def test_gazetteer_without_local_names_finds_nothing(tmp_path):
+    db_name = str(tmp_path / "gazetteer.db")
+    import_gazetteer(_write_rows(tmp_path / "UA.txt", PLACES), db_name)
+    assert Gazetteer(db_name).find_local_place(50.45, 30.52, "uk", max_distance=15) is None
+    assert Gazetteer(str(tmp_path / "missing.db")).find_local_place(50.45, 30.52, "uk", max_distance=15) is None
@@ -1,7 +1,7 @@
 from aiogram import types
 from loguru import logger
 
-from bot_init import get_all_user_ids
+from bot_init import is_user_registered
 from general_symbols import GeneralEmojis
 from handlers.user_options_handlers import settings
 
@@ -21,7 +21,7 @@ async def start(message: types.Message):
     logger.debug("Handling '/start' command...")
     chat_id = message.chat.id
     logger.debug(f"Checking if user with id '{chat_id}' present in the DB...")
-    if chat_id in get_all_user_ids():
+    if await is_user_registered(chat_id):
         # move to forecast view
         logger.debug("deleting command ...")
         await message.delete()
@@ -6,7 +6,7 @@ from aiogram.dispatcher.filters import Text, Regexp
 from aiogram.dispatcher.filters.state import State, StatesGroup
 
 from bot_init import get_user_data
-from geocoding.geocoding_utils import get_available_location_options
+from geocoding.geocoding_utils import fetch_available_location_options, fetch_nearest_location, LAT_LON_PATTERN
 from keyboards.general_keyboards import weather_forecast_type_keyboard, city_specification_items_keyboard
 from weather_operations import compile_weather_output
 
@@ -29,7 +29,7 @@ async def general_text_handler(message: types.Message, state=None):
     """Handles all messages from user."""
     message_text = message.text
     await message.delete()
-    available_location_options = get_available_location_options(message_text)
+    available_location_options = await fetch_available_location_options(message_text)
     if len(available_location_options) > 1:
         keyboard = city_specification_items_keyboard(available_location_options)
         await FSMWeatherConditions.lat_lon.set()
@@ -46,6 +46,19 @@ async def general_text_handler(message: types.Message, state=None):
         await FSMWeatherConditions.forecast_type.set()
 
 
+async def location_message_handler(message: types.Message, state=None):
+    """Handles location shared by user, skips city name lookup and goes straight to forecast type choice."""
+    location_point = await fetch_nearest_location(latitude=message.location.latitude,
+                                                  longitude=message.location.longitude)
+    await message.delete()
+    async with state.proxy() as data:
+        data['lat_lon'] = location_point.lat_lon
+        data["address"] = location_point.address
+    keyboard = weather_forecast_type_keyboard()
+    await message.answer(text=location_point.address, reply_markup=keyboard)
+    await FSMWeatherConditions.forecast_type.set()
+
+
 async def location_choice_handler(callback_query: types.CallbackQuery, state=FSMContext):
     """Handles user choice of location on FSMWeatherConditions.lat_lon state."""
     # chat_id = callback_query.message.chat.id
@@ -61,24 +74,27 @@ async def location_choice_handler(callback_query: types.CallbackQuery, state=FSM
 async def weather_choice_handler(callback_query: types.CallbackQuery, state=FSMContext):
     """Handles user choice of weather forecast on FSMWeatherConditions.forecast_type state."""
     chat_id = callback_query.message.chat.id
-    user_data = get_user_data(chat_id)
+    user_data = await get_user_data(chat_id)
     await callback_query.message.delete_reply_markup()
     async with state.proxy() as data:
         data['forecast_type'] = callback_query.data
     weather_options = data._data
     await state.finish()
-    weather_text = compile_weather_output(city_name=weather_options.get("address"),
-                                          weather_provider_name=user_data[2],
-                                          lat_lon=weather_options.get("lat_lon"),
-                                          forecast_type=weather_options.get("forecast_type"))
+    weather_text = await compile_weather_output(city_name=weather_options.get("address"),
+                                                weather_provider_name=user_data[2],
+                                                lat_lon=weather_options.get("lat_lon"),
+                                                forecast_type=weather_options.get("forecast_type"),
+                                                language=user_data[1])
     await callback_query.bot.send_message(text=weather_text, chat_id=chat_id)
 
 
 def register_general_handlers(dispatcher: "Dispatcher"):
     """Registers all general handlers."""
     dispatcher.register_callback_query_handler(location_choice_handler,
-                                               Regexp(regexp=r"\d{2}.\d.*-\d{2}.\d.*"),
+                                               Regexp(regexp=LAT_LON_PATTERN),
                                                state=FSMWeatherConditions.lat_lon)
     dispatcher.register_callback_query_handler(weather_choice_handler, Text(startswith="_forecast_weather_"),
                                                state=FSMWeatherConditions.forecast_type)
+    dispatcher.register_message_handler(location_message_handler, content_types=types.ContentType.LOCATION,
+                                        state=None)
     dispatcher.register_message_handler(general_text_handler, state=None)
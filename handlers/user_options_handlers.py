@@ -42,7 +42,7 @@ async def select_weather_provides(callback_data: types.CallbackQuery, state=FSMC
     async with state.proxy() as data:
         data['weather_provider'] = callback_data.data
     async with state.proxy() as data:
-        write_user_data(user_id=callback_data.message.chat.id, user_data=data)
+        await write_user_data(user_id=callback_data.message.chat.id, user_data=data)
     await state.finish()
     await callback_data.message.edit_text("Налаштування закінчено!", reply_markup=None)
     await handlers.commands_handlers.start(callback_data.message)
@@ -0,0 +1,39 @@
+"""Module contains single long-lived aiohttp session shared by all async weather providers."""
+
+from typing import Optional
+
+import aiohttp
+from loguru import logger
+
+from config import HTTP_REQUEST_TIMEOUT, HTTP_CONNECT_TIMEOUT, HTTP_CONNECTIONS_LIMIT, \
+    HTTP_CONNECTIONS_LIMIT_PER_HOST, HTTP_KEEPALIVE_TIMEOUT
+
+_http_session: Optional[aiohttp.ClientSession] = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Returns shared aiohttp session, creates it on the first call.
+
+    Session keeps connections alive between requests and limits total and per-host number of open connections,
+    so provider round-trips reuse sockets instead of opening new ones each time.
+    Must be called from the running event loop.
+    """
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        logger.info("Creating shared HTTP client session...")
+        connector = aiohttp.TCPConnector(limit=HTTP_CONNECTIONS_LIMIT,
+                                         limit_per_host=HTTP_CONNECTIONS_LIMIT_PER_HOST,
+                                         keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+                                         ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=HTTP_REQUEST_TIMEOUT, sock_connect=HTTP_CONNECT_TIMEOUT)
+        _http_session = aiohttp.ClientSession(connector=connector, timeout=timeout, raise_for_status=False)
+    return _http_session
+
+
+async def close_http_session() -> None:
+    """Closes shared aiohttp session, should be called on bot shutdown."""
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        logger.info("Closing shared HTTP client session...")
+        await _http_session.close()
+    _http_session = None
@@ -1,15 +1,54 @@
+import argparse
+from functools import partial
+
 from aiogram import executor
 from loguru import logger
+from app_storage import app_storage
+from config import WEATHER_PREFETCH_ENABLED, BOT_MODE, BOT_WORKERS
 from configure_logging import configure_logger
 from bot_init import dp
+from fsm_storage import log_fsm_storage_stats
+from geocoding.geocoding_cache import log_geocoding_cache_stats
+from geocoding.geocoding_utils import shutdown_geocoding_executor
 from handlers import user_options_handlers, commands_handlers, general_handlers, error_handlers
+from http_session import close_http_session
+from weather_cache.weather_cache_maintenance import start_weather_cache_maintenance, stop_weather_cache_maintenance
+from weather_cache.weather_cache_utils import log_weather_cache_stats
+from weather_operations import log_weather_operations_stats, cancel_weather_refreshes
+from weather_prefetch import start_weather_prefetch, stop_weather_prefetch
+from webhook_app import run_webhook
+from workers_supervisor import run_supervisor
 
 logger.remove(0)
 configure_logger()
 
 
-async def on_startup(_):
+async def on_startup(_, background_jobs: bool = True):
+    """'background_jobs' is False for all bot worker processes except the first one, so cache maintenance and
+    prefetch do not run several times, other workers only save their hot weather cache keys."""
     logger.info("Bot went Online!!!")
+    if background_jobs:
+        start_weather_cache_maintenance()
+    if WEATHER_PREFETCH_ENABLED:
+        start_weather_prefetch(prefetch=background_jobs)
+
+
+async def on_shutdown(_, background_jobs: bool = True):
+    logger.info("Bot is going Offline...")
+    if background_jobs:
+        await stop_weather_cache_maintenance()
+    if WEATHER_PREFETCH_ENABLED:
+        await stop_weather_prefetch()
+    await cancel_weather_refreshes()
+    await close_http_session()
+    shutdown_geocoding_executor()
+    log_weather_cache_stats()
+    log_weather_operations_stats()
+    log_geocoding_cache_stats()
+    log_fsm_storage_stats(dp.storage)
+    # pending conversation states are written before the DB is closed
+    await dp.storage.close()
+    app_storage.close()
 
 
 error_handlers.register_error_handlers(dp)
@@ -18,10 +57,30 @@ user_options_handlers.register_user_options_handlers(dp)
 general_handlers.register_general_handlers(dp)
 
 
-def launch_bot():
-    logger.info("Launching the bot...")
-    executor.start_polling(dispatcher=dp, skip_updates=True, on_startup=on_startup)
+def launch_worker(index: int, socket_path: str):
+    """Entry point of bot worker process serving updates routed by supervisor."""
+    background_jobs = index == 0
+    run_webhook(dispatcher=dp, on_startup=partial(on_startup, background_jobs=background_jobs),
+                on_shutdown=partial(on_shutdown, background_jobs=background_jobs), path=socket_path, register=False)
+
+
+def launch_bot(mode: str = BOT_MODE, workers: int = BOT_WORKERS):
+    logger.info(f"Launching the bot in {mode} mode...")
+    # one-time DB file migration runs before bot workers open the DB
+    app_storage.enable_incremental_auto_vacuum()
+    if mode == "webhook" and workers > 1:
+        run_supervisor(dispatcher=dp, workers=workers, worker_target=launch_worker)
+    elif mode == "webhook":
+        run_webhook(dispatcher=dp, on_startup=on_startup, on_shutdown=on_shutdown)
+    else:
+        executor.start_polling(dispatcher=dp, skip_updates=True, on_startup=on_startup, on_shutdown=on_shutdown)
 
 
 if __name__ == '__main__':
-    launch_bot()
+    parser = argparse.ArgumentParser(description="Weather Telegram bot.")
+    parser.add_argument("--mode", choices=("polling", "webhook"), default=BOT_MODE,
+                        help="receive updates with long polling or via webhook served by aiohttp application")
+    parser.add_argument("--workers", type=int, default=BOT_WORKERS,
+                        help="number of bot worker processes in webhook mode, updates are routed by chat id")
+    args = parser.parse_known_args()[0]
+    launch_bot(args.mode, args.workers)
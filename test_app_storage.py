@@ -0,0 +1,37 @@
+import asyncio
+import sqlite3
+
+from app_storage import AsyncSQLiteDB
+
+
+def _auto_vacuum(db_name: str) -> int:
+    connection = sqlite3.connect(db_name)
+    try:
+        return connection.execute("PRAGMA auto_vacuum").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_connection_setup_does_not_migrate_db_file(tmp_path):
+    db_name = str(tmp_path / "app.db")
+    sqlite3.connect(db_name).execute("CREATE TABLE ITEMS (ID INTEGER PRIMARY KEY)").connection.close()
+    db = AsyncSQLiteDB(db_name)
+    try:
+        assert db.run_sync(lambda connection: connection.execute("PRAGMA journal_mode").fetchone()[0]) == "wal"
+        assert _auto_vacuum(db_name) == 0
+    finally:
+        db.close()
+
+
+def test_incremental_auto_vacuum_is_enabled_once(tmp_path):
+    db_name = str(tmp_path / "app.db")
+    db = AsyncSQLiteDB(db_name)
+    try:
+        asyncio.run(db.execute("CREATE TABLE ITEMS (ID INTEGER PRIMARY KEY, VALUE TEXT)"))
+        asyncio.run(db.execute("INSERT INTO ITEMS (VALUE) VALUES (?)", ("value",)))
+        db.enable_incremental_auto_vacuum()
+        db.enable_incremental_auto_vacuum()
+        assert _auto_vacuum(db_name) == 2
+        assert asyncio.run(db.fetchall("SELECT VALUE FROM ITEMS")) == [("value",)]
+    finally:
+        db.close()
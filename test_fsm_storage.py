@@ -0,0 +1,98 @@
+import asyncio
+
+import fsm_storage
+from app_storage import AsyncSQLiteDB
+from config import FSM_STORAGE_TABLE_NAME
+from fsm_storage import SQLiteStorage, ExpiringMemoryStorage, dump_fsm_data, load_fsm_data
+from geocoding.geocoding_utils import LocationPoint
+
+LOCATION_POINTS = [LocationPoint(lat_lon="50.45466,30.52380", address="Київ, Kyiv City, UA"),
+                   LocationPoint(lat_lon="46.48572,30.74383", address="Одеса, Odesa Oblast, UA")]
+
+
+def test_location_points_survive_serialization():
+    data = {"location_storage": LOCATION_POINTS, "weather_provider": "OpenWeatherMap"}
+    assert load_fsm_data(dump_fsm_data(data)) == data
+
+
+def test_state_survives_restart(tmp_path):
+    db_name = str(tmp_path / "fsm.db")
+
+    async def before_restart():
+        storage = AsyncSQLiteDB(db_name)
+        fsm_storage = SQLiteStorage(storage)
+        await fsm_storage.set_state(chat=1, user=1, state="LocationStates:lat_lon")
+        await fsm_storage.update_data(chat=1, user=1, data={"location_storage": LOCATION_POINTS})
+        await fsm_storage.set_bucket(chat=1, user=1, bucket={"throttled": 1})
+        await fsm_storage.set_state(chat=2, user=2, state="LocationStates:lat_lon")
+        await fsm_storage.reset_state(chat=2, user=2, with_data=True)
+        # pending changes are written on close
+        await fsm_storage.close()
+        storage.close()
+
+    async def after_restart():
+        storage = AsyncSQLiteDB(db_name)
+        fsm_storage = SQLiteStorage(storage)
+        try:
+            assert await fsm_storage.get_state(chat=1, user=1) == "LocationStates:lat_lon"
+            assert await fsm_storage.get_data(chat=1, user=1) == {"location_storage": LOCATION_POINTS}
+            assert await fsm_storage.get_bucket(chat=1, user=1) == {"throttled": 1}
+            assert await fsm_storage.get_state(chat=2, user=2) is None
+            # states which were not changed within ttl are abandoned
+            assert await SQLiteStorage(storage, ttl=-1).get_state(chat=1, user=1) is None
+            assert fsm_storage.stats()["pending"] == 0
+        finally:
+            await fsm_storage.close()
+            storage.close()
+
+    asyncio.run(before_restart())
+    asyncio.run(after_restart())
+
+
+def test_abandoned_states_are_purged_from_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(fsm_storage, "FSM_STORAGE_PURGE_INTERVAL", -1)
+
+    async def check():
+        storage = AsyncSQLiteDB(str(tmp_path / "fsm.db"))
+        fsm = SQLiteStorage(storage, ttl=100)
+        try:
+            storage.run_sync(fsm_storage._write_fsm_records, [("1", "1", "LocationStates:lat_lon", "{}", "{}", 0)],
+                             [])
+            await fsm.set_state(chat=2, user=2, state="LocationStates:lat_lon")
+            await fsm.close()
+            rows = storage.run_sync(lambda connection: connection.execute(
+                f"SELECT CHAT FROM {FSM_STORAGE_TABLE_NAME}").fetchall())
+            assert rows == [("2",)]
+        finally:
+            storage.close()
+
+    asyncio.run(check())
+
+
+def test_storage_is_closed_once(tmp_path):
+    async def check():
+        storage = AsyncSQLiteDB(str(tmp_path / "fsm.db"))
+        fsm = SQLiteStorage(storage)
+        await fsm.set_state(chat=1, user=1, state="LocationStates:lat_lon")
+        await fsm.close()
+        storage.close()
+        # the DB executor is shut down, changes made after close and repeated close must not touch it
+        await fsm.set_state(chat=1, user=1, state=None)
+        await fsm.close()
+        await fsm.wait_closed()
+
+    asyncio.run(check())
+
+
+def test_storage_size_is_logged_on_purge(monkeypatch):
+    logged = []
+    monkeypatch.setattr(fsm_storage, "FSM_STORAGE_PURGE_INTERVAL", -1)
+    monkeypatch.setattr(fsm_storage, "log_fsm_storage_stats", logged.append)
+
+    async def check():
+        memory_storage = ExpiringMemoryStorage()
+        await memory_storage.set_state(chat=1, user=1, state="LocationStates:lat_lon")
+        assert logged and logged[-1] is memory_storage
+        assert memory_storage.stats()["entries"] == 1
+
+    asyncio.run(check())
@@ -0,0 +1,33 @@
+import asyncio
+import time
+
+import weather_prefetch
+from config import WEATHER_HOT_KEYS_HALF_LIFE, WEATHER_HOT_KEYS_MAX
+from weather_cache import weather_cache_utils
+from weather_cache.hot_keys import HotKeyTracker
+from weather_providers.weather_provider_strategy import WeatherProviderName, WeatherForecastType
+
+PROVIDER = WeatherProviderName.OPENWEATHERMAP.value
+PERIOD = WeatherForecastType.CURRENT.value
+
+
+def test_only_hot_cached_keys_are_prefetched(monkeypatch):
+    prefetched = []
+
+    async def prefetch_weather_responses(weather_provider_name, lat_lons, calls_budget):
+        prefetched.extend(lat_lons)
+        return [], 1
+
+    hot_keys = HotKeyTracker(half_life=WEATHER_HOT_KEYS_HALF_LIFE, max_keys=WEATHER_HOT_KEYS_MAX)
+    monkeypatch.setattr(weather_prefetch, "weather_hot_keys", hot_keys)
+    monkeypatch.setattr(weather_cache_utils, "weather_hot_keys", hot_keys)
+    monkeypatch.setattr(weather_prefetch, "prefetch_weather_responses", prefetch_weather_responses)
+    now = int(time.time())
+    for lat_lon, accesses, cached_at in (("1.00,1.00", 3, now - 3500), ("2.00,2.00", 1, now - 3500),
+                                         ("3.00,3.00", 3, 0)):
+        for _ in range(accesses):
+            hot_keys.record_access((lat_lon, PROVIDER, PERIOD), timestamp=now)
+        hot_keys.record_cached((lat_lon, PROVIDER, PERIOD), cached_at=cached_at)
+    # the cold key and the key which was never cached are skipped
+    assert asyncio.run(weather_prefetch.prefetch_hot_weather(lead_time=300, min_score=2)) == 1
+    assert prefetched == ["1.00,1.00"]
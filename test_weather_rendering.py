@@ -0,0 +1,35 @@
+from weather_providers.weather_provider_strategy import WeatherData
+from weather_rendering import render_weather_body, rendered_records_cache, _sample_weather_data, \
+    _preformat_legacy_weather_data, _render_with_replace, CURRENT_LAYOUT, DAILY_LAYOUT
+
+
+def test_compiled_rendering_matches_former_rendering():
+    current = _sample_weather_data(0, 12.4)
+    days = [_sample_weather_data(day, None) for day in range(1, 6)]
+    for language in ("uk", "en"):
+        assert render_weather_body(current, language) == _render_with_replace(
+            _preformat_legacy_weather_data(current, language, CURRENT_LAYOUT), language)
+        assert render_weather_body(days, language) == _render_with_replace(
+            [_preformat_legacy_weather_data(item, language, DAILY_LAYOUT) for item in days], language)
+
+
+def test_lines_of_unset_fields_are_skipped():
+    weather_data = WeatherData(timestamp=1651708800, weather_condition=None, temperature=0.0, max_temperature=None,
+                               min_temperature=None, wind_speed=None, wind_direction=None, pressure=None,
+                               precipitation=None, humidity=None, sunrise=None, sunset=None)
+    lines = render_weather_body(weather_data, "en").split("\n")
+    assert len(lines) == 4
+    assert lines[2] == "<b>Air temperature</b>:\t0 °C"
+
+
+def test_rendered_record_is_reused_per_language():
+    rendered_records_cache.clear()
+    weather_data = _sample_weather_data(0, 12.4)
+    uk_body = render_weather_body(weather_data, "uk")
+    hits = rendered_records_cache.hits
+    # records are matched by values, not by identity
+    assert render_weather_body(_sample_weather_data(0, 12.4), "uk") == uk_body
+    assert rendered_records_cache.hits == hits + 1
+    assert len(rendered_records_cache) == 1
+    assert render_weather_body(weather_data, "en") != uk_body
+    assert len(rendered_records_cache) == 2
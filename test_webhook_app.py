@@ -0,0 +1,44 @@
+import asyncio
+
+import aiogram.dispatcher.webhook
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.utils.exceptions import TimeoutWarning
+from aiohttp.test_utils import TestClient, TestServer
+
+from config import WEBHOOK_PATH
+from webhook_app import create_webhook_app, updates_drain
+
+UPDATE = {"update_id": 1, "message": {"message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"},
+                                  "from": {"id": 1, "is_bot": False, "first_name": "User"}, "text": "hi"}}
+
+
+async def _noop(_):
+    pass
+
+
+def test_update_processed_after_response_is_drained(monkeypatch):
+    # webhook responds to Telegram after this timeout and the update is processed in background
+    monkeypatch.setattr(aiogram.dispatcher.webhook, "RESPONSE_TIMEOUT", 0.05)
+    processed = []
+
+    async def check():
+        bot = Bot(token="123456:test-token")
+        dispatcher = Dispatcher(bot)
+
+        @dispatcher.message_handler()
+        async def slow_handler(message):
+            await asyncio.sleep(0.3)
+            processed.append(message.text)
+
+        async with TestClient(TestServer(create_webhook_app(dispatcher, _noop, _noop, register=False))) as client:
+            response = await client.post(WEBHOOK_PATH, json=UPDATE)
+            assert await response.text() == "ok"
+            assert not processed
+            assert updates_drain.in_flight == 1
+            await updates_drain.drain(timeout=5)
+            assert processed == ["hi"]
+            assert updates_drain.in_flight == 0
+
+    with pytest.warns(TimeoutWarning):
+        asyncio.run(check())
@@ -0,0 +1,96 @@
+"""Contains tracker of weather cache keys access frequency used to find hot locations worth prefetching."""
+
+from dataclasses import dataclass
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+
+@dataclass
+class HotKey:
+    key: Hashable
+    score: float
+    last_access: int
+    cached_at: int = 0
+    # part of the score accumulated since tracked keys were last saved
+    unsaved_score: float = 0.0
+
+
+class HotKeyTracker:
+    """Keeps exponentially decayed access counter per weather cache key.
+
+    Every access adds 1 to the key score and the score halves every 'half_life' seconds, so locations requested
+    every day stay hot while one-off requests fade away. Number of tracked keys is bounded by 'max_keys'.
+
+    Every bot worker process tracks accesses it serves, so scores are shared through the DB: each worker saves only
+    the score accumulated since its previous save ('take_unsaved') and it is added to the saved one, loading replaces
+    tracked scores with the merged ones.
+    """
+
+    def __init__(self, half_life: int, max_keys: int):
+        self._keys: Dict[Hashable, HotKey] = {}
+        self._half_life = half_life
+        self._max_keys = max_keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _decay(self, last_access: int, timestamp: int) -> float:
+        return 0.5 ** (max(0, timestamp - last_access) / self._half_life)
+
+    def _decayed_score(self, hot_key: HotKey, timestamp: int) -> float:
+        return hot_key.score * self._decay(hot_key.last_access, timestamp)
+
+    def merge_scores(self, score: float, last_access: int, other_score: float, other_last_access: int) -> float:
+        """Returns sum of two scores as of the later of their last accesses."""
+        timestamp = max(last_access, other_last_access)
+        return score * self._decay(last_access, timestamp) + other_score * self._decay(other_last_access, timestamp)
+
+    def record_access(self, key: Hashable, timestamp: int) -> None:
+        hot_key = self._keys.get(key)
+        if hot_key is None:
+            self._keys[key] = HotKey(key=key, score=1.0, last_access=timestamp, unsaved_score=1.0)
+            self._prune(timestamp)
+            return
+        decay = self._decay(hot_key.last_access, timestamp)
+        hot_key.score = hot_key.score * decay + 1
+        hot_key.unsaved_score = hot_key.unsaved_score * decay + 1
+        hot_key.last_access = timestamp
+
+    def record_cached(self, key: Hashable, cached_at: int) -> None:
+        """Remembers when cached data for tracked key was produced, so it is known when it expires."""
+        hot_key = self._keys.get(key)
+        if hot_key is not None:
+            hot_key.cached_at = max(hot_key.cached_at, int(cached_at))
+
+    def top(self, count: int, timestamp: int, min_score: float = 0.0) -> List[HotKey]:
+        """Returns 'count' keys with the highest current score, keys scored below 'min_score' are skipped."""
+        scored_keys = ((self._decayed_score(hot_key, timestamp), hot_key) for hot_key in self._keys.values())
+        return [hot_key for _, hot_key in sorted(((score, hot_key) for score, hot_key in scored_keys
+                                                  if score >= min_score), key=lambda item: item[0], reverse=True)[:count]]
+
+    def _prune(self, timestamp: int) -> None:
+        # pruning sorts all keys, so it is done only when there are twice as many keys as allowed
+        if len(self._keys) > 2 * self._max_keys:
+            self._keys = {hot_key.key: hot_key for hot_key in self.top(self._max_keys, timestamp)}
+
+    def take_unsaved(self) -> List[Tuple[Hashable, float, int]]:
+        """Returns (key, unsaved score, last access) records of keys accessed since the previous call and marks
+        their scores as saved."""
+        records = []
+        for hot_key in self._keys.values():
+            if hot_key.unsaved_score:
+                records.append((hot_key.key, hot_key.unsaved_score, hot_key.last_access))
+                hot_key.unsaved_score = 0.0
+        return records
+
+    def load(self, records: Iterable[Tuple[Hashable, float, int]], timestamp: int) -> None:
+        """Replaces scores of tracked keys with saved (key, score, last access) records, which include scores of
+        all workers. Score accumulated since the previous save is kept on top of the saved one."""
+        for key, score, last_access in records:
+            hot_key = self._keys.get(key)
+            if hot_key is None:
+                self._keys[key] = HotKey(key=key, score=score, last_access=last_access)
+                continue
+            hot_key.score = self.merge_scores(score, last_access, hot_key.unsaved_score, hot_key.last_access)
+            hot_key.unsaved_score *= self._decay(hot_key.last_access, max(last_access, hot_key.last_access))
+            hot_key.last_access = max(last_access, hot_key.last_access)
+        self._prune(timestamp)
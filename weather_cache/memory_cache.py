@@ -0,0 +1,83 @@
+"""Contains bounded in-process LRU cache with TTL used as a hot tier in front of SQLite weather cache."""
+
+from collections import OrderedDict
+from typing import Any, Hashable, Iterator, Optional, Union
+
+from loguru import logger
+
+
+class LRUTTLCache:
+    """Bounded mapping which evicts least recently used item when it is full.
+
+    Every item is stored together with the timestamp it was produced at, item is treated as expired once current
+    timestamp exceeds it for more than 'ttl' seconds (same rule as 'check_time_frame' applies to DB records).
+    Individual items may be stored with their own ttl, e.g. negative results which should expire sooner.
+    """
+
+    def __init__(self, max_size: int, ttl: int, name: str = "cache"):
+        self._items = OrderedDict()
+        self._max_size = max_size
+        self._ttl = ttl
+        self._name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._items
+
+    def get(self, key: Hashable, current_timestamp: Union[int, str]) -> Optional[Any]:
+        """Returns actual cached value by the key or None, expired item is dropped."""
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires_at, value = item
+        if int(current_timestamp) > expires_at:
+            del self._items[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, timestamp: Union[int, str], ttl: Optional[int] = None) -> None:
+        """Stores value produced at provided timestamp, evicts least recently used items if cache is full."""
+        self._items[key] = (int(timestamp) + (self._ttl if ttl is None else ttl), value)
+        self._items.move_to_end(key)
+        while len(self._items) > self._max_size:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        item = self._items.pop(key, None)
+        return item[1] if item else None
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def values(self) -> Iterator[Any]:
+        return (value for _, value in self._items.values())
+
+    def purge_expired(self, current_timestamp: Union[int, str]) -> int:
+        """Drops all expired items (they are otherwise dropped only when requested or evicted by newer ones),
+        returns number of dropped items."""
+        expired_keys = [key for key, (expires_at, _) in self._items.items() if int(current_timestamp) > expires_at]
+        for key in expired_keys:
+            del self._items[key]
+        self.expirations += len(expired_keys)
+        return len(expired_keys)
+
+    def stats(self) -> dict:
+        requests_count = self.hits + self.misses
+        return {"name": self._name, "size": len(self._items), "max_size": self._max_size, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions, "expirations": self.expirations,
+                "hit_ratio": round(self.hits / requests_count, 3) if requests_count else 0.0}
+
+    def log_stats(self) -> None:
+        logger.info(f"In-memory '{self._name}' statistics: {self.stats()}")
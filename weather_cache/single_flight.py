@@ -0,0 +1,63 @@
+"""Contains single-flight helper which coalesces concurrent identical coroutine calls into one."""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from loguru import logger
+
+
+class _LeaderCancelled(Exception):
+    """Set on the shared future when the caller running the call was cancelled, waiters retry the call."""
+
+
+class SingleFlight:
+    """Runs only one call per key at a time, concurrent callers with the same key wait for and share its result
+    (or exception) instead of doing the same work again."""
+
+    def __init__(self, name: str = "single flight"):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self._name = name
+        self.calls = 0
+        self.deduplicated = 0
+
+    def __len__(self):
+        return len(self._in_flight)
+
+    async def do(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Returns result of 'func' call for the key, joins the call in flight if there is one. If the caller running
+        the call is cancelled, cancellation is not passed to waiters, one of them runs the call again."""
+        future = self._in_flight.get(key)
+        while future is not None:
+            self.deduplicated += 1
+            logger.debug(f"Joining in-flight '{self._name}' call for key {key}.")
+            try:
+                # shield prevents cancelled waiter from cancelling the call shared with other waiters
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                future = self._in_flight.get(key)
+        self.calls += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as err:
+            future.set_exception(err)
+            # mark exception as retrieved, so it is not reported when there were no waiters
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._in_flight[key]
+
+    def stats(self) -> dict:
+        return {"name": self._name, "in_flight": len(self._in_flight), "calls": self.calls,
+                "deduplicated": self.deduplicated}
+
+    def log_stats(self) -> None:
+        logger.info(f"Single-flight '{self._name}' statistics: {self.stats()}")
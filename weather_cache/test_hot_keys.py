@@ -0,0 +1,72 @@
+from config import WEATHER_HOT_KEYS_TABLE_NAME
+from weather_cache.hot_keys import HotKeyTracker
+from weather_cache.weather_cache_utils import weather_db, _merge_weather_hot_keys
+
+HALF_LIFE = 100
+
+
+def test_score_halves_every_half_life():
+    tracker = HotKeyTracker(half_life=HALF_LIFE, max_keys=10)
+    tracker.record_access("key", timestamp=1000)
+    tracker.record_access("key", timestamp=1000)
+    hot_key = tracker.top(1, timestamp=1000)[0]
+    assert hot_key.score == 2
+    tracker.record_access("key", timestamp=1100)
+    assert tracker.top(1, timestamp=1100)[0].score == 2
+
+
+def test_top_orders_keys_by_decayed_score():
+    tracker = HotKeyTracker(half_life=HALF_LIFE, max_keys=10)
+    for _ in range(3):
+        tracker.record_access("old", timestamp=1000)
+    tracker.record_access("recent", timestamp=1300)
+    tracker.record_access("recent", timestamp=1300)
+    tracker.record_access("rare", timestamp=1300)
+    # 'old' score decayed to 3 / 8 by the time 'recent' keys were requested
+    assert [hot_key.key for hot_key in tracker.top(3, timestamp=1300)] == ["recent", "rare", "old"]
+    assert [hot_key.key for hot_key in tracker.top(1, timestamp=1300)] == ["recent"]
+
+
+def test_coldest_keys_are_pruned():
+    tracker = HotKeyTracker(half_life=HALF_LIFE, max_keys=2)
+    tracker.record_access("hot", timestamp=1000)
+    tracker.record_access("hot", timestamp=1000)
+    for key in range(4):
+        tracker.record_access(key, timestamp=1000)
+    assert len(tracker) == 2
+    assert tracker.top(1, timestamp=1000)[0].key == "hot"
+
+
+def test_unsaved_score_is_taken_once():
+    tracker = HotKeyTracker(half_life=HALF_LIFE, max_keys=10)
+    tracker.record_access("key", timestamp=1000)
+    assert tracker.take_unsaved() == [("key", 1.0, 1000)]
+    assert tracker.take_unsaved() == []
+    tracker.record_access("key", timestamp=1100)
+    assert tracker.take_unsaved() == [("key", 1.0, 1100)]
+
+
+def test_saved_scores_of_workers_are_summed():
+    key = ("46.50,30.70", "OpenWeatherMap", "current")
+    workers = [HotKeyTracker(half_life=HALF_LIFE, max_keys=10) for _ in range(2)]
+    workers[0].record_access(key, timestamp=1000)
+    workers[0].record_access(key, timestamp=1000)
+    workers[1].record_access(key, timestamp=1100)
+    for tracker in workers:
+        records = [(*key, score, last_access) for key, score, last_access in tracker.take_unsaved()]
+        weather_db.storage.run_sync(_merge_weather_hot_keys, records, tracker.merge_scores, 0)
+    saved = weather_db.storage.run_sync(lambda connection: connection.execute(
+        f"SELECT SCORE, LAST_ACCESS FROM {WEATHER_HOT_KEYS_TABLE_NAME} WHERE LAT_LON = ?", (key[0],)).fetchall())
+    assert saved == [(2.0, 1100)]
+    # the first worker sees accesses of both workers after loading saved keys, its own ones are not counted twice
+    workers[0].load([(key, *saved[0])], timestamp=1100)
+    assert workers[0].top(1, timestamp=1100)[0].score == 2.0
+
+
+def test_keys_below_min_score_are_skipped():
+    tracker = HotKeyTracker(half_life=HALF_LIFE, max_keys=10)
+    tracker.record_access("hot", timestamp=1000)
+    tracker.record_access("hot", timestamp=1000)
+    tracker.record_access("cold", timestamp=1000)
+    assert [hot_key.key for hot_key in tracker.top(10, timestamp=1000, min_score=2)] == ["hot"]
+    assert tracker.top(10, timestamp=1100, min_score=2) == []
@@ -0,0 +1,46 @@
+from weather_cache.memory_cache import LRUTTLCache
+
+
+def test_item_expires_after_ttl():
+    cache = LRUTTLCache(max_size=10, ttl=60)
+    cache.set("key", "value", timestamp=1000)
+    assert cache.get("key", current_timestamp=1060) == "value"
+    assert cache.get("key", current_timestamp=1061) is None
+    assert "key" not in cache
+    assert cache.expirations == 1
+
+
+def test_item_ttl_overrides_default():
+    cache = LRUTTLCache(max_size=10, ttl=60)
+    cache.set("negative", None, timestamp=1000, ttl=10)
+    cache.set("negative", "value", timestamp=1000, ttl=10)
+    assert cache.get("negative", current_timestamp=1011) is None
+
+
+def test_least_recently_used_item_is_evicted():
+    cache = LRUTTLCache(max_size=2, ttl=60)
+    cache.set("a", 1, timestamp=1000)
+    cache.set("b", 2, timestamp=1000)
+    # reading 'a' makes 'b' the least recently used one
+    assert cache.get("a", current_timestamp=1000) == 1
+    cache.set("c", 3, timestamp=1000)
+    assert "b" not in cache
+    assert cache.get("a", current_timestamp=1000) == 1
+    assert cache.get("c", current_timestamp=1000) == 3
+    assert cache.evictions == 1
+
+
+def test_purge_expired_drops_only_expired_items():
+    cache = LRUTTLCache(max_size=10, ttl=60)
+    cache.set("old", 1, timestamp=1000)
+    cache.set("new", 2, timestamp=1050)
+    assert cache.purge_expired(current_timestamp=1100) == 1
+    assert list(cache.values()) == [2]
+
+
+def test_stats_count_hits_and_misses():
+    cache = LRUTTLCache(max_size=10, ttl=60, name="test")
+    cache.set("key", "value", timestamp=1000)
+    cache.get("key", current_timestamp=1000)
+    cache.get("missing", current_timestamp=1000)
+    assert cache.stats()["hit_ratio"] == 0.5
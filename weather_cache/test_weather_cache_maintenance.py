@@ -0,0 +1,45 @@
+import asyncio
+import time
+
+from app_storage import AsyncSQLiteDB
+from config import WEATHER_CACHE_TABLE_NAME, GEOCODING_CACHE_TABLE_NAME, GEOCODING_NEGATIVE_CACHE_TTL
+from geocoding.geocoding_cache import GeocodingCacheDB
+from weather_cache import weather_cache_maintenance
+from weather_cache.weather_cache_utils import WeatherCacheDB
+
+
+def test_maintenance_runs_without_fsm_table(tmp_path, monkeypatch):
+    # FSM_STORAGE=memory: conversation states are not kept in the application DB
+    storage = AsyncSQLiteDB(str(tmp_path / "app.db"))
+    GeocodingCacheDB(storage)
+    monkeypatch.setattr(weather_cache_maintenance, "weather_db", WeatherCacheDB(storage))
+    storage.run_sync(lambda connection: (connection.execute(
+        f"INSERT INTO {WEATHER_CACHE_TABLE_NAME} values ('46.50,30.70', 'Openweathermap', 'current', 0, '[]')"),
+        connection.commit()))
+    try:
+        report = asyncio.run(weather_cache_maintenance.run_weather_cache_maintenance())
+        assert report[f"{WEATHER_CACHE_TABLE_NAME}_evicted"] == 1
+        assert report[WEATHER_CACHE_TABLE_NAME] == 0
+        assert "db_size_bytes" in report
+    finally:
+        storage.close()
+
+
+def test_negative_geocoding_results_are_evicted_with_their_ttl(tmp_path, monkeypatch):
+    storage = AsyncSQLiteDB(str(tmp_path / "app.db"))
+    GeocodingCacheDB(storage)
+    monkeypatch.setattr(weather_cache_maintenance, "weather_db", WeatherCacheDB(storage))
+    expired_negative_timestamp = int(time.time()) - GEOCODING_NEGATIVE_CACHE_TTL - 10
+    storage.run_sync(lambda connection: (connection.executemany(
+        f"INSERT INTO {GEOCODING_CACHE_TABLE_NAME} values (?, ?, ?)",
+        [("nowhere", expired_negative_timestamp, None),
+         ("kyiv", expired_negative_timestamp, '[["50.45466,30.52380", "Kyiv, Kyiv City, UA"]]'),
+         ("nothing yet", int(time.time()), None)]), connection.commit()))
+    try:
+        report = asyncio.run(weather_cache_maintenance.run_weather_cache_maintenance())
+        assert report[f"{GEOCODING_CACHE_TABLE_NAME}_negative_evicted"] == 1
+        queries = storage.run_sync(lambda connection: connection.execute(
+            f"SELECT QUERY FROM {GEOCODING_CACHE_TABLE_NAME} ORDER BY QUERY").fetchall())
+        assert queries == [("kyiv",), ("nothing yet",)]
+    finally:
+        storage.close()
@@ -0,0 +1,56 @@
+import sqlite3
+
+import pytest
+
+from app_storage import AsyncSQLiteDB
+from config import WEATHER_CACHE_TABLE_NAME
+from weather_cache.weather_cache_utils import WeatherCacheDB, dump_weather_data, load_weather_data
+from weather_providers.weather_provider_strategy import WeatherData, WeatherForecastType
+
+LEGACY_ROWS = [
+    ("50.45,30.52", "OpenWeatherMap", "_forecast_weather_current", 1000, "stale"),
+    ("50.45,30.52", "OpenWeatherMap", "_forecast_weather_current", 3000, "latest"),
+    ("50.45,30.52", "OpenWeatherMap", "_forecast_weather_current", 2000, "older"),
+    ("50.45,30.52", "OpenWeatherMap", "_forecast_weather_today", 1500, "today"),
+]
+
+
+def test_legacy_table_is_migrated_keeping_latest_records(tmp_path):
+    db_name = str(tmp_path / "legacy.db")
+    connection = sqlite3.connect(db_name)
+    connection.execute(f"""CREATE TABLE {WEATHER_CACHE_TABLE_NAME} (LAT_LON TEXT, WEATHER_PROVIDER TEXT, PERIOD TEXT,
+    TIMESTAMP INTEGER, WEATHER_DATA TEXT)""")
+    connection.executemany(f"INSERT INTO {WEATHER_CACHE_TABLE_NAME} values (?, ?, ?, ?, ?)", LEGACY_ROWS)
+    connection.commit()
+    connection.close()
+
+    storage = AsyncSQLiteDB(db_name)
+    try:
+        WeatherCacheDB(storage)
+        rows = storage.run_sync(lambda connection: connection.execute(
+            f"SELECT PERIOD, TIMESTAMP, WEATHER_DATA FROM {WEATHER_CACHE_TABLE_NAME} ORDER BY PERIOD").fetchall())
+        assert rows == [("_forecast_weather_current", 3000, "latest"), ("_forecast_weather_today", 1500, "today")]
+        primary_key = storage.run_sync(lambda connection: [
+            column[1] for column in connection.execute(f"PRAGMA table_info({WEATHER_CACHE_TABLE_NAME})")
+            if column[5]])
+        assert primary_key == ["LAT_LON", "WEATHER_PROVIDER", "PERIOD"]
+        # migrated table is recognized and left as is on the next start
+        WeatherCacheDB(storage)
+        assert storage.run_sync(lambda connection: connection.execute(
+            f"SELECT COUNT(*) FROM {WEATHER_CACHE_TABLE_NAME}").fetchone()) == (2,)
+    finally:
+        storage.close()
+
+
+def test_weather_data_round_trip():
+    weather_data = WeatherData(timestamp=1651708800, weather_condition="SUN_BEHIND_CLOUD", temperature=12.4,
+                               max_temperature=None, min_temperature=None, wind_speed=4.12, wind_direction=41,
+                               pressure=1016, precipitation=None, humidity=61, sunrise=1651720782,
+                               sunset=1651774867)
+    assert load_weather_data(dump_weather_data(weather_data), WeatherForecastType.CURRENT) == weather_data
+    assert load_weather_data(dump_weather_data([weather_data]), WeatherForecastType.TODAY) == [weather_data]
+
+
+def test_legacy_rendered_weather_data_is_rejected():
+    with pytest.raises(ValueError):
+        load_weather_data('"<b>Погода на:</b> 2022-05-05"', WeatherForecastType.CURRENT)
@@ -0,0 +1,96 @@
+"""Contains periodic maintenance job which evicts expired weather cache records and compacts the DB file."""
+
+import asyncio
+import time
+from typing import Optional
+
+from loguru import logger
+
+from config import WEATHER_CACHE_TABLE_NAME, WEATHER_RESPONSE_CACHE_TABLE_NAME, WEATHER_CACHE_RETENTION, \
+    WEATHER_CACHE_MAINTENANCE_INTERVAL, WEATHER_CACHE_EVICTION_BATCH_SIZE, WEATHER_CACHE_VACUUM_PAGES, \
+    GEOCODING_CACHE_TABLE_NAME, GEOCODING_CACHE_TTL, GEOCODING_NEGATIVE_CACHE_TTL
+from weather_cache.weather_cache_utils import weather_db
+
+WEATHER_CACHE_TABLES = (WEATHER_CACHE_TABLE_NAME, WEATHER_RESPONSE_CACHE_TABLE_NAME)
+
+_maintenance_task: Optional[asyncio.Task] = None
+
+
+async def evict_expired_records(table_name: str, expiration_timestamp: int,
+                                batch_size: int = WEATHER_CACHE_EVICTION_BATCH_SIZE, condition: str = "") -> int:
+    """Deletes records older than expiration timestamp from the table in bounded batches, so other DB operations
+    are not blocked for long. Only records matching SQL 'condition' are deleted if it is provided. Returns number of
+    deleted records."""
+    condition = f" AND {condition}" if condition else ""
+    sql_query = f"""DELETE FROM {table_name} WHERE rowid IN 
+    (SELECT rowid FROM {table_name} WHERE TIMESTAMP < ?{condition} LIMIT ?)"""
+    evicted_rows = 0
+    while True:
+        deleted_rows = await weather_db.storage.execute(sql_query, (expiration_timestamp, batch_size))
+        evicted_rows += deleted_rows
+        if deleted_rows < batch_size:
+            return evicted_rows
+        # let queued DB operations run between batches
+        await asyncio.sleep(0)
+
+
+async def get_weather_cache_size() -> dict:
+    """Returns number of records per weather cache table and DB file size figures."""
+    report = {}
+    for table_name in WEATHER_CACHE_TABLES:
+        report[table_name] = (await weather_db.storage.fetchone(f"SELECT COUNT(*) FROM {table_name}"))[0]
+    page_size = (await weather_db.storage.fetchone("PRAGMA page_size"))[0]
+    page_count = (await weather_db.storage.fetchone("PRAGMA page_count"))[0]
+    freelist_count = (await weather_db.storage.fetchone("PRAGMA freelist_count"))[0]
+    report["db_size_bytes"] = page_size * page_count
+    report["free_bytes"] = page_size * freelist_count
+    return report
+
+
+async def run_weather_cache_maintenance(retention: int = WEATHER_CACHE_RETENTION) -> dict:
+    """Evicts weather cache records older than retention period, returns free pages to the file system and reports
+    number of evicted records and resulting cache size."""
+    expiration_timestamp = int(time.time()) - retention
+    report = {}
+    for table_name in WEATHER_CACHE_TABLES:
+        report[f"{table_name}_evicted"] = await evict_expired_records(table_name, expiration_timestamp)
+    # geocoding results live much longer than weather data, they are evicted once their TTL is over
+    report[f"{GEOCODING_CACHE_TABLE_NAME}_evicted"] = await evict_expired_records(
+        GEOCODING_CACHE_TABLE_NAME, int(time.time()) - GEOCODING_CACHE_TTL)
+    # "nothing found" results expire much sooner, they are not worth keeping until then
+    report[f"{GEOCODING_CACHE_TABLE_NAME}_negative_evicted"] = await evict_expired_records(
+        GEOCODING_CACHE_TABLE_NAME, int(time.time()) - GEOCODING_NEGATIVE_CACHE_TTL, condition="LOCATIONS IS NULL")
+    await weather_db.storage.executescript(f"PRAGMA incremental_vacuum({WEATHER_CACHE_VACUUM_PAGES});")
+    report.update(await get_weather_cache_size())
+    logger.info(f"Weather cache maintenance finished: {report}")
+    return report
+
+
+async def __maintenance_loop(interval: int) -> None:
+    while True:
+        try:
+            await run_weather_cache_maintenance()
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            logger.error(f"Weather cache maintenance failed.\n{err}")
+        await asyncio.sleep(interval)
+
+
+def start_weather_cache_maintenance(interval: int = WEATHER_CACHE_MAINTENANCE_INTERVAL) -> None:
+    """Schedules periodic weather cache maintenance on the running event loop."""
+    global _maintenance_task
+    if _maintenance_task is None or _maintenance_task.done():
+        logger.info(f"Scheduling weather cache maintenance every {interval} seconds...")
+        _maintenance_task = asyncio.get_running_loop().create_task(__maintenance_loop(interval))
+
+
+async def stop_weather_cache_maintenance() -> None:
+    global _maintenance_task
+    if _maintenance_task is not None:
+        _maintenance_task.cancel()
+        try:
+            await _maintenance_task
+        except asyncio.CancelledError:
+            pass
+        _maintenance_task = None
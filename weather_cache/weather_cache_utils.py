@@ -1,139 +1,324 @@
+import asyncio
+import json
 import sqlite3
-from typing import Tuple, Optional, Union
+from dataclasses import fields
+from typing import Tuple, Optional, Union, List, Callable
 
 from loguru import logger
 
-from config import APP_DB_NAME, WEATHER_CACHE_TABLE_NAME
+from app_storage import AsyncSQLiteDB, app_storage
+from config import APP_DB_NAME, WEATHER_CACHE_TABLE_NAME, WEATHER_RESPONSE_CACHE_TABLE_NAME, WEATHER_CACHE_TTL, \
+    WEATHER_MEMORY_CACHE_SIZE, WEATHER_HOT_KEYS_TABLE_NAME, WEATHER_HOT_KEYS_HALF_LIFE, WEATHER_HOT_KEYS_MAX, \
+    WEATHER_HOT_KEYS_RETENTION
+from weather_cache.hot_keys import HotKeyTracker
+from weather_cache.memory_cache import LRUTTLCache
 from weather_cache.weather_cache_exceptions import FailedToCheckWeatherCache, FailedToGetWeatherDataFromDB, \
-    FailedToInsertWeatherDataIntoDB, FailedToUpdateWeatherDataInDB, FailedToUpdateWeatherCache
-from weather_providers.weather_provider_strategy import WeatherForecastType
+    FailedToInsertWeatherDataIntoDB, FailedToUpdateWeatherCache
+from weather_providers.weather_provider_strategy import WeatherForecastType, WeatherData
 
 
 class WeatherCacheDB:
-    f"""Class to initialize SQLite db instance and creates weather cache file '{APP_DB_NAME}' if it is absent.
-     Also it creates table with name '{WEATHER_CACHE_TABLE_NAME}' in case if it absent."""
-
-    def __init__(self, db_name):
-        self._db_connection = sqlite3.connect(db_name, check_same_thread=False)
-        self._db_cursor = self._db_connection.cursor()
-        logger.debug("Get list of available table names...")
-        result_query = self._db_cursor.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
-        # creates a table in case if it is absent
-        logger.info(f"Creating weather cache '{WEATHER_CACHE_TABLE_NAME}' table ")
-        if not result_query or WEATHER_CACHE_TABLE_NAME not in sorted(list(zip(*result_query))[0]):
-            self._db_cursor.execute(
-                f"""CREATE TABLE IF NOT EXISTS {WEATHER_CACHE_TABLE_NAME} (LAT_LON TEXT, WEATHER_PROVIDER TEXT, PERIOD TEXT, TIMESTAMP INTEGER, WEATHER_DATA 
-                TEXT)""")
-            self._db_connection.commit()
+    f"""Class to initialize weather cache tables in the application SQLite db '{APP_DB_NAME}'.
+     It creates table with name '{WEATHER_CACHE_TABLE_NAME}' in case if it absent, or migrates existing table
+     created without primary key."""
 
-    @property
-    def db_cursor(self):
-        return self._db_cursor
+    def __init__(self, storage: AsyncSQLiteDB):
+        self._storage = storage
+        self._storage.run_sync(self._create_tables)
 
     @property
-    def db_connection(self):
-        return self._db_connection
+    def storage(self) -> AsyncSQLiteDB:
+        return self._storage
+
+    def _create_tables(self, connection: sqlite3.Connection) -> None:
+        logger.debug(f"Get '{WEATHER_CACHE_TABLE_NAME}' table primary key columns...")
+        table_info = connection.execute(f"PRAGMA table_info({WEATHER_CACHE_TABLE_NAME})").fetchall()
+        if not table_info:
+            logger.info(f"Creating weather cache '{WEATHER_CACHE_TABLE_NAME}' table ")
+            self._create_weather_cache_table(connection, WEATHER_CACHE_TABLE_NAME)
+        elif not any(column[5] for column in table_info):
+            self._migrate_weather_cache_table(connection)
+        # raw provider responses, one per location and weather provider
+        connection.execute(
+            f"""CREATE TABLE IF NOT EXISTS {WEATHER_RESPONSE_CACHE_TABLE_NAME} (LAT_LON TEXT, WEATHER_PROVIDER TEXT, 
+            TIMESTAMP INTEGER, WEATHER_RESPONSE TEXT, PRIMARY KEY (LAT_LON, WEATHER_PROVIDER))""")
+        # weather cache keys access statistics, used to warm up the cache after restart
+        connection.execute(
+            f"""CREATE TABLE IF NOT EXISTS {WEATHER_HOT_KEYS_TABLE_NAME} (LAT_LON TEXT, WEATHER_PROVIDER TEXT, 
+            PERIOD TEXT, SCORE REAL, LAST_ACCESS INTEGER, PRIMARY KEY (LAT_LON, WEATHER_PROVIDER, PERIOD))""")
+        # timestamp indexes keep expired records eviction cheap
+        for table_name in (WEATHER_CACHE_TABLE_NAME, WEATHER_RESPONSE_CACHE_TABLE_NAME):
+            connection.execute(f"CREATE INDEX IF NOT EXISTS {table_name}_timestamp_idx ON {table_name} (TIMESTAMP)")
+        connection.commit()
+
+    @staticmethod
+    def _create_weather_cache_table(connection: sqlite3.Connection, table_name: str) -> None:
+        connection.execute(
+            f"""CREATE TABLE IF NOT EXISTS {table_name} (LAT_LON TEXT, WEATHER_PROVIDER TEXT, PERIOD TEXT, 
+            TIMESTAMP INTEGER, WEATHER_DATA TEXT, PRIMARY KEY (LAT_LON, WEATHER_PROVIDER, PERIOD))""")
+        connection.commit()
+
+    def _migrate_weather_cache_table(self, connection: sqlite3.Connection) -> None:
+        """Rebuilds legacy weather cache table without primary key in place, keeping the latest record per key."""
+        logger.info(f"Migrating weather cache '{WEATHER_CACHE_TABLE_NAME}' table to indexed schema...")
+        migration_table_name = f"{WEATHER_CACHE_TABLE_NAME}_migration"
+        try:
+            connection.execute(f"DROP TABLE IF EXISTS {migration_table_name}")
+            self._create_weather_cache_table(connection, migration_table_name)
+            # SQLite takes bare columns from the row holding MAX() value
+            connection.execute(
+                f"""INSERT INTO {migration_table_name} SELECT LAT_LON, WEATHER_PROVIDER, PERIOD, MAX(TIMESTAMP), 
+                WEATHER_DATA FROM {WEATHER_CACHE_TABLE_NAME} GROUP BY LAT_LON, WEATHER_PROVIDER, PERIOD""")
+            connection.execute(f"DROP TABLE {WEATHER_CACHE_TABLE_NAME}")
+            connection.execute(f"ALTER TABLE {migration_table_name} RENAME TO {WEATHER_CACHE_TABLE_NAME}")
+            connection.commit()
+        except sqlite3.Error as err:
+            connection.rollback()
+            logger.error(f"Failed to migrate weather cache table.\n{err}")
+            raise
 
 
 logger.info(f"Initializing weather db class with '{APP_DB_NAME}' file name.")
-weather_db = WeatherCacheDB(APP_DB_NAME)
+weather_db = WeatherCacheDB(app_storage)
+# hot in-memory tiers in front of SQLite tables, keyed the same way as DB records
+weather_memory_cache = LRUTTLCache(max_size=WEATHER_MEMORY_CACHE_SIZE, ttl=WEATHER_CACHE_TTL, name="weather cache")
+weather_response_memory_cache = LRUTTLCache(max_size=WEATHER_MEMORY_CACHE_SIZE, ttl=WEATHER_CACHE_TTL,
+                                            name="weather response cache")
+# access frequency of weather cache keys, used to prefetch hot locations
+weather_hot_keys = HotKeyTracker(half_life=WEATHER_HOT_KEYS_HALF_LIFE, max_keys=WEATHER_HOT_KEYS_MAX)
 
 
-def get_weather_item_from_db(lat_lon: str, weather_provider_name: str, period: WeatherForecastType) -> Optional[tuple]:
-    logger.info(f"Tryint to get weather data with lat-lon: '{lat_lon}', period: '{period.value}' and weather "
-                f"provider: '{weather_provider_name}'...")
+WEATHER_DATA_FIELDS = tuple(field.name for field in fields(WeatherData))
+
+
+def dump_weather_data(weather_data: Union[WeatherData, List[WeatherData]]) -> str:
+    """Encodes weather data records as compact JSON list of field values lists, in WeatherData fields order."""
+    records = [weather_data] if isinstance(weather_data, WeatherData) else weather_data
+    return json.dumps([[getattr(record, field_name) for field_name in WEATHER_DATA_FIELDS] for record in records],
+                      ensure_ascii=False, separators=(",", ":"))
+
+
+def load_weather_data(raw_weather_data: str, period: WeatherForecastType) -> Union[WeatherData, List[WeatherData]]:
+    """Decodes weather data records encoded with 'dump_weather_data', current weather is a single record.
+
+    :raises ValueError: if raw weather data is not a list of WeatherData records (e.g. legacy pre-rendered output)
+    """
     try:
-        sql_query = f"""SELECT * from {WEATHER_CACHE_TABLE_NAME} WHERE LAT_LON = '{lat_lon}' AND WEATHER_PROVIDER = '{weather_provider_name}' AND PERIOD = '{period.value}'"""
-        weather_db.db_cursor.execute(sql_query)
-        result = weather_db.db_cursor.fetchone()
-    except Exception as err:
-        logger.error(f"Failed to get weather data from the DB.\n {err}")
-        raise FailedToGetWeatherDataFromDB("Failed to get weather data from the DB.")
-    return result
+        records = [WeatherData(*values) for values in json.loads(raw_weather_data)]
+    except TypeError as err:
+        raise ValueError(f"Unexpected weather data record format.\n{err}")
+    if not records:
+        raise ValueError("Weather data record is empty.")
+    return records[0] if period is WeatherForecastType.CURRENT else records
 
 
-def insert_weather_item_into_db(weather_provider_name: str, timestamp: int, period: WeatherForecastType,
-                                weather_data: str, lat_lon: str) -> None:
-    logger.info(f"Inserting weather data with lat-lon: '{lat_lon}', period: {period.value} and weather "
+async def get_weather_item_from_db(lat_lon: str, weather_provider_name: str,
+                                   period: WeatherForecastType) -> Optional[tuple]:
+    logger.debug(f"Tryint to get weather data with lat-lon: '{lat_lon}', period: '{period.value}' and weather "
                 f"provider: '{weather_provider_name}'...")
     try:
-        sql_query = f"""INSERT into {WEATHER_CACHE_TABLE_NAME} values (?, ?, ?, ?, ?) """
-        weather_db.db_cursor.execute(sql_query, (lat_lon, weather_provider_name, period.value, timestamp, weather_data))
-        weather_db.db_connection.commit()
+        sql_query = f"""SELECT * from {WEATHER_CACHE_TABLE_NAME} 
+        WHERE LAT_LON = ? AND WEATHER_PROVIDER = ? AND PERIOD = ?"""
+        result = await weather_db.storage.fetchone(sql_query, (lat_lon, weather_provider_name, period.value))
     except Exception as err:
-        logger.error(err)
-        raise FailedToInsertWeatherDataIntoDB("Failed to insert weather data into the DB.")
+        logger.error(f"Failed to get weather data from the DB.\n {err}")
+        raise FailedToGetWeatherDataFromDB("Failed to get weather data from the DB.")
+    return result
 
 
-def update_weather_item_in_db(weather_provider_name: str, timestamp: int, period: WeatherForecastType,
-                              weather_data: str, lat_lon: str) -> None:
-    logger.info(f"Updating weather data with lat-lon: '{lat_lon}', period: '{period.value}' and weather "
+async def upsert_weather_item_into_db(weather_provider_name: str, timestamp: int, period: WeatherForecastType,
+                                      weather_data: str, lat_lon: str) -> None:
+    """Inserts weather record or updates existing one with the same key using a single statement."""
+    logger.info(f"Writing weather data with lat-lon: '{lat_lon}', period: {period.value} and weather "
                 f"provider: '{weather_provider_name}'...")
     try:
-        sql_query = f""" UPDATE {WEATHER_CACHE_TABLE_NAME} SET TIMESTAMP = {timestamp}, WEATHER_DATA = '{weather_data}' 
-        WHERE LAT_LON = '{lat_lon}' AND  WEATHER_PROVIDER = '{weather_provider_name}' AND PERIOD = '{period.value}'"""
-        weather_db.db_cursor.execute(sql_query)
-        weather_db.db_connection.commit()
+        sql_query = f"""INSERT into {WEATHER_CACHE_TABLE_NAME} values (?, ?, ?, ?, ?) 
+        ON CONFLICT (LAT_LON, WEATHER_PROVIDER, PERIOD) DO UPDATE SET TIMESTAMP = excluded.TIMESTAMP, 
+        WEATHER_DATA = excluded.WEATHER_DATA"""
+        await weather_db.storage.execute(sql_query,
+                                         (lat_lon, weather_provider_name, period.value, timestamp, weather_data))
     except Exception as err:
         logger.error(err)
-        raise FailedToUpdateWeatherDataInDB("Failed to update weather data in the DB.")
+        raise FailedToInsertWeatherDataIntoDB("Failed to write weather data into the DB.")
 
 
-def check_weather_cache(weather_provider_name: str, timestamp: int, period: WeatherForecastType, lat_lon: str) -> Tuple[
-        bool, Optional[tuple]]:
+async def check_weather_cache(weather_provider_name: str, timestamp: int, period: WeatherForecastType,
+                              lat_lon: str, track_access: bool = True) -> Tuple[bool, Optional[tuple]]:
     """Function checks if combination of location latitude and longitude + weather provider record already exists in DB,
-    and it is not more than one hour old.
+    and it is not more than one hour old. In-memory tier is checked first, so hot records never touch the disk.
+    Every check counts as access to the key for hot locations prefetch, unless 'track_access' is False.
      Returns """
-    logger.info(
+    cache_key = (lat_lon, weather_provider_name, period.value)
+    if track_access:
+        weather_hot_keys.record_access(cache_key, timestamp=timestamp)
+    result = weather_memory_cache.get(cache_key, current_timestamp=timestamp)
+    if result:
+        logger.debug("Actual record is present in the in-memory weather cache.")
+        weather_hot_keys.record_cached(cache_key, cached_at=result[3])
+        return True, result
+    logger.debug(
         f"Checking whether record with lat_lon '{lat_lon}', weather provider '{weather_provider_name}' "
         f"and forecast type '{period.value}' exist in DB.")
     try:
-        result = get_weather_item_from_db(lat_lon=lat_lon, weather_provider_name=weather_provider_name, period=period)
+        result = await get_weather_item_from_db(lat_lon=lat_lon, weather_provider_name=weather_provider_name, period=period)
     except FailedToCheckWeatherCache:
         err = f"Unable to fetch data for lat-lon: '{lat_lon}' and weather_provider_name: '{weather_provider_name}' " \
               f"from the Weathed Cache DB."
         logger.error(err)
         raise FailedToCheckWeatherCache(err)
     if not result:
-        logger.info("Record is not present in the DB.")
+        logger.debug("Record is not present in the DB.")
+        return False, None
+    try:
+        result = (*result[:4], load_weather_data(result[4], period=period))
+    except ValueError as err:
+        # records written before weather data was cached in structured form are refreshed as missing ones
+        logger.debug(f"Weather cache record can not be decoded, ignoring it.\n{err}")
         return False, None
-    logger.info("Record is present in the DB.")
     is_cache_actual = check_time_frame(db_timestamp=result[3], current_timestamp=timestamp)
-    logger.info(f"Record's cached data is actual: {is_cache_actual}")
+    logger.debug(f"Record is present in the DB, cached data is actual: {is_cache_actual}")
+    if is_cache_actual:
+        weather_memory_cache.set(cache_key, result, timestamp=result[3])
+        weather_hot_keys.record_cached(cache_key, cached_at=result[3])
     return is_cache_actual, result
 
 
-def update_weather_cache(lat_lon: str, period: WeatherForecastType, weather_provider_name: str, timestamp: int,
-                         current_weather_data: str) -> None:
+async def update_weather_cache(lat_lon: str, period: WeatherForecastType, weather_provider_name: str, timestamp: int,
+                               weather_data: Union[WeatherData, List[WeatherData]]) -> None:
+    """Caches weather data records (not rendered output), so they can be rendered in any language and layout."""
     logger.info("Attempting to update existing weather record in DB...")
+    weather_memory_cache.set((lat_lon, weather_provider_name, period.value),
+                             (lat_lon, weather_provider_name, period.value, timestamp, weather_data),
+                             timestamp=timestamp)
+    weather_hot_keys.record_cached((lat_lon, weather_provider_name, period.value), cached_at=timestamp)
     try:
-        result = get_weather_item_from_db(lat_lon=lat_lon, weather_provider_name=weather_provider_name, period=period)
-        if result:
-            if not check_time_frame(db_timestamp=result[3], current_timestamp=timestamp):
-                update_weather_item_in_db(weather_provider_name=weather_provider_name, timestamp=timestamp,
-                                          weather_data=current_weather_data, lat_lon=lat_lon, period=period)
-        else:
-            insert_weather_item_into_db(weather_provider_name=weather_provider_name, timestamp=timestamp, period=period,
-                                        weather_data=current_weather_data, lat_lon=lat_lon)
+        await upsert_weather_item_into_db(weather_provider_name=weather_provider_name, timestamp=timestamp, period=period,
+                                    weather_data=dump_weather_data(weather_data), lat_lon=lat_lon)
     except FailedToCheckWeatherCache as err:
         logger.error(err)
         raise FailedToUpdateWeatherCache("Failed to update weather cache data in the DB.")
 
 
-def check_time_frame(db_timestamp: Union[int, str], current_timestamp: Union[int, str]) -> bool:
-    """Functions checks whether current time exceeds time from DB record for more than an hour."""
-    logger.info("Checking if current weather record in DB is exceeded 1 hour time interval...")
-    result = not (int(current_timestamp) - int(db_timestamp) > 3600)
-    logger.info(f"Timeframe for current weather record is expired: '{result}'")
+async def get_weather_response_from_db(lat_lon: str, weather_provider_name: str) -> Optional[tuple]:
+    logger.debug(f"Trying to get raw weather response with lat-lon: '{lat_lon}' and weather provider: "
+                f"'{weather_provider_name}'...")
+    try:
+        sql_query = f"""SELECT TIMESTAMP, WEATHER_RESPONSE from {WEATHER_RESPONSE_CACHE_TABLE_NAME} 
+        WHERE LAT_LON = ? AND WEATHER_PROVIDER = ?"""
+        result = await weather_db.storage.fetchone(sql_query, (lat_lon, weather_provider_name))
+    except Exception as err:
+        logger.error(f"Failed to get raw weather response from the DB.\n {err}")
+        raise FailedToGetWeatherDataFromDB("Failed to get raw weather response from the DB.")
     return result
 
 
+async def write_weather_response_into_db(lat_lon: str, weather_provider_name: str, timestamp: int,
+                                         weather_response: str) -> None:
+    logger.info(f"Writing raw weather response with lat-lon: '{lat_lon}' and weather provider: "
+                f"'{weather_provider_name}'...")
+    try:
+        sql_query = f"""INSERT into {WEATHER_RESPONSE_CACHE_TABLE_NAME} values (?, ?, ?, ?) 
+        ON CONFLICT (LAT_LON, WEATHER_PROVIDER) DO UPDATE SET TIMESTAMP = excluded.TIMESTAMP, 
+        WEATHER_RESPONSE = excluded.WEATHER_RESPONSE"""
+        await weather_db.storage.execute(sql_query, (lat_lon, weather_provider_name, timestamp, weather_response))
+    except Exception as err:
+        logger.error(err)
+        raise FailedToInsertWeatherDataIntoDB("Failed to write raw weather response into the DB.")
+
+
+async def check_weather_response_cache(weather_provider_name: str, timestamp: int, lat_lon: str) -> Optional[dict]:
+    """Function returns cached raw weather provider response for the location if it is not more than one hour old,
+    so all forecast types could be derived from a single provider call. Returns None otherwise."""
+    weather_response = weather_response_memory_cache.get((lat_lon, weather_provider_name), current_timestamp=timestamp)
+    if weather_response:
+        return weather_response
+    try:
+        result = await get_weather_response_from_db(lat_lon=lat_lon, weather_provider_name=weather_provider_name)
+    except FailedToCheckWeatherCache as err:
+        logger.error(err)
+        raise FailedToCheckWeatherCache(f"Unable to fetch raw weather response for lat-lon: '{lat_lon}' and "
+                                        f"weather_provider_name: '{weather_provider_name}' from the Weathed Cache DB.")
+    if not result or not check_time_frame(db_timestamp=result[0], current_timestamp=timestamp):
+        logger.info("Actual raw weather response is not present in the DB.")
+        return None
+    weather_response = json.loads(result[1])
+    weather_response_memory_cache.set((lat_lon, weather_provider_name), weather_response, timestamp=result[0])
+    return weather_response
+
+
+async def update_weather_response_cache(lat_lon: str, weather_provider_name: str, timestamp: int,
+                                        weather_response: dict) -> None:
+    weather_response_memory_cache.set((lat_lon, weather_provider_name), weather_response, timestamp=timestamp)
+    try:
+        await write_weather_response_into_db(lat_lon=lat_lon, weather_provider_name=weather_provider_name,
+                                             timestamp=timestamp, weather_response=json.dumps(weather_response))
+    except FailedToCheckWeatherCache as err:
+        logger.error(err)
+        raise FailedToUpdateWeatherCache("Failed to update raw weather response cache in the DB.")
+
+
+async def save_weather_hot_keys(timestamp: int) -> None:
+    """Adds scores of hot weather cache keys accessed since the previous save to the saved ones, so saved scores
+    sum up accesses served by all bot worker processes."""
+    records = [(*key, score, last_access) for key, score, last_access in weather_hot_keys.take_unsaved()]
+    await weather_db.storage.run(_merge_weather_hot_keys, records, weather_hot_keys.merge_scores,
+                                 timestamp - WEATHER_HOT_KEYS_RETENTION)
+    logger.debug(f"Saved {len(records)} hot weather cache keys.")
+
+
+def _merge_weather_hot_keys(connection: sqlite3.Connection, records: list,
+                            merge_scores: Callable[[float, int, float, int], float], expired_access: int) -> None:
+    connection.create_function("MERGE_SCORES", 4, merge_scores, deterministic=True)
+    try:
+        connection.executemany(
+            f"""INSERT INTO {WEATHER_HOT_KEYS_TABLE_NAME} values (?, ?, ?, ?, ?) 
+            ON CONFLICT (LAT_LON, WEATHER_PROVIDER, PERIOD) DO UPDATE SET 
+            SCORE = MERGE_SCORES(SCORE, LAST_ACCESS, excluded.SCORE, excluded.LAST_ACCESS), 
+            LAST_ACCESS = MAX(LAST_ACCESS, excluded.LAST_ACCESS)""", records)
+        # keys which were not requested for a long time have negligible score
+        connection.execute(f"DELETE FROM {WEATHER_HOT_KEYS_TABLE_NAME} WHERE LAST_ACCESS < ?", (expired_access,))
+        connection.commit()
+    except sqlite3.Error:
+        connection.rollback()
+        raise
+
+
+async def load_weather_hot_keys(timestamp: int) -> int:
+    """Loads saved hot weather cache keys of all workers into the tracker, returns number of loaded keys. Time when
+    weather of the key was cached is taken from the weather cache, as keys may be cached by other workers."""
+    sql_query = f"""SELECT LAT_LON, WEATHER_PROVIDER, PERIOD, SCORE, LAST_ACCESS, TIMESTAMP 
+    from {WEATHER_HOT_KEYS_TABLE_NAME} LEFT JOIN {WEATHER_CACHE_TABLE_NAME} USING (LAT_LON, WEATHER_PROVIDER, PERIOD)"""
+    result = await weather_db.storage.fetchall(sql_query)
+    weather_hot_keys.load((((lat_lon, weather_provider_name, period), score, last_access)
+                           for lat_lon, weather_provider_name, period, score, last_access, _ in result), timestamp)
+    for lat_lon, weather_provider_name, period, _, _, cached_at in result:
+        if cached_at is not None:
+            weather_hot_keys.record_cached((lat_lon, weather_provider_name, period), cached_at=cached_at)
+    return len(result)
+
+
+def check_time_frame(db_timestamp: Union[int, str], current_timestamp: Union[int, str],
+                     ttl: int = WEATHER_CACHE_TTL) -> bool:
+    """Functions checks whether current time exceeds time from DB record for more than 'ttl' seconds
+    (WEATHER_CACHE_TTL, an hour by default)."""
+    result = not (int(current_timestamp) - int(db_timestamp) > ttl)
+    logger.debug(f"Timeframe for current weather record is actual: '{result}'")
+    return result
+
+
+def log_weather_cache_stats() -> None:
+    """Logs hit/miss/eviction counters of in-memory weather cache tiers."""
+    weather_memory_cache.log_stats()
+    weather_response_memory_cache.log_stats()
+
+
 if __name__ == '__main__':
     # get_weather_item_from_db()
 
     # update_weather_item_in_db(lat_lon="46.472500000000025-30.73711000000003", weather_provider_name="Sinoptik",
     #                           timestamp=1652527777,
     #                           weather_data="Some Weather data 4444")
-    aaa = get_weather_item_from_db(lat_lon="46.58807000000007-30.941290000000038",
-                                   weather_provider_name="Openweathermap", period=WeatherForecastType.CURRENT)
+    aaa = asyncio.run(get_weather_item_from_db(lat_lon="46.58807000000007-30.941290000000038",
+                                               weather_provider_name="Openweathermap",
+                                               period=WeatherForecastType.CURRENT))
     print(aaa)
@@ -1,8 +1,5 @@
-from enum import Enum
 from pprint import pprint
-from typing import Optional, Tuple
-
-from loguru import logger
+from typing import Dict, Hashable, Iterable, Optional, Tuple
 
 from weather_providers.weather_provider_strategy import WeatherProviderName
 
@@ -16,46 +13,96 @@ WEATHER_EMOJI = {
     "DRIZZLE": ("\U000026C6", "Морось", "Drizzle"),
     "FOG_DUST": ("\U0001F32B", "Туман / Попіл", "Gog / Dust")
 }
+# position of weather summary in WEATHER_EMOJI items per output language
+WEATHER_SUMMARY_LANGUAGES = {"uk": 1, "en": 2}
 
 
-class OpenweathermapWeatherConditionsCodeRanges(Enum):
-    CLEAR_SKY = (800,),
-    CLOUDS = (803, 804),
-    CLOUD_WITH_RAIN = (500, 501, 502, 503, 504, 511, 520, 521, 522, 531),
-    SNOWFLAKE = (600, 601, 602, 611, 612, 613, 615, 616, 620, 621, 622),
-    SUN_BEHIND_CLOUD = (801, 802),
-    THUNDERSTORM = (200, 201, 202, 210, 211, 212, 221, 230, 231, 232),
-    DRIZZLE = (300, 301, 302, 310, 311, 312, 313, 314, 321),
-    FOG_DUST = (701, 711, 721, 731, 741, 751, 761, 762, 771, 781),
+# {weather condition: provider weather codes} tables, compiled into direct {code: condition} lookups on registration
+OPENWEATHERMAP_WEATHER_CONDITION_CODES = {
+    "CLEAR_SKY": (800,),
+    "CLOUDS": (803, 804),
+    "CLOUD_WITH_RAIN": (500, 501, 502, 503, 504, 511, 520, 521, 522, 531),
+    "SNOWFLAKE": (600, 601, 602, 611, 612, 613, 615, 616, 620, 621, 622),
+    "SUN_BEHIND_CLOUD": (801, 802),
+    "THUNDERSTORM": (200, 201, 202, 210, 211, 212, 221, 230, 231, 232),
+    "DRIZZLE": (300, 301, 302, 310, 311, 312, 313, 314, 321),
+    "FOG_DUST": (701, 711, 721, 731, 741, 751, 761, 762, 771, 781),
+}
 
+METEOMATICS_WEATHER_CONDITION_CODES = {
+    "CLEAR_SKY": (1, 101),
+    "CLOUDS": (3, 4, 103, 104),
+    "CLOUD_WITH_RAIN": (5, 6, 8, 10, 105, 106, 108, 110),
+    "SNOWFLAKE": (7, 9, 13, 107, 109, 113),
+    "SUN_BEHIND_CLOUD": (2, 102),
+    "THUNDERSTORM": (14, 114),
+    "DRIZZLE": (15, 115),
+    "FOG_DUST": (11, 12, 16, 111, 112, 116),
+}
+# sinoptik.ua icon classes without day/night prefix ("d210" -> "210"): cloudiness, precipitation intensity and type
+SINOPTIK_WEATHER_CONDITION_CODES = {
+    "CLEAR_SKY": ("000",),
+    "CLOUDS": ("300", "400"),
+    "CLOUD_WITH_RAIN": tuple(f"{cloudiness}{intensity}0" for cloudiness in range(1, 5) for intensity in (2, 3)),
+    "SNOWFLAKE": tuple(f"{cloudiness}{intensity}{snow}" for cloudiness in range(1, 5) for intensity in range(1, 4)
+                       for snow in (1, 2)),
+    "SUN_BEHIND_CLOUD": ("100", "200"),
+    "THUNDERSTORM": tuple(f"{cloudiness}40" for cloudiness in range(1, 5)),
+    "DRIZZLE": tuple(f"{cloudiness}10" for cloudiness in range(1, 5)),
+    "FOG_DUST": ("500", "600"),
+}
 
-class MetromaticsWeatherConditionsCodeRanges(Enum):
-    CLEAR_SKY = (1, 101),
-    CLOUDS = (3, 4, 103, 104),
-    CLOUD_WITH_RAIN = (5, 6, 8, 10, 105, 106, 108, 110),
-    SNOWFLAKE = (7, 9, 13, 107, 109, 113),
-    SUN_BEHIND_CLOUD = (2, 102),
-    THUNDERSTORM = (14, 114),
-    DRIZZLE = (15, 115),
-    FOG_DUST = (11, 12, 16, 111, 112, 116),
+_weather_condition_tables: Dict[str, Dict[Hashable, str]] = {}
 
 
-def get_weather_emojy(weather_provider_name: "str", weather_code: int) -> Optional[Tuple[str]]:
-    logger.debug(f"Getting weather provider class basing on provided name '{weather_provider_name}'")
-    if weather_provider_name == WeatherProviderName.OPENWEATHERMAP.value:
-        emoji_class = OpenweathermapWeatherConditionsCodeRanges
-    elif weather_provider_name == WeatherProviderName.METEOMATICS.value:
-        emoji_class = MetromaticsWeatherConditionsCodeRanges
-    else:
+def register_weather_condition_codes(weather_provider_name: str,
+                                     condition_codes: Dict[str, Iterable[Hashable]]) -> None:
+    """Registers weather provider codes of weather conditions ({WEATHER_EMOJI key: provider codes}), replacing
+    previously registered ones of the provider.
+
+    :raises ValueError: if condition is unknown or the same code is given for several conditions
+    """
+    condition_table = {}
+    for weather_condition, codes in condition_codes.items():
+        if weather_condition not in WEATHER_EMOJI:
+            raise ValueError(f"Unknown weather condition '{weather_condition}' for '{weather_provider_name}' codes.")
+        for code in codes:
+            if condition_table.setdefault(code, weather_condition) != weather_condition:
+                raise ValueError(f"'{weather_provider_name}' code {code!r} is given for conditions "
+                                 f"'{condition_table[code]}' and '{weather_condition}'.")
+    _weather_condition_tables[weather_provider_name] = condition_table
+
+
+register_weather_condition_codes(WeatherProviderName.OPENWEATHERMAP.value, OPENWEATHERMAP_WEATHER_CONDITION_CODES)
+register_weather_condition_codes(WeatherProviderName.METEOMATICS.value, METEOMATICS_WEATHER_CONDITION_CODES)
+register_weather_condition_codes(WeatherProviderName.SINOPTIC.value, SINOPTIK_WEATHER_CONDITION_CODES)
+
+
+def get_weather_condition(weather_provider_name: "str", weather_code: Hashable) -> Optional[str]:
+    """Returns language independent weather condition name (WEATHER_EMOJI key) for weather provider code, None if
+    provider or code is unknown."""
+    condition_table = _weather_condition_tables.get(weather_provider_name)
+    if condition_table is None:
         return None
-    logger.debug(f"Getting weather provider emoji basing on provided name '{weather_code}'")
-    for item in list(emoji_class):
-        if weather_code in item.value[0]:
-            weather_descr = item.name
-        else:
-            continue
-        return WEATHER_EMOJI.get(weather_descr)
+    return condition_table.get(weather_code)
+
+
+def get_weather_emojy(weather_provider_name: "str", weather_code: int) -> Optional[Tuple[str]]:
+    return WEATHER_EMOJI.get(get_weather_condition(weather_provider_name, weather_code))
+
+
+def get_weather_condition_emoji(weather_condition: str) -> str:
+    emoji_data = WEATHER_EMOJI.get(weather_condition)
+    return emoji_data[0] if emoji_data else ""
+
+
+def get_weather_summary(weather_condition: str, language: str) -> str:
+    """Returns weather condition summary in 'language', unknown conditions are returned as is."""
+    emoji_data = WEATHER_EMOJI.get(weather_condition)
+    if emoji_data is None:
+        return weather_condition
+    return emoji_data[WEATHER_SUMMARY_LANGUAGES.get(language, 1)]
 
 
 if __name__ == "__main__":
-    pprint(get_weather_emojy("openweathermap", 615))
+    pprint(get_weather_emojy(WeatherProviderName.OPENWEATHERMAP.value, 615))
@@ -1,151 +1,271 @@
+import asyncio
 from datetime import datetime
-from typing import Tuple, Union, List
+from math import ceil
+from typing import Tuple, Union, List, Optional
 from loguru import logger
+from app_storage import app_storage
+from config import WEATHER_CACHE_STALE_WHILE_REVALIDATE, WEATHER_CACHE_STALE_GRACE, WEATHER_CACHE_TTL, \
+    WEATHER_RENDER_CACHE_SIZE
+from geocoding.geocoding_utils import Coordinates
+from weather_cache.memory_cache import LRUTTLCache
+from weather_cache.single_flight import SingleFlight
 from weather_cache.weather_cache_exceptions import FailedToCheckWeatherCache, FailedToUpdateWeatherCache
-from weather_cache.weather_cache_utils import check_weather_cache, update_weather_cache
+from weather_cache.weather_cache_utils import check_weather_cache, update_weather_cache, \
+    check_weather_response_cache, update_weather_response_cache, check_time_frame
 from weather_providers.weather_meteomatics import MeteomaticsStrategy
 from weather_providers.weather_openweathermap import OpenWeatherMapStrategy
+from weather_providers.weather_sinoptik import SinoptikStrategy
 from weather_providers.weather_provider_exception import FailedFetchWeatherDataFromProvider
-from weather_providers.weather_provider_strategy import WeatherData, WeatherProviderName, WeatherForecastType
+from weather_providers.weather_provider_strategy import WeatherData, WeatherProviderName, WeatherForecastType, \
+    WeatherProviderStrategy
+from weather_rendering import render_weather_body, render_weather_header, render_freshness_marker, \
+    get_output_language, rendered_records_cache
 
 WEATHER_PROVIDER_STRATEGY_DICT = {WeatherProviderName.OPENWEATHERMAP.value: OpenWeatherMapStrategy(),
-                                  WeatherProviderName.METEOMATICS.value: MeteomaticsStrategy()}
-
-WEATHER_DODY_TEMPLATE_DICT = {
-    "date": "<b>Погода на:</b> \t<date>\n==================================",
-    "weather_emoji": "<b>Погода</b>:\t<weather_emoji>\t<weather_summary>",
-    "temperature": "<b>Температура повітря</b>:\t<temperature> С°",
-    "max_temperature": "<b>Максимальна температура повітря</b>:\t<max_temperature> С°",
-    "min_temperature": "<b>Мінімальна температура повітря</b>:\t<min_temperature> С°",
-    "wind_speed": "<b>Швидкість вітру</b>:\t<wind_speed> м/с\t<wind_direction>",
-    "pressure": "<b>Атмосферний тиск</b>:\t<pressure> мм рт.ст.",
-    "precipitation": "<b>Опади</b>:\t<precipitation> мм",
-    "humidity": "<b>Відносна вологість </b>:\t<humidity> %",
-    "sunrise": "<b>Схід сонця</b>: <sunrise>",
-    "sunset": "<b>Захід сонця</b>: <sunset>",
-}
-
-
-def compile_weather_output(lat_lon: str, weather_provider_name: str, forecast_type: str, city_name: str) -> str:
+                                  WeatherProviderName.METEOMATICS.value: MeteomaticsStrategy(),
+                                  WeatherProviderName.SINOPTIC.value: SinoptikStrategy(app_storage)}
+
+weather_output_flights = SingleFlight(name="weather output")
+weather_response_flights = SingleFlight(name="weather provider response")
+weather_refresh_flights = SingleFlight(name="weather background refresh")
+_background_tasks = set()
+# rendered output per weather cache record and language, the key includes record timestamp, so refreshed data is
+# rendered anew
+rendered_weather_cache = LRUTTLCache(max_size=WEATHER_RENDER_CACHE_SIZE, ttl=WEATHER_CACHE_TTL, name="rendered weather")
+
+
+async def compile_weather_output(lat_lon: str, weather_provider_name: str, forecast_type: str, city_name: str,
+                                 language: Optional[str] = None) -> str:
     """Returns HTML pre-formatted weather output for requested location, weather provider and coordinates,
-    based on weather forecast type."""
+    based on weather forecast type, in the language chosen in user options ('language')."""
     period = WeatherForecastType(forecast_type)
+    output_language = get_output_language(language)
     try:
-        compilled_weather_output = __get_and_update_weather(weather_provider_name=weather_provider_name,
-                                                            lat_lon=lat_lon,
-                                                            city_name=city_name, period=period)
-        return compilled_weather_output
+        cache_lat_lon = await __get_cache_lat_lon(lat_lon, weather_provider_name, city_name)
+        # concurrent identical requests share one cache lookup, provider fetch and cache write
+        weather_data, data_timestamp, is_stale = await weather_output_flights.do(
+            (cache_lat_lon, weather_provider_name, period.value), __get_and_update_weather,
+            weather_provider_name=weather_provider_name, lat_lon=cache_lat_lon, city_name=city_name, period=period)
+        weather_body = __render_weather_body(weather_data, cache_key=(cache_lat_lon, weather_provider_name,
+                                                                      period.value, data_timestamp),
+                                             language=output_language)
+        weather_output = "\n".join((render_weather_header(city_name), weather_body))
+        if is_stale:
+            weather_output = f"{weather_output}\n{render_freshness_marker(data_timestamp, output_language)}"
+        return weather_output
     except Exception:
         raise RuntimeError(
             f"Unable to compile weather output for the following options:\nWeather provider: {weather_provider_name}"
             f"\nCity name: {city_name}\nLatitude and Longitude: {lat_lon}")
 
 
-def __get_and_update_weather(weather_provider_name: str, lat_lon: str, city_name: str,
-                             period: WeatherForecastType) -> str:
-    """Returns current weather HTML pre-formatted weather output for requested location, weather provider and
-    coordinates.
+async def __get_cache_lat_lon(lat_lon: str, weather_provider_name: str, city_name: str) -> str:
+    """Returns lat-lon weather of the location is cached for by weather provider, grid cell of the location if the
+    provider is unknown (it fails later on fetch)."""
+    weather_provider = WEATHER_PROVIDER_STRATEGY_DICT.get(weather_provider_name)
+    if weather_provider is None:
+        return Coordinates.from_lat_lon(lat_lon).quantized_lat_lon()
+    return await weather_provider.get_cache_lat_lon(lat_lon, city_name)
+
+
+def __render_weather_body(weather_data: Union[WeatherData, List[WeatherData]], cache_key: tuple, language: str) -> str:
+    """Returns weather output body rendered in 'language', memoized per weather cache record and language."""
+    rendered_key = (*cache_key, language)
+    timestamp = int(datetime.now().timestamp())
+    weather_body = rendered_weather_cache.get(rendered_key, current_timestamp=timestamp)
+    if weather_body is None:
+        weather_body = render_weather_body(weather_data, language=language)
+        rendered_weather_cache.set(rendered_key, weather_body, timestamp=timestamp)
+    return weather_body
+
+
+async def __get_and_update_weather(weather_provider_name: str, lat_lon: str, city_name: str, period: WeatherForecastType
+                                   ) -> Tuple[Union[WeatherData, List[WeatherData]], int, bool]:
+    """Returns weather data for requested location, weather provider and coordinates, together with timestamp of
+    the data and whether it is stale.
 
     Function queries weather data for provided weather provider, forecast period and coordinates present in the DB.
-    If data exist -- returns data,
+    If actual data exist -- returns data,
+    if data is stale but within WEATHER_CACHE_STALE_GRACE -- returns it right away and refreshes it in background,
     if not -- updated DB with fresh data and returns it.
-    In case if it is failed to get weather data - returns text message with corresponding error.
+    In case if it is failed to get weather data from provider - returns last known data if it is present in the DB.
     """
-    now = datetime.now()
-    weather_data, needs_cache_update = __return_weather_data(weather_provider_name=weather_provider_name,
-                                                             city_name=city_name,
-                                                             timestamp=int(now.timestamp()),
-                                                             period=period,
-                                                             lat_lon=lat_lon)
-
-    if isinstance(weather_data, tuple):
-        text = weather_data[4]
-        return text
-
-    elif isinstance(weather_data, (WeatherData, list)):
-        text = __compile_weather_string(weather_data, period=period)
-        try:
-            update_weather_cache(
-                lat_lon=weather_data[0].lat_lon if isinstance(weather_data, list) else weather_data.lat_lon,
-                current_weather_data=text,
-                period=period,
-                weather_provider_name=weather_provider_name,
-                timestamp=int(weather_data[0].timestamp)) if isinstance(weather_data, list) else int(
-                weather_data.timestamp)
-        except FailedToUpdateWeatherCache as err:
-            logger.error(err)
-        return text
+    timestamp = int(datetime.now().timestamp())
+    logger.info("Checking weather cache ...")
+    try:
+        is_cached_data_actual, cached_data = await check_weather_cache(period=period,
+                                                                       weather_provider_name=weather_provider_name,
+                                                                       timestamp=timestamp,
+                                                                       lat_lon=lat_lon)
+    except FailedToCheckWeatherCache as err:
+        logger.error(f"Failed to fetch Weather data from the DB\n{err}")
+        raise err
+    if is_cached_data_actual:
+        return cached_data[4], cached_data[3], False
+    if cached_data and WEATHER_CACHE_STALE_WHILE_REVALIDATE and check_time_frame(
+            db_timestamp=cached_data[3], current_timestamp=timestamp, ttl=WEATHER_CACHE_TTL + WEATHER_CACHE_STALE_GRACE):
+        logger.info("Returning stale weather data, refreshing it in background...")
+        __schedule_weather_refresh(weather_provider_name=weather_provider_name, lat_lon=lat_lon,
+                                   city_name=city_name, period=period)
+        return cached_data[4], cached_data[3], True
+    try:
+        return await __refresh_weather(weather_provider_name=weather_provider_name, lat_lon=lat_lon,
+                                       city_name=city_name, period=period, timestamp=timestamp), timestamp, False
+    except FailedFetchWeatherDataFromProvider:
+        if not cached_data:
+            raise
+        logger.warning(f"Weather provider '{weather_provider_name}' is unavailable, returning last known data.")
+        return cached_data[4], cached_data[3], True
+
+
+async def refresh_weather_cache(weather_provider_name: str, lat_lon: str, period: WeatherForecastType) -> None:
+    """Refreshes weather cache record for cache lat-lon without user request (e.g. to prefetch hot locations),
+    cached raw provider response is used if it is still actual.
+
+    :raises FailedFetchWeatherDataFromProvider: if it is failed to fetch or parse weather data
+    """
+    await weather_refresh_flights.do((lat_lon, weather_provider_name, period.value), __refresh_weather,
+                                     weather_provider_name=weather_provider_name, lat_lon=lat_lon, city_name="",
+                                     period=period, timestamp=int(datetime.now().timestamp()))
+
+
+async def __refresh_weather(weather_provider_name: str, lat_lon: str, city_name: str, period: WeatherForecastType,
+                            timestamp: int) -> Union[WeatherData, List[WeatherData]]:
+    """Returns fresh provider weather data and updates weather cache with it."""
+    weather_data = await __return_weather_data(weather_provider_name=weather_provider_name, city_name=city_name,
+                                               timestamp=timestamp, period=period, lat_lon=lat_lon)
+    try:
+        await update_weather_cache(lat_lon=lat_lon,
+                                   weather_data=weather_data,
+                                   period=period,
+                                   weather_provider_name=weather_provider_name,
+                                   timestamp=timestamp)
+    except FailedToUpdateWeatherCache as err:
+        logger.error(err)
+    return weather_data
+
 
+def __schedule_weather_refresh(weather_provider_name: str, lat_lon: str, city_name: str,
+                               period: WeatherForecastType) -> None:
+    """Refreshes stale weather cache record in background, concurrent refreshes of the same record are coalesced."""
+    task = asyncio.get_running_loop().create_task(weather_refresh_flights.do(
+        (lat_lon, weather_provider_name, period.value), __background_refresh_weather,
+        weather_provider_name=weather_provider_name, lat_lon=lat_lon, city_name=city_name, period=period))
+    # keep reference to the task until it is done, so it is not garbage collected
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
 
-def __return_weather_data(weather_provider_name: str, city_name: str, timestamp: int, period: WeatherForecastType,
-                          lat_lon: str) -> Tuple[Union[WeatherData, tuple], bool]:
-    """Function checks if weather data for provided weather provider, forecast period and coordinates present in the DB,
-     if Yes, returns existing cached data, else, fetches weather data from weather provider.
+
+async def __background_refresh_weather(weather_provider_name: str, lat_lon: str, city_name: str,
+                                       period: WeatherForecastType) -> None:
+    try:
+        await __refresh_weather(weather_provider_name=weather_provider_name, lat_lon=lat_lon, city_name=city_name,
+                                period=period, timestamp=int(datetime.now().timestamp()))
+    except Exception as err:
+        logger.error(f"Background weather refresh failed for lat-lon '{lat_lon}' and weather provider "
+                     f"'{weather_provider_name}'\n{err}")
+
+
+async def cancel_weather_refreshes() -> None:
+    """Cancels background weather refreshes, should be called on bot shutdown."""
+    for task in list(_background_tasks):
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+
+
+async def __return_weather_data(weather_provider_name: str, city_name: str, timestamp: int,
+                                period: WeatherForecastType, lat_lon: str) -> Union[WeatherData, List[WeatherData]]:
+    """Function derives weather data for provided weather provider, forecast period and coordinates from raw provider
+     response for the location.
 
      :param weather_provider_name: string with weather provider name
      :param city_name: string with location to get weather
      :param timestamp: current timestamp
      :param period: instance of WeatherForecastType class
-     :param lat_lon: string containing latitude and longitude in "46.58807000000007-30.941290000000038" format
-     :return: Tuple[Union[WeatherData, tuple] -- cached or freshly fetched weather data from weather provider,
-     bool -- indicator whether it requres to updated weather cache]
+     :param lat_lon: string containing cache latitude and longitude (e.g. quantized one in "46.60,30.95" format)
+     :return: Union[WeatherData, List[WeatherData]] -- freshly fetched weather data from weather provider
+     :raises FailedFetchWeatherDataFromProvider: if it is failed to fetch or parse weather data
      """
-    logger.info("Checking weather cache ...")
-    try:
-        is_cached_data_actual, cached_data = check_weather_cache(period=period,
-                                                                 weather_provider_name=weather_provider_name,
-                                                                 timestamp=timestamp,
-                                                                 lat_lon=lat_lon)
-        if is_cached_data_actual:
-            return cached_data, False
-    except FailedToCheckWeatherCache as err:
-        logger.error(f"Failed to fetch Weather data from the DB\n{err}")
-        raise err
     weather_provider = WEATHER_PROVIDER_STRATEGY_DICT.get(weather_provider_name)
     try:
-        weather_data = weather_provider.fetch_weather_data(lat_lon=lat_lon, city_name=city_name, period=period)
+        if weather_provider is None:
+            logger.error(f"Unknown weather provider '{weather_provider_name}'")
+            raise FailedFetchWeatherDataFromProvider
+        # different forecast types for the same location share one raw provider response
+        weather_response = await weather_response_flights.do((lat_lon, weather_provider_name),
+                                                             __return_weather_response,
+                                                             weather_provider=weather_provider,
+                                                             weather_provider_name=weather_provider_name,
+                                                             timestamp=timestamp, lat_lon=lat_lon)
+        weather_data = weather_provider.parse_weather_data(weather_response=weather_response, lat_lon=lat_lon,
+                                                           city_name=city_name, period=period)
         if not weather_data:
             raise FailedFetchWeatherDataFromProvider
-        return weather_data, True
+        return weather_data
     except FailedFetchWeatherDataFromProvider:
         logger.error(f"Failed to fetch weather data for city: '{city_name}' and weather provider "
                      f"'{weather_provider_name}'")
+        raise
+
+
+async def __return_weather_response(weather_provider: WeatherProviderStrategy, weather_provider_name: str,
+                                    timestamp: int, lat_lon: str) -> dict:
+    """Returns raw weather provider response for the location from the cache if it is still actual, otherwise fetches
+    it from weather provider and caches it. Single raw response serves all WeatherForecastType views, so requesting
+    current, today's and five days weather for the same location costs one provider call.
+    """
+    weather_response = None
+    try:
+        weather_response = await check_weather_response_cache(weather_provider_name=weather_provider_name,
+                                                              timestamp=timestamp, lat_lon=lat_lon)
+    except FailedToCheckWeatherCache as err:
+        logger.error(err)
+    if weather_response:
+        logger.info("Using cached raw weather provider response.")
+        return weather_response
+    weather_response = await weather_provider.fetch_weather_response(lat_lon=lat_lon)
+    if not weather_response:
+        raise FailedFetchWeatherDataFromProvider
+    try:
+        await update_weather_response_cache(lat_lon=lat_lon, weather_provider_name=weather_provider_name,
+                                            timestamp=timestamp, weather_response=weather_response)
+    except FailedToUpdateWeatherCache as err:
+        logger.error(err)
+    return weather_response
+
+
+async def prefetch_weather_responses(weather_provider_name: str, lat_lons: List[str], calls_budget: int
+                                     ) -> Tuple[List[str], int]:
+    """Fetches raw provider responses of cache lat-lons and caches them, providers which query many locations at
+    once serve up to 'max_locations_per_request' locations per call. Locations which do not fit into 'calls_budget'
+    are skipped.
+
+    :return: lat-lons with freshly cached responses and number of provider calls made
+    """
+    weather_provider = WEATHER_PROVIDER_STRATEGY_DICT[weather_provider_name]
+    lat_lons = lat_lons[:calls_budget * weather_provider.max_locations_per_request]
+    if not lat_lons:
+        return [], 0
+    timestamp = int(datetime.now().timestamp())
+    weather_responses = await weather_provider.fetch_weather_responses(lat_lons)
+    fetched_lat_lons = []
+    for lat_lon, weather_response in weather_responses.items():
+        if not weather_response:
+            continue
+        try:
+            await update_weather_response_cache(lat_lon=lat_lon, weather_provider_name=weather_provider_name,
+                                                timestamp=timestamp, weather_response=weather_response)
+        except FailedToUpdateWeatherCache as err:
+            logger.error(err)
+            continue
+        fetched_lat_lons.append(lat_lon)
+    return fetched_lat_lons, ceil(len(lat_lons) / weather_provider.max_locations_per_request)
 
 
-def __build_weather_string_list(weather_data: WeatherData):
-    weather_body_list = [v for k, v in
-                         WEATHER_DODY_TEMPLATE_DICT.items() if weather_data.__getattribute__(k)]
-    return weather_body_list
-
-
-def __compile_weather_string(weather_data: Union[WeatherData, List[WeatherData]], period: WeatherForecastType):
-    if isinstance(weather_data, WeatherData):
-        weather_header_template = "<b>** <city_name> **</b>\n".replace("<city_name>", str(weather_data.city_name))
-        weather_body_list = __build_weather_string_list(weather_data=weather_data)
-        weather_body_string = "\n".join(weather_body_list)
-        for key, value in weather_data.__dict__.items():
-            if key in weather_body_string:
-                if key == "date" and period == WeatherForecastType.CURRENT:
-                    weather_body_string = weather_body_string.replace(f"<{key}>",
-                                                                      str(datetime.now().strftime("%Y-%m-%d %H:%M")))
-                weather_body_string = weather_body_string.replace(f"<{key}>", str(value))
-        final_weather_string = "\n".join((weather_header_template, weather_body_string))
-        return f"{final_weather_string}\n=================================="
-
-    if isinstance(weather_data, list):
-        weather_header_template = "<b>** <city_name> **</b>\n".replace("<city_name>", str(weather_data[0].city_name))
-        weather_body_string = __build_string_body_from_list(weather_data=weather_data)
-        final_weather_string = "\n".join((weather_header_template, weather_body_string))
-        return final_weather_string
-
-
-def __build_string_body_from_list(weather_data: List[WeatherData]) -> str:
-    final_string = ""
-    for item in weather_data:
-        weather_body_list = __build_weather_string_list(weather_data=item)
-        weather_body_string = "\n".join(weather_body_list)
-        for key, value in item.__dict__.items():
-            if key in weather_body_string:
-                weather_body_string = weather_body_string.replace(f"<{key}>", str(value))
-        final_string += f"{weather_body_string}\n==================================\n\n"
-    return final_string
+def log_weather_operations_stats() -> None:
+    """Logs how many concurrent weather requests were deduplicated."""
+    weather_output_flights.log_stats()
+    weather_response_flights.log_stats()
+    weather_refresh_flights.log_stats()
+    rendered_weather_cache.log_stats()
+    rendered_records_cache.log_stats()
@@ -0,0 +1,115 @@
+"""Module contains scheduler which refreshes weather cache for hot locations shortly before cached data expires."""
+
+import asyncio
+import time
+from typing import Optional, Dict, List
+
+from loguru import logger
+
+from config import WEATHER_CACHE_TTL, WEATHER_PREFETCH_INTERVAL, WEATHER_PREFETCH_TOP_N, WEATHER_PREFETCH_LEAD_TIME, \
+    WEATHER_PREFETCH_CALLS_BUDGET, WEATHER_PREFETCH_MIN_SCORE
+from weather_cache.weather_cache_exceptions import FailedToCheckWeatherCache
+from weather_cache.weather_cache_utils import weather_hot_keys, check_weather_cache, save_weather_hot_keys, \
+    load_weather_hot_keys
+from weather_operations import refresh_weather_cache, prefetch_weather_responses
+from weather_providers.weather_provider_exception import FailedFetchWeatherDataFromProvider
+from weather_providers.weather_provider_strategy import WeatherForecastType
+
+_prefetch_task: Optional[asyncio.Task] = None
+
+
+async def prefetch_hot_weather(top_n: int = WEATHER_PREFETCH_TOP_N, lead_time: int = WEATHER_PREFETCH_LEAD_TIME,
+                               calls_budget: int = WEATHER_PREFETCH_CALLS_BUDGET,
+                               min_score: float = WEATHER_PREFETCH_MIN_SCORE) -> int:
+    """Refreshes cached weather of 'top_n' most requested keys which expire within 'lead_time' seconds. Keys scored
+    below 'min_score' and keys which were never cached successfully (e.g. provider fails for the location) are skipped.
+
+    Raw provider responses of expiring locations are fetched first, several locations per call if provider supports
+    it, then all forecast types of the locations are derived from the cached responses. The budget is counted in
+    provider calls. Returns number of provider calls made.
+    """
+    now = int(time.time())
+    expiring_keys = [hot_key.key for hot_key in weather_hot_keys.top(top_n, timestamp=now, min_score=min_score)
+                     if hot_key.cached_at and hot_key.cached_at + WEATHER_CACHE_TTL - now <= lead_time]
+    provider_lat_lons: Dict[str, List[str]] = {}
+    for lat_lon, weather_provider_name, _ in expiring_keys:
+        lat_lons = provider_lat_lons.setdefault(weather_provider_name, [])
+        if lat_lon not in lat_lons:
+            lat_lons.append(lat_lon)
+    calls = 0
+    fetched_locations = set()
+    for weather_provider_name, lat_lons in provider_lat_lons.items():
+        if calls >= calls_budget:
+            logger.debug(f"Prefetch provider calls budget ({calls_budget}) is exhausted.")
+            break
+        fetched_lat_lons, provider_calls = await prefetch_weather_responses(
+            weather_provider_name=weather_provider_name, lat_lons=lat_lons, calls_budget=calls_budget - calls)
+        calls += provider_calls
+        fetched_locations.update((lat_lon, weather_provider_name) for lat_lon in fetched_lat_lons)
+    for lat_lon, weather_provider_name, period in expiring_keys:
+        if (lat_lon, weather_provider_name) not in fetched_locations:
+            continue
+        try:
+            await refresh_weather_cache(weather_provider_name=weather_provider_name, lat_lon=lat_lon,
+                                        period=WeatherForecastType(period))
+        except FailedFetchWeatherDataFromProvider:
+            logger.error(f"Failed to prefetch weather for lat-lon '{lat_lon}' and weather provider "
+                         f"'{weather_provider_name}'")
+    if fetched_locations:
+        logger.info(f"Prefetched weather for {len(fetched_locations)} hot locations in {calls} provider calls.")
+    return calls
+
+
+async def warm_up_weather_cache(top_n: int = WEATHER_PREFETCH_TOP_N) -> None:
+    """Loads saved hot keys and loads their actual cached records into in-memory tier, expired ones are refreshed by
+    the following prefetch run."""
+    now = int(time.time())
+    loaded_keys = await load_weather_hot_keys(now)
+    logger.info(f"Loaded {loaded_keys} hot weather cache keys, warming up weather cache...")
+    for hot_key in weather_hot_keys.top(top_n, timestamp=now):
+        lat_lon, weather_provider_name, period = hot_key.key
+        try:
+            await check_weather_cache(weather_provider_name=weather_provider_name, timestamp=now,
+                                      period=WeatherForecastType(period), lat_lon=lat_lon, track_access=False)
+        except (FailedToCheckWeatherCache, ValueError) as err:
+            logger.error(err)
+
+
+async def __prefetch_loop(interval: int, prefetch: bool) -> None:
+    if prefetch:
+        await warm_up_weather_cache()
+    while True:
+        try:
+            # keys are saved by every worker and prefetch picks them from scores merged across all workers
+            await save_weather_hot_keys(int(time.time()))
+            if prefetch:
+                await load_weather_hot_keys(int(time.time()))
+                await prefetch_hot_weather()
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            logger.error(f"Hot weather prefetch failed.\n{err}")
+        await asyncio.sleep(interval)
+
+
+def start_weather_prefetch(interval: int = WEATHER_PREFETCH_INTERVAL, prefetch: bool = True) -> None:
+    """Schedules hot locations weather prefetch on the running event loop. With 'prefetch' set to False (bot
+    workers except the first one) hot keys are only saved, so the prefetching worker sees accesses of all workers."""
+    global _prefetch_task
+    if _prefetch_task is None or _prefetch_task.done():
+        logger.info(f"Scheduling hot locations weather {'prefetch' if prefetch else 'keys saving'} every "
+                    f"{interval} seconds...")
+        _prefetch_task = asyncio.get_running_loop().create_task(__prefetch_loop(interval, prefetch))
+
+
+async def stop_weather_prefetch() -> None:
+    """Stops prefetch scheduler and saves hot keys, so the cache can be warmed up after restart."""
+    global _prefetch_task
+    if _prefetch_task is not None:
+        _prefetch_task.cancel()
+        try:
+            await _prefetch_task
+        except asyncio.CancelledError:
+            pass
+        _prefetch_task = None
+    await save_weather_hot_keys(int(time.time()))
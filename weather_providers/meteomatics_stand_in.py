@@ -0,0 +1,93 @@
+"""Contains local stand-in of Meteomatics API which serves recorded responses, so Meteomatics provider can be run and
+checked without credentials and network access.
+
+Every requested location is answered with recorded data of the nearest recorded location (relabelled with requested
+coordinates), recorded time points are served as is. Number of served requests and locations is logged, so it is
+seen how many calls refreshing of many locations costs.
+
+Usage:
+    python -m weather_providers.meteomatics_stand_in [recorded.json ...] [--host 127.0.0.1] [--port 8081]
+    METEOMATICS_BASE_URL=http://127.0.0.1:8081 python main.py
+
+Without arguments 'output_examples/meteomatics_batch_out.json' is served.
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+from loguru import logger
+
+RECORDED_RESPONSE_FILE_NAME = os.path.join(os.path.dirname(__file__), "output_examples",
+                                           "meteomatics_batch_out.json")
+
+
+def load_recorded_locations(file_names: List[str]) -> Dict[Tuple[float, float], Dict[str, List[dict]]]:
+    """Returns {(latitude, longitude): {parameter: dates}} of recorded Meteomatics responses."""
+    recorded_locations = {}
+    for file_name in file_names:
+        with open(file_name, encoding="utf-8") as file:
+            recorded_response = json.load(file)
+        for parameter_data in recorded_response["data"]:
+            for coordinates in parameter_data["coordinates"]:
+                recorded_locations.setdefault((coordinates["lat"], coordinates["lon"]), {})[
+                    parameter_data["parameter"]] = coordinates["dates"]
+    return recorded_locations
+
+
+def _nearest_location(recorded_locations: Dict[Tuple[float, float], Dict[str, List[dict]]], latitude: float,
+                      longitude: float) -> Dict[str, List[dict]]:
+    nearest = min(recorded_locations,
+                  key=lambda location: (location[0] - latitude) ** 2 + (location[1] - longitude) ** 2)
+    return recorded_locations[nearest]
+
+
+async def query_handler(request: web.Request) -> web.Response:
+    """Answers '<time points>/<parameters>/<locations>/json' query with recorded data."""
+    recorded_locations = request.app["recorded_locations"]
+    try:
+        locations = [tuple(float(item) for item in location.split(","))
+                     for location in request.match_info["locations"].split("+")]
+    except ValueError:
+        raise web.HTTPBadRequest(text=f"Malformed locations '{request.match_info['locations']}'")
+    data = []
+    for parameter in request.match_info["parameters"].split(","):
+        coordinates = [{"lat": latitude, "lon": longitude,
+                        "dates": _nearest_location(recorded_locations, latitude, longitude).get(parameter)}
+                       for latitude, longitude in locations]
+        if all(item["dates"] is not None for item in coordinates):
+            data.append({"parameter": parameter, "coordinates": coordinates})
+    served = request.app["served"]
+    served["requests"] += 1
+    served["locations"] += len(locations)
+    logger.info(f"Served {len(locations)} locations, {served['requests']} requests and {served['locations']} "
+                f"locations in total.")
+    return web.json_response({"version": "3.0", "user": "stand-in",
+                              "dateGenerated": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                              "status": "OK", "data": data})
+
+
+def create_stand_in_app(file_names: List[str]) -> web.Application:
+    app = web.Application()
+    app["recorded_locations"] = load_recorded_locations(file_names)
+    app["served"] = {"requests": 0, "locations": 0}
+    app.router.add_get("/{time_points}/{parameters}/{locations}/json", query_handler)
+    return app
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m weather_providers.meteomatics_stand_in",
+                                     description="Local Meteomatics API stand-in serving recorded responses.")
+    parser.add_argument("file_names", nargs="*", help="recorded Meteomatics JSON responses")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args(argv)
+    web.run_app(create_stand_in_app(args.file_names or [RECORDED_RESPONSE_FILE_NAME]), host=args.host,
+                port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Contains weather provider parsing benchmark over recorded raw provider responses: parse time and memory allocated
+per forecast type. Sinoptik forecast pages are parsed into raw responses first, page parse time and memory are
+measured as well.
+
+Usage:
+    python -m weather_providers.parsing_benchmark [onecall.json ...] [--db app_db.db] [--repeat 1000]
+    python -m weather_providers.parsing_benchmark --provider Sinoptik [page.html ...] [--page-repeat 100]
+
+Without arguments 'output_examples/onecall_openweathermap.json' or saved Sinoptik pages
+'output_examples/sinoptik_*.html' are used, with '--db' raw responses of the provider cached in the application DB are
+used as well.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import List, Optional, Tuple
+
+from loguru import logger
+
+from config import WEATHER_RESPONSE_CACHE_TABLE_NAME
+from weather_providers.weather_openweathermap import OpenWeatherMapStrategy
+from weather_providers.weather_provider_strategy import WeatherForecastType, WeatherProviderStrategy, \
+    WeatherProviderName
+from weather_providers.weather_sinoptik import SinoptikStrategy, SinoptikPageParser, PAGE_CHUNK_SIZE
+
+ONECALL_EXAMPLE_FILE_NAME = os.path.join(os.path.dirname(__file__), "output_examples", "onecall_openweathermap.json")
+SINOPTIK_PAGE_FILE_NAMES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "output_examples",
+                                                         "sinoptik_*.html")))
+WEATHER_PROVIDERS = {WeatherProviderName.OPENWEATHERMAP.value: OpenWeatherMapStrategy,
+                     WeatherProviderName.SINOPTIC.value: SinoptikStrategy}
+
+
+def load_recorded_responses(file_names: List[str], db_name: Optional[str] = None,
+                            weather_provider_name: str = WeatherProviderName.OPENWEATHERMAP.value) -> List[dict]:
+    """Returns raw responses from JSON files and cached in weather response cache table of 'db_name' DB."""
+    responses = []
+    for file_name in file_names:
+        with open(file_name, encoding="utf-8") as file:
+            responses.append(json.load(file))
+    if db_name:
+        connection = sqlite3.connect(f"file:{db_name}?mode=ro", uri=True)
+        try:
+            rows = connection.execute(f"SELECT WEATHER_RESPONSE FROM {WEATHER_RESPONSE_CACHE_TABLE_NAME} "
+                                      f"WHERE WEATHER_PROVIDER = ?", (weather_provider_name,)).fetchall()
+        finally:
+            connection.close()
+        responses.extend(json.loads(row[0]) for row in rows)
+    return responses
+
+
+def _parse_page(page: str, chunk_size: int) -> Tuple[dict, int]:
+    """Returns values collected from the page fed in chunks and number of characters fed until they were collected."""
+    parser = SinoptikPageParser()
+    fed = 0
+    while fed < len(page) and not parser.complete:
+        parser.feed(page[fed:fed + chunk_size])
+        fed += chunk_size
+    parser.close()
+    return parser.weather_response, min(fed, len(page))
+
+
+def benchmark_page_parsing(pages: List[str], repeat: int = 100, chunk_size: int = PAGE_CHUNK_SIZE) -> List[dict]:
+    """Prints Sinoptik page parse time, memory allocated while parsing and share of the page parsed before all
+    values were collected, returns collected values (raw responses) of the pages."""
+    timings = []
+    for _ in range(repeat):
+        for page in pages:
+            start = time.perf_counter()
+            _parse_page(page, chunk_size)
+            timings.append(time.perf_counter() - start)
+    responses, allocated_peaks, parsed_shares = [], [], []
+    for page in pages:
+        tracemalloc.start()
+        weather_response, fed = _parse_page(page, chunk_size)
+        _, allocated_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        responses.append(weather_response)
+        allocated_peaks.append(allocated_peak)
+        parsed_shares.append(fed / len(page))
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    page_size = sum(len(page.encode("utf-8")) for page in pages) / len(pages)
+    print(f"PAGE: median {statistics.median(timings) * 1e3:.2f} ms, p95 {p95 * 1e3:.2f} ms, "
+          f"allocated peak {max(allocated_peaks) / 1024:.0f} KiB, page {page_size / 1024:.0f} KiB, "
+          f"parsed {statistics.mean(parsed_shares):.0%} of the page, "
+          f"response {statistics.mean(len(json.dumps(item)) for item in responses):.0f} B JSON")
+    return responses
+
+
+def _records_size(weather_data) -> int:
+    records = weather_data if isinstance(weather_data, list) else [weather_data]
+    size = sys.getsizeof(weather_data) if isinstance(weather_data, list) else 0
+    for record in records:
+        size += sys.getsizeof(record) + sum(sys.getsizeof(getattr(record, name)) for name in record.__slots__)
+    return size
+
+
+def benchmark_parsing(weather_provider: WeatherProviderStrategy, responses: List[dict], repeat: int = 1000) -> None:
+    """Prints parse time, memory allocated while parsing and size of resulting records per forecast type."""
+    for period in WeatherForecastType:
+        timings = []
+        for _ in range(repeat):
+            for response in responses:
+                start = time.perf_counter()
+                weather_provider.parse_weather_data(weather_response=response, lat_lon="", city_name="",
+                                                    period=period)
+                timings.append(time.perf_counter() - start)
+        tracemalloc.start()
+        results = [weather_provider.parse_weather_data(weather_response=response, lat_lon="", city_name="",
+                                                       period=period) for response in responses]
+        _, allocated_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        records_size = sum(_records_size(weather_data) for weather_data in results if weather_data)
+        print(f"{period.name}: median {statistics.median(timings) * 1e6:.1f} us, p95 {p95 * 1e6:.1f} us, "
+              f"allocated {allocated_peak / len(responses):.0f} B, records {records_size / len(responses):.0f} B "
+              f"per response")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m weather_providers.parsing_benchmark",
+                                     description="Weather provider parsing benchmark.")
+    parser.add_argument("file_names", nargs="*",
+                        help="recorded OpenWeatherMap onecall responses or saved Sinoptik forecast pages")
+    parser.add_argument("--provider", choices=list(WEATHER_PROVIDERS), default=WeatherProviderName.OPENWEATHERMAP.value)
+    parser.add_argument("--db", help="application DB with cached raw weather responses")
+    parser.add_argument("--repeat", type=int, default=1000)
+    parser.add_argument("--page-repeat", type=int, default=100)
+    parser.add_argument("--chunk-size", type=int, default=PAGE_CHUNK_SIZE, help="Sinoptik page chunk size")
+    args = parser.parse_args(argv)
+    # debug logging is not measured, as it is disabled in production
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    if args.provider == WeatherProviderName.SINOPTIC.value:
+        pages = []
+        for file_name in args.file_names or ([] if args.db else SINOPTIK_PAGE_FILE_NAMES):
+            with open(file_name, encoding="utf-8") as file:
+                pages.append(file.read())
+        if pages:
+            print(f"Parsing {len(pages)} saved pages...")
+        responses = benchmark_page_parsing(pages, args.page_repeat, args.chunk_size) if pages else []
+        responses.extend(load_recorded_responses([], args.db, args.provider))
+    else:
+        file_names = args.file_names or ([] if args.db else [ONECALL_EXAMPLE_FILE_NAME])
+        responses = load_recorded_responses(file_names, args.db, args.provider)
+    if not responses:
+        sys.exit("There are no recorded responses to parse.")
+    print(f"Parsing {len(responses)} recorded responses...")
+    benchmark_parsing(WEATHER_PROVIDERS[args.provider](), responses, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import json
+import os
+from datetime import datetime, timezone
+
+from weather_providers.weather_meteomatics import MeteomaticsStrategy, split_weather_response, get_time_points, \
+    PARAMETERS, MISSING_VALUE
+from weather_providers.weather_provider_strategy import WeatherForecastType
+
+BATCH_RESPONSE_FILE_NAME = os.path.join(os.path.dirname(__file__), "output_examples", "meteomatics_batch_out.json")
+ODESA, KYIV = "46.50,30.70", "50.45,30.50"
+# 2022-05-06T00:00:00Z
+FIRST_DAY_END = 1651795200
+
+
+def _load_batch_response() -> dict:
+    with open(BATCH_RESPONSE_FILE_NAME, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def test_time_points_are_now_and_utc_midnights():
+    time_points = get_time_points(datetime(2022, 5, 5, 21, 43, 17, tzinfo=timezone.utc))
+    assert time_points[0] == datetime(2022, 5, 5, 21, 43, tzinfo=timezone.utc)
+    assert time_points[1:] == [datetime(2022, 5, 6 + day, tzinfo=timezone.utc) for day in range(6)]
+
+
+def test_batch_response_is_split_per_location():
+    weather_responses = split_weather_response(_load_batch_response(), [KYIV, ODESA, "10.00,10.00"])
+    assert set(weather_responses) == {ODESA, KYIV}
+    for weather_response in weather_responses.values():
+        assert [parameter_data["parameter"] for parameter_data in weather_response["data"]] == list(PARAMETERS)
+        assert all(len(parameter_data["coordinates"]) == 1 for parameter_data in weather_response["data"])
+    assert weather_responses[KYIV]["data"][0]["coordinates"][0]["lat"] == 50.45
+
+
+def test_current_weather_is_parsed_from_the_first_time_point():
+    weather_response = split_weather_response(_load_batch_response(), [ODESA])[ODESA]
+    weather_data = MeteomaticsStrategy().parse_weather_data(weather_response, lat_lon=ODESA, city_name="Odesa",
+                                                            period=WeatherForecastType.CURRENT)
+    assert weather_data.timestamp == int(datetime(2022, 5, 5, 21, 43, tzinfo=timezone.utc).timestamp())
+    assert (weather_data.temperature, weather_data.wind_speed, weather_data.wind_direction) == (12.4, 4.1, 41.3)
+    assert (weather_data.pressure, weather_data.humidity) == (1016, 61.2)
+    assert weather_data.max_temperature is None and weather_data.precipitation is None
+
+
+def test_forecast_days_are_parsed_from_following_time_points():
+    weather_response = split_weather_response(_load_batch_response(), [ODESA])[ODESA]
+    strategy = MeteomaticsStrategy()
+    today = strategy.parse_weather_data(weather_response, lat_lon=ODESA, city_name="Odesa",
+                                        period=WeatherForecastType.TODAY)
+    assert len(today) == 1
+    assert today[0].timestamp == FIRST_DAY_END - 86400
+    assert (today[0].max_temperature, today[0].min_temperature, today[0].precipitation) == (18.9, 8.3, 0.0)
+    five_days = strategy.parse_weather_data(weather_response, lat_lon=ODESA, city_name="Odesa",
+                                            period=WeatherForecastType.FIVE_DAYS)
+    assert [weather_data.timestamp for weather_data in five_days] == [FIRST_DAY_END + day * 86400
+                                                                      for day in range(5)]
+    assert [weather_data.max_temperature for weather_data in five_days] == [19.4, 20.2, 16.7, 17.8, 19.6]
+
+
+def test_missing_values_and_days_are_not_parsed():
+    weather_response = split_weather_response(_load_batch_response(), [ODESA])[ODESA]
+    for parameter_data in weather_response["data"]:
+        if parameter_data["parameter"] == "t_2m:C":
+            parameter_data["coordinates"][0]["dates"][0]["value"] = MISSING_VALUE
+        # the last forecast day is missing
+        del parameter_data["coordinates"][0]["dates"][-1]
+    strategy = MeteomaticsStrategy()
+    assert strategy.parse_weather_data(weather_response, lat_lon=ODESA, city_name="Odesa",
+                                       period=WeatherForecastType.CURRENT).temperature is None
+    assert strategy.parse_weather_data(weather_response, lat_lon=ODESA, city_name="Odesa",
+                                       period=WeatherForecastType.FIVE_DAYS) is None
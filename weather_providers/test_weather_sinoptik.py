@@ -0,0 +1,88 @@
+import asyncio
+import os
+from datetime import datetime
+
+import weather_providers.weather_sinoptik
+from app_storage import AsyncSQLiteDB
+from geocoding.gazetteer import GazetteerPlace
+from weather_providers.weather_sinoptik import SinoptikStrategy, parse_page, get_page_name
+from weather_providers.weather_provider_strategy import WeatherForecastType
+
+OUTPUT_EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), "output_examples")
+ODESA, KYIV = "46.48572,30.74383", "50.45466,30.52380"
+
+
+def _load_page(city: str) -> str:
+    with open(os.path.join(OUTPUT_EXAMPLES_DIR, f"sinoptik_{city}.html"), encoding="utf-8") as file:
+        return file.read()
+
+
+def test_page_parsing_does_not_depend_on_chunk_boundaries():
+    for city in ("odesa", "kyiv"):
+        page = _load_page(city)
+        weather_response = parse_page(page)
+        assert all(parse_page(page, chunk_size=chunk_size) == weather_response for chunk_size in (1, 7, 1000))
+        assert len(weather_response["days"]) == 7
+        assert all(len(values) == 8 for values in weather_response["hours"].values())
+
+
+def test_current_weather_is_parsed_from_the_latest_started_hour():
+    weather_response = parse_page(_load_page("odesa"))
+    weather_data = SinoptikStrategy().parse_weather_data(weather_response, lat_lon=ODESA, city_name="Одеса",
+                                                         period=WeatherForecastType.CURRENT)
+    assert weather_data.timestamp == int(datetime(2022, 5, 5, 21, 43).timestamp())
+    assert weather_data.sunrise == int(datetime(2022, 5, 5, 5, 10).timestamp())
+    # current temperature is shown separately, the rest is taken from 21:00 column, pressure is converted to hPa
+    assert (weather_data.temperature, weather_data.humidity, weather_data.pressure) == (8, 70, 1011)
+    assert (weather_data.wind_speed, weather_data.wind_direction) == (6.7, 180)
+
+
+def test_forecast_days_are_parsed_from_day_tabs():
+    weather_response = parse_page(_load_page("kyiv"))
+    strategy = SinoptikStrategy()
+    today = strategy.parse_weather_data(weather_response, lat_lon=KYIV, city_name="Київ",
+                                        period=WeatherForecastType.TODAY)
+    assert (today[0].min_temperature, today[0].max_temperature) == (9, 15)
+    assert today[0].sunset == int(datetime(2022, 5, 5, 20, 24).timestamp())
+    five_days = strategy.parse_weather_data(weather_response, lat_lon=KYIV, city_name="Київ",
+                                            period=WeatherForecastType.FIVE_DAYS)
+    assert [weather_data.timestamp for weather_data in five_days] == [int(datetime(2022, 5, 6 + day).timestamp())
+                                                                      for day in range(5)]
+    assert [weather_data.max_temperature for weather_data in five_days] == [15, 17, 22, 15, 20]
+    assert all(weather_data.sunrise is None for weather_data in five_days)
+
+
+def test_page_is_named_after_ukrainian_place_name():
+    assert get_page_name("Одеса, Одеська область, UA") == "одеса"
+    assert get_page_name("Біла Церква") == "біла-церква"
+    assert get_page_name("Кам'янець-Подільський") == "кам-янець-подільський"
+    assert get_page_name("Kyiv, Kyiv City, UA") is None
+    assert get_page_name("46.48572,30.74383") is None
+
+
+def test_page_of_the_nearest_ukrainian_place_is_kept_across_restart(tmp_path, monkeypatch):
+    kyiv_place = GazetteerPlace(name="Київ", admin1="Kyiv City", country_code="UA", latitude=50.45466,
+                                longitude=30.5238, population=2797553)
+
+    async def find_local_place(latitude, longitude, language, max_distance):
+        return kyiv_place if latitude > 50 else None
+
+    monkeypatch.setattr(weather_providers.weather_sinoptik, "fetch_local_place", find_local_place)
+    db_name = str(tmp_path / "sinoptik.db")
+
+    async def before_restart():
+        strategy = SinoptikStrategy(AsyncSQLiteDB(db_name))
+        # Latin label of the location does not matter, the page is named after the place
+        assert await strategy.get_cache_lat_lon("50.46000,30.50000", "Kyiv, Kyiv City, UA") == KYIV
+        assert await strategy.get_cache_lat_lon(ODESA, "Одеса, Одеська область, UA") == ODESA
+        # location without Ukrainian name has no page
+        assert await strategy.get_cache_lat_lon("46.10000,30.10000", "Some place") == "46.10000,30.10000"
+
+    async def after_restart():
+        strategy = SinoptikStrategy(AsyncSQLiteDB(db_name))
+        assert await strategy._load_page_name(KYIV) == "київ"
+        assert await strategy._load_page_name(ODESA) == "одеса"
+        assert await strategy._load_page_name("46.10000,30.10000") is None
+
+    asyncio.run(before_restart())
+    asyncio.run(after_restart())
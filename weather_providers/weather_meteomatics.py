@@ -1,48 +1,216 @@
-"""Module contains data to work with meteomatics.com weather API resource."""
+"""Module contains data to work with meteomatics.com weather API resource.
 
-from datetime import datetime
-from typing import Optional, Union
+Meteomatics query is '<time points>/<parameters>/<locations>/json', where time points and locations are lists, so one
+request returns current weather and daily values of the whole forecast for any number of locations. Response is
+split per location, each one is cached and parsed like any other raw provider response.
+"""
 
-import requests
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Union, List, Dict, Tuple
+
+import aiohttp
 from loguru import logger
 
-from config import METEOMATICS_USERNAME, METEOMATICS_PASSWORD
+from config import METEOMATICS_USERNAME, METEOMATICS_PASSWORD, METEOMATICS_BASE_URL, \
+    METEOMATICS_MAX_LOCATIONS_PER_REQUEST
+from geocoding.geocoding_utils import get_lat_lon_from_attribute
+from http_session import get_http_session
+from weather_emoji import get_weather_condition
 from weather_providers.weather_provider_strategy import WeatherProviderStrategy, WeatherData, WeatherProviderName, \
-    WeatherForecastType
+    WeatherForecastType, FORECAST_DAYS
+
+# at most 10 parameters are allowed per request, '_24h' ones aggregate 24 hours preceding the time point
+PARAMETERS = ("t_2m:C", "t_max_2m_24h:C", "t_min_2m_24h:C", "wind_speed_10m:ms", "wind_dir_10m:d",
+              "msl_pressure:hPa", "precip_24h:mm", "relative_humidity_2m:p", "weather_symbol_1h:idx",
+              "weather_symbol_24h:idx")
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+# value of parameter which is not available for the location and time
+MISSING_VALUE = -999
+# the first time point is current time, the following ones are UTC midnights ending forecast days 0, 1, ...
+FORECAST_DAYS_COUNT = max(days.stop for days in FORECAST_DAYS.values())
+DAY_SECONDS = 24 * 3600
+
+
+def get_time_points(now: datetime) -> List[datetime]:
+    """Returns time points of the request: 'now' and ends of FORECAST_DAYS_COUNT days starting with today (UTC)."""
+    now = now.astimezone(timezone.utc).replace(second=0, microsecond=0)
+    today = now.replace(hour=0, minute=0)
+    return [now] + [today + timedelta(days=day + 1) for day in range(FORECAST_DAYS_COUNT)]
+
+
+def _coordinates_key(latitude: float, longitude: float) -> Tuple[float, float]:
+    return round(latitude, 4), round(longitude, 4)
+
+
+def split_weather_response(weather_response: dict, lat_lons: List[str]) -> Dict[str, dict]:
+    """Splits multi-location Meteomatics response into single-location responses of the same format
+    ({lat-lon: response}), locations absent in the response are skipped."""
+    lat_lon_keys = {}
+    for lat_lon in lat_lons:
+        latitude, longitude = get_lat_lon_from_attribute(lat_lon)
+        lat_lon_keys[_coordinates_key(float(latitude), float(longitude))] = lat_lon
+    weather_responses = {}
+    for parameter_data in weather_response.get("data", []):
+        for coordinates in parameter_data["coordinates"]:
+            lat_lon = lat_lon_keys.get(_coordinates_key(coordinates["lat"], coordinates["lon"]))
+            if lat_lon is None:
+                continue
+            location_response = weather_responses.setdefault(lat_lon, {
+                "dateGenerated": weather_response.get("dateGenerated"), "status": weather_response.get("status"),
+                "data": []})
+            location_response["data"].append({"parameter": parameter_data["parameter"], "coordinates": [coordinates]})
+    return weather_responses
 
-parameters = "wind_speed_10m:ms,wind_dir_10m:d,t_2m:C,msl_pressure:hPa,weather_symbol_1h:idx,precip_24h:mm,t_max_2m_24h:C,t_min_2m_24h:C"
+
+def _get_parameter_values(weather_response: dict) -> Dict[str, List[dict]]:
+    """Returns {parameter: [{"date": ..., "value": ...}, ...]} of single-location response."""
+    return {parameter_data["parameter"]: parameter_data["coordinates"][0]["dates"]
+            for parameter_data in weather_response["data"]}
+
+
+def _get_value(parameter_values: Dict[str, List[dict]], parameter: str, time_point: int) -> Optional[float]:
+    dates = parameter_values.get(parameter)
+    if dates is None or time_point >= len(dates):
+        return None
+    value = dates[time_point]["value"]
+    return None if value == MISSING_VALUE else value
+
+
+def _get_timestamp(parameter_values: Dict[str, List[dict]], time_point: int) -> int:
+    date = next(iter(parameter_values.values()))[time_point]["date"]
+    return int(datetime.strptime(date, DATE_FORMAT).replace(tzinfo=timezone.utc).timestamp())
 
 
 class MeteomaticsStrategy(WeatherProviderStrategy):
-    provider_name = WeatherProviderName.METEOMATICS
-    base_url = "api.meteomatics.com"
-
-    def _get_weather_response(self, city_name: str) -> Optional[dict]:
-        location = ",".join(get_lat_lon_from_city_name(city_name))
-        current_datetime = f"{datetime.now().strftime('%Y-%m-%dT%H:%M')}+02:00"
-        if not location:
-            logger.error(f"Unable to get latitude and longitude tor given city name: {city_name}")
-            return None
+    provider_name = WeatherProviderName.METEOMATICS.value
+    base_url = METEOMATICS_BASE_URL
+    max_locations_per_request = METEOMATICS_MAX_LOCATIONS_PER_REQUEST
+
+    async def _get_weather_response(self, lat_lon: str) -> Optional[dict]:
+        """ Method asynchronously gets raw weather response for the location, which contains current weather and
+        daily values of the forecast, so it serves all forecast types.
+
+        :param lat_lon: latitude and longitude for chosen geolocation
+        :return:
+        """
+        weather_responses = await self._get_weather_responses([lat_lon])
+        return weather_responses.get(lat_lon)
+
+    async def fetch_weather_responses(self, lat_lons: List[str]) -> Dict[str, Optional[dict]]:
+        """Returns raw weather responses for several locations, up to 'max_locations_per_request' locations are
+        queried in one request."""
+        weather_responses = dict.fromkeys(lat_lons)
+        for chunk_responses in await asyncio.gather(*(
+                self._get_weather_responses(lat_lons[start:start + self.max_locations_per_request])
+                for start in range(0, len(lat_lons), self.max_locations_per_request))):
+            weather_responses.update(chunk_responses)
+        return weather_responses
+
+    async def _get_weather_responses(self, lat_lons: List[str]) -> Dict[str, dict]:
+        """Queries weather of all locations in one request, returns single-location responses ({lat-lon: response}),
+        locations are missing if the request failed."""
+        time_points = ",".join(time_point.strftime(DATE_FORMAT)
+                               for time_point in get_time_points(datetime.now(timezone.utc)))
+        locations = "+".join(",".join(get_lat_lon_from_attribute(lat_lon)) for lat_lon in lat_lons)
+        auth = aiohttp.BasicAuth(METEOMATICS_USERNAME or "", METEOMATICS_PASSWORD or "")
         try:
-            response = requests.get(
-                f"http://{METEOMATICS_USERNAME}:{METEOMATICS_PASSWORD}@{self.base_url}/"
-                f"{current_datetime}/{parameters}/{location}/json")
-        except Exception as exception:
+            async with get_http_session().get(f"{self.base_url}/{time_points}/{','.join(PARAMETERS)}/{locations}/json",
+                                              auth=auth) as response:
+                if response.status != 200:
+                    logger.error(f"Response code is not equals to 200: <{response.status}>\n{response.reason}")
+                    return {}
+                weather_response = await response.json(content_type=None)
+        except asyncio.TimeoutError:
+            logger.error(f"Request to '{self.base_url}' timed out for {len(lat_lons)} locations.")
+            return {}
+        except (aiohttp.ClientError, ValueError) as exception:
             logger.error(exception)
-            return None
-        return response.json()
+            return {}
+        try:
+            return split_weather_response(weather_response, lat_lons)
+        except (KeyError, TypeError, IndexError) as err:
+            logger.error(f"Failed to split weather response because of following error:\n{err}")
+            return {}
 
-    def fetch_weather_data(self, lat_lon: str, city_name: str,
-                           period: WeatherForecastType) -> Union[
-        WeatherData, str]:
-        pass
+    async def fetch_weather_data(self, lat_lon: str, city_name: str,
+                                 period: WeatherForecastType) -> Optional[Union[WeatherData, List[WeatherData]]]:
 
-    def _parse_current_weather(self, city_name, weather_response: dict):
-        pass
+        response = await self._get_weather_response(lat_lon=lat_lon)
 
-    def _parse_weather_forecast(self, city_name, weather_response: dict, period: WeatherForecastType):
-        pass
+        if not response:
+            return None
+        return self.parse_weather_data(weather_response=response, lat_lon=lat_lon, city_name=city_name, period=period)
 
+    def parse_weather_data(self, weather_response: dict, lat_lon: str, city_name: str,
+                           period: WeatherForecastType) -> Optional[Union[WeatherData, List[WeatherData]]]:
+        if period is WeatherForecastType.CURRENT:
+            weather_data = self._parse_current_weather(city_name, weather_response=weather_response)
+        elif period in [WeatherForecastType.FIVE_DAYS, WeatherForecastType.TODAY]:
+            weather_data = self._parse_weather_forecast(city_name, weather_response=weather_response, period=period)
+        else:
+            logger.error(f"Incorrect 'period' parameter waw passed '{period}', possible options are:\n"
+                         f"{list(WeatherForecastType)}")
+            return None
+        if not weather_data:
+            return None
+        return weather_data
 
-if __name__ == '__main__':
-    pass
+    def _parse_current_weather(self, city_name, weather_response: dict) -> Optional[WeatherData]:
+        try:
+            values = _get_parameter_values(weather_response)
+            weather_data = WeatherData(
+                timestamp=_get_timestamp(values, 0),
+                weather_condition=get_weather_condition(weather_provider_name=self.provider_name,
+                                                        weather_code=_get_value(values, "weather_symbol_1h:idx", 0)),
+                temperature=_get_value(values, "t_2m:C", 0),
+                max_temperature=None,
+                min_temperature=None,
+                wind_speed=_get_value(values, "wind_speed_10m:ms", 0),
+                wind_direction=_get_value(values, "wind_dir_10m:d", 0),
+                pressure=_get_value(values, "msl_pressure:hPa", 0),
+                precipitation=None,
+                humidity=_get_value(values, "relative_humidity_2m:p", 0),
+                sunrise=None,
+                sunset=None
+            )
+        except Exception as err:
+            logger.error(f"Failed to parse weather response because of following error:\n{err}")
+            return None
+        return weather_data
+
+    def _parse_weather_forecast(self, city_name, weather_response: dict, period: WeatherForecastType) -> \
+            Optional[List[WeatherData]]:
+        # only time points of days shown for the forecast type are parsed, day N ends at the time point N + 1
+        days = FORECAST_DAYS.get(period)
+        if days is None:
+            return None
+        try:
+            values = _get_parameter_values(weather_response)
+            time_points_count = len(next(iter(values.values())))
+            weather_data_list = []
+            for time_point in range(days.start + 1, min(days.stop + 1, time_points_count)):
+                weather_data = WeatherData(
+                    timestamp=_get_timestamp(values, time_point) - DAY_SECONDS,
+                    weather_condition=get_weather_condition(
+                        weather_provider_name=self.provider_name,
+                        weather_code=_get_value(values, "weather_symbol_24h:idx", time_point)),
+                    temperature=None,
+                    max_temperature=_get_value(values, "t_max_2m_24h:C", time_point),
+                    min_temperature=_get_value(values, "t_min_2m_24h:C", time_point),
+                    wind_speed=_get_value(values, "wind_speed_10m:ms", time_point),
+                    wind_direction=_get_value(values, "wind_dir_10m:d", time_point),
+                    pressure=_get_value(values, "msl_pressure:hPa", time_point),
+                    precipitation=_get_value(values, "precip_24h:mm", time_point),
+                    humidity=_get_value(values, "relative_humidity_2m:p", time_point),
+                    sunrise=None,
+                    sunset=None
+                )
+                weather_data_list.append(weather_data)
+        except Exception as err:
+            logger.error(f"Failed to parse weather response because of following error:\n{err}")
+            return None
+        if len(weather_data_list) != days.stop - days.start:
+            logger.error(f"Weather response contains only {len(weather_data_list)} of requested forecast days.")
+            return None
+        return weather_data_list
@@ -1,18 +1,16 @@
-import json
-from datetime import datetime
+import asyncio
 from enum import Enum
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Union
 
-import requests
+import aiohttp
 from loguru import logger
 
 from config import OPEN_WEATHER_API_KEY
 from geocoding.geocoding_utils import get_lat_lon_from_attribute
-from utils import hpa_to_mm_hg_converter, math_round
-from weather_emoji import get_weather_emojy
+from http_session import get_http_session
+from weather_emoji import get_weather_condition
 from weather_providers.weather_provider_strategy import WeatherData, WeatherProviderStrategy, WeatherForecastType, \
-    WeatherProviderName
-from wind_direction_emoji import get_wind_direction_emoji
+    WeatherProviderName, FORECAST_DAYS
 
 UNITS = "metric"
 LANGUAGE = "US"
@@ -27,73 +25,71 @@ class OpenWeatherMapStrategy(WeatherProviderStrategy):
     provider_name = WeatherProviderName.OPENWEATHERMAP.value
     base_url = "api.openweathermap.org"
 
-    def _get_weather_response(self, lat_lon: str) -> Optional[Tuple[dict, str]]:
-        """ Method gets weather response from api.openweathermap.org
+    async def _get_weather_response(self, lat_lon: str) -> Optional[dict]:
+        """ Method asynchronously gets raw 'onecall' weather response from api.openweathermap.org using shared HTTP
+        session. Single response contains both current and daily data, so it serves all forecast types.
 
         :param lat_lon: latitude and longitude for chosen geolocation
         :return:
         """
         latitude, longitude = get_lat_lon_from_attribute(lat_lon)
+        params = {"lat": latitude, "lon": longitude, "appid": OPEN_WEATHER_API_KEY, "lang": LANGUAGE,
+                  "exclude": "hourly,minutely,alerts", "units": UNITS, "mode": "json"}
         try:
-            response = requests.get(
-                # f"https://api.openweathermap.org/data/2.5/{period_option.value}?lat={latitude}&lon={longitude}&appid={OPEN_WEATHER_API_KEY}&lang={LANGUAGE}&units={UNITS}&mode=json").json()
-                f"https://{self.base_url}/data/2.5/onecall?lat={latitude}&lon={longitude}&appid={OPEN_WEATHER_API_KEY}&lang={LANGUAGE}&exclude=hourly,minutely,alerts&units={UNITS}&mode=json")
-        except Exception as exception:
-            logger.error(exception)
+            async with get_http_session().get(f"https://{self.base_url}/data/2.5/onecall", params=params) as response:
+                if response.status != 200:
+                    logger.error(f"Response code is not equals to 200: <{response.status}>\n{response.reason}")
+                    return None
+                weather_response = await response.json(content_type=None)
+        except asyncio.TimeoutError:
+            logger.error(f"Request to '{self.base_url}' timed out for lat-lon '{lat_lon}'.")
             return None
-        if response.status_code != 200:
-            logger.error(f"Response code is not equals to 200: <{response.status_code}>\n{response.reason}")
+        except (aiohttp.ClientError, ValueError) as exception:
+            logger.error(exception)
             return None
-        return json.loads(response.text), "-".join([latitude, longitude])
+        return weather_response
 
-    def fetch_weather_data(self, lat_lon: str, city_name: str, period: WeatherForecastType) -> Optional[WeatherData]:
+    async def fetch_weather_data(self, lat_lon: str, city_name: str,
+                                 period: WeatherForecastType) -> Optional[Union[WeatherData, List[WeatherData]]]:
 
-        response = self._get_weather_response(lat_lon=lat_lon)
+        response = await self._get_weather_response(lat_lon=lat_lon)
 
         if not response:
             return None
+        return self.parse_weather_data(weather_response=response, lat_lon=lat_lon, city_name=city_name, period=period)
+
+    def parse_weather_data(self, weather_response: dict, lat_lon: str, city_name: str,
+                           period: WeatherForecastType) -> Optional[Union[WeatherData, List[WeatherData]]]:
+        response = (weather_response, lat_lon)
+        if period is WeatherForecastType.CURRENT:
+            weather_data = self._parse_current_weather(city_name, weather_response=response)
+        elif period in [WeatherForecastType.FIVE_DAYS, WeatherForecastType.TODAY]:
+            weather_data = self._parse_weather_forecast(city_name, weather_response=response, period=period)
         else:
-            if period is WeatherForecastType.CURRENT:
-                weather_data = self._parse_current_weather(city_name, weather_response=response)
-            elif period in [WeatherForecastType.FIVE_DAYS, WeatherForecastType.TODAY]:
-                weather_data = self._parse_weather_forecast(city_name, weather_response=response, period=period)
-            else:
-                logger.error(f"Incorrect 'period' parameter waw passed '{period}', possible options are:\n"
-                             f"{list(WeatherForecastType)}")
-                return None
+            logger.error(f"Incorrect 'period' parameter waw passed '{period}', possible options are:\n"
+                         f"{list(WeatherForecastType)}")
+            return None
         if not weather_data:
             return None
         return weather_data
 
     def _parse_current_weather(self, city_name, weather_response: Tuple[dict, str]) -> Optional[WeatherData]:
         try:
-            emoji_data = get_weather_emojy(
-                weather_provider_name=self.provider_name,
-                weather_code=weather_response[0]["current"]["weather"][0].get("id")
-            )
+            current = weather_response[0]["current"]
             weather_data = WeatherData(
-                city_name=city_name,
-                lat_lon=weather_response[1],
-                timestamp=weather_response[0]["current"].get("dt"),
-                date=datetime.now().strftime("%Y-%m-%d"),
-                weather_emoji=emoji_data[0],
-                weather_summary=emoji_data[1],
-                temperature=math_round(weather_response[0]["current"].get("temp")),
-                max_temperature=math_round(weather_response[0]["current"].get("temp_max")) if weather_response[0][
-                    "current"].get(
-                    "temp_max") else None,
-                min_temperature=math_round(weather_response[0]["current"].get("temp_min")) if weather_response[0][
-                    "current"].get(
-                    "temp_min") else None,
-                wind_speed=weather_response[0]["current"].get("wind_speed"),
-                wind_direction=get_wind_direction_emoji(weather_response[0]["current"].get("wind_deg")),
-                pressure=hpa_to_mm_hg_converter(weather_response[0]["current"].get("pressure")),
-                precipitation=weather_response[0]["current"].get("precipitation"),
-                humidity=weather_response[0]["current"].get("humidity"),
-                sunrise=datetime.fromtimestamp(weather_response[0]["current"].get("sunrise")).strftime(
-                    "%Y-%m-%d %H:%M:%S"),
-                sunset=datetime.fromtimestamp(weather_response[0]["current"].get("sunset")).strftime(
-                    "%Y-%m-%d %H:%M:%S")
+                timestamp=current["dt"],
+                weather_condition=get_weather_condition(weather_provider_name=self.provider_name,
+                                                        weather_code=current["weather"][0].get("id")),
+                temperature=current.get("temp"),
+                max_temperature=current.get("temp_max"),
+                min_temperature=current.get("temp_min"),
+                wind_speed=current.get("wind_speed"),
+                wind_direction=current.get("wind_deg"),
+                pressure=current.get("pressure"),
+                precipitation=current.get("precipitation"),
+                humidity=current.get("humidity"),
+                sunrise=current.get("sunrise"),
+                sunset=current.get("sunset")
             )
         except Exception as err:
             logger.error(f"Failed to parse weather response because of following error:\n{err}")
@@ -102,41 +98,33 @@ class OpenWeatherMapStrategy(WeatherProviderStrategy):
 
     def _parse_weather_forecast(self, city_name, weather_response: Tuple[dict, str], period: WeatherForecastType) -> \
             Optional[List[WeatherData]]:
+        # only 'daily' items of days shown for the forecast type are parsed
+        days = FORECAST_DAYS.get(period)
+        if days is None:
+            return None
         try:
-
             weather_data_list = []
-            for item in range(7):
-                emoji_data = get_weather_emojy(
-                    weather_provider_name=self.provider_name,
-                    weather_code=weather_response[0]['daily'][item]["weather"][0].get("id")
-                )
+            for day in weather_response[0]["daily"][days]:
                 weather_data = WeatherData(
-                    city_name=city_name,
-                    lat_lon=weather_response[1],
-                    timestamp=weather_response[0]['daily'][item].get("dt"),
-                    date=datetime.fromtimestamp(weather_response[0]['daily'][item].get("dt")).strftime("%Y-%m-%d"),
-                    weather_emoji=emoji_data[0],
-                    weather_summary=emoji_data[1],
-                    max_temperature=math_round(weather_response[0]['daily'][item]["temp"].get("max")),
-                    min_temperature=math_round(weather_response[0]['daily'][item]["temp"].get("min")),
-                    temperature=math_round(weather_response[0]['daily'][item]["temp"].get("temp")) if
-                    weather_response[0]['daily'][item]["temp"].get("temp") else None,
-                    wind_speed=weather_response[0]['daily'][item].get("wind_speed"),
-                    wind_direction=get_wind_direction_emoji(weather_response[0]['daily'][item].get("wind_deg")),
-                    pressure=hpa_to_mm_hg_converter(weather_response[0]['daily'][item].get("pressure")),
-                    precipitation=weather_response[0]['daily'][item].get("precipitation"),
-                    humidity=weather_response[0]['daily'][item].get("humidity"),
-                    sunrise=datetime.fromtimestamp(weather_response[0]['daily'][item].get("sunrise")).strftime(
-                        "%Y-%m-%d %H:%M:%S"),
-                    sunset=datetime.fromtimestamp(weather_response[0]['daily'][item].get("sunset")).strftime(
-                        "%Y-%m-%d %H:%M:%S")
+                    timestamp=day["dt"],
+                    weather_condition=get_weather_condition(weather_provider_name=self.provider_name,
+                                                            weather_code=day["weather"][0].get("id")),
+                    temperature=day["temp"].get("temp"),
+                    max_temperature=day["temp"].get("max"),
+                    min_temperature=day["temp"].get("min"),
+                    wind_speed=day.get("wind_speed"),
+                    wind_direction=day.get("wind_deg"),
+                    pressure=day.get("pressure"),
+                    precipitation=day.get("precipitation"),
+                    humidity=day.get("humidity"),
+                    sunrise=day.get("sunrise"),
+                    sunset=day.get("sunset")
                 )
-
                 weather_data_list.append(weather_data)
         except Exception as err:
             logger.error(f"Failed to parse weather response because of following error:\n{err}")
             return None
-        if period == WeatherForecastType.FIVE_DAYS:
-            return weather_data_list[1:6]
-        elif period == WeatherForecastType.TODAY:
-            return [weather_data_list[0]]
+        if len(weather_data_list) != days.stop - days.start:
+            logger.error(f"Weather response contains only {len(weather_data_list)} of requested forecast days.")
+            return None
+        return weather_data_list
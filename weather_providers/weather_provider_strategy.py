@@ -1,7 +1,10 @@
+import asyncio
 from abc import abstractmethod, ABC
 from dataclasses import dataclass
 from enum import Enum
-from typing import Optional, Union
+from typing import Optional, Union, List, Dict
+
+from geocoding.geocoding_utils import Coordinates
 
 
 class WeatherProviderName(Enum):
@@ -16,41 +19,76 @@ class WeatherForecastType(Enum):
     TODAY = "_forecast_weather_today"
 
 
+# days of the forecast shown for forecast types, today is the day 0
+FORECAST_DAYS = {WeatherForecastType.TODAY: slice(0, 1), WeatherForecastType.FIVE_DAYS: slice(1, 6)}
+
+
 @dataclass
 class WeatherData:
-    city_name: str
-    lat_lon: Optional[str]
-    timestamp: str
-    date: str
-    weather_emoji: str
-    weather_summary: str
-    temperature: Optional[str]
-    max_temperature: Optional[str]
-    min_temperature: Optional[str]
-    wind_speed: str
-    wind_direction: Optional[str]
-    pressure: str
-    precipitation: Optional[str]
-    humidity: Optional[str]
-    sunrise: Optional[str]
-    sunset: Optional[str]
+    """Weather conditions at 'timestamp' (current weather) or for the day starting at it (forecast).
+
+    Values are kept as provider numbers in metric units (°C, m/s, degrees, hPa, mm, %) and epoch timestamps, they
+    are formatted only on rendering, so one record serves every output language and layout."""
+    __slots__ = ("timestamp", "weather_condition", "temperature", "max_temperature", "min_temperature", "wind_speed",
+                 "wind_direction", "pressure", "precipitation", "humidity", "sunrise", "sunset")
+    timestamp: int
+    # language independent condition name, see 'weather_emoji.WEATHER_EMOJI'
+    weather_condition: Optional[str]
+    temperature: Optional[float]
+    max_temperature: Optional[float]
+    min_temperature: Optional[float]
+    wind_speed: Optional[float]
+    wind_direction: Optional[float]
+    pressure: Optional[float]
+    precipitation: Optional[float]
+    humidity: Optional[float]
+    sunrise: Optional[int]
+    sunset: Optional[int]
 
 
 class WeatherProviderStrategy(ABC):
     provider_name: WeatherProviderName
     base_url: str
+    # number of locations provider accepts in one request, see 'fetch_weather_responses'
+    max_locations_per_request: int = 1
 
     @abstractmethod
-    def _get_weather_response(self, city_name: str) -> Optional[dict]:
-        """ Method gets weather response from sertain weather API resource
+    async def _get_weather_response(self, lat_lon: str) -> Optional[dict]:
+        """ Method asynchronously gets weather response from sertain weather API resource
 
-        :param city_name: Name of the city to find out weather
+        :param lat_lon: latitude and longitude of the location to find out weather
         :return:
         """
 
     @abstractmethod
-    def fetch_weather_data(self, lat_lon: str, city_name: str, period_option: "WeatherForecastType") -> Union[
-        "WeatherData", str]:
+    async def fetch_weather_data(self, lat_lon: str, city_name: str, period: "WeatherForecastType") -> Optional[
+        Union["WeatherData", List["WeatherData"]]]:
+        pass
+
+    async def get_cache_lat_lon(self, lat_lon: str, city_name: str) -> str:
+        """Returns lat-lon the weather of the location is requested and cached for. Nearby locations within the same
+        grid cell share cached weather data and provider requests, providers which locate forecast by place
+        override it."""
+        return Coordinates.from_lat_lon(lat_lon).quantized_lat_lon()
+
+    async def fetch_weather_response(self, lat_lon: str) -> Optional[dict]:
+        """Returns raw weather provider response for the location, it can be cached and parsed later with
+        'parse_weather_data' for any forecast type."""
+        return await self._get_weather_response(lat_lon=lat_lon)
+
+    async def fetch_weather_responses(self, lat_lons: List[str]) -> Dict[str, Optional[dict]]:
+        """Returns raw weather provider responses for several locations ({lat-lon: response}).
+
+        Providers which can query many locations at once override it, by default locations are requested
+        concurrently one per call.
+        """
+        weather_responses = await asyncio.gather(*(self.fetch_weather_response(lat_lon=lat_lon)
+                                                   for lat_lon in lat_lons))
+        return dict(zip(lat_lons, weather_responses))
+
+    @abstractmethod
+    def parse_weather_data(self, weather_response: dict, lat_lon: str, city_name: str,
+                           period: WeatherForecastType) -> Optional[Union["WeatherData", List["WeatherData"]]]:
         pass
 
     @abstractmethod
@@ -0,0 +1,440 @@
+"""Module contains data to work with sinoptik.ua weather forecast pages.
+
+Sinoptik has no API, its forecast page is downloaded and fed in chunks into streaming HTML parser, which collects
+values of known elements only and does not build document tree. Download stops as soon as all values are
+collected, the collected values are the raw provider response which is cached and parsed into WeatherData.
+
+Pages are named after Ukrainian place names ("погода-одеса"), so locations are served by the page of the nearest
+gazetteer place having Ukrainian name and weather is cached per place rather than per grid cell.
+"""
+
+import asyncio
+import codecs
+import re
+import sqlite3
+from datetime import datetime
+from html.parser import HTMLParser
+from typing import Optional, Union, List, Dict, Tuple
+
+import aiohttp
+from loguru import logger
+
+from app_storage import AsyncSQLiteDB
+from config import SINOPTIK_BASE_URL, SINOPTIK_PAGE_NAMES_CACHE_SIZE, GEOCODING_CACHE_TTL, SINOPTIK_PAGES_TABLE_NAME, \
+    SINOPTIK_PAGE_LANGUAGE, SINOPTIK_PLACE_MAX_DISTANCE
+from geocoding.geocoding_utils import Coordinates, fetch_local_place
+from http_session import get_http_session
+from weather_cache.memory_cache import LRUTTLCache
+from weather_emoji import get_weather_condition
+from weather_providers.weather_provider_strategy import WeatherProviderStrategy, WeatherData, WeatherProviderName, \
+    WeatherForecastType, FORECAST_DAYS
+
+PAGE_CHUNK_SIZE = 16 * 1024
+# rows of hourly details table of today in page order, "weather_code" and "wind" rows keep values in attributes
+HOURLY_ROWS = ("time", "weather_code", "temperature", "feels_like", "pressure", "humidity", "wind",
+               "precipitation_probability")
+# lists of hourly values collected from the rows, wind row has both speed (text) and direction (class)
+HOURLY_VALUES = ("time", "weather_code", "temperature", "pressure", "humidity", "wind_speed", "wind_direction")
+# direction the wind blows from in "wind-SW" class of wind element
+WIND_DIRECTIONS = {"N": 0, "NE": 45, "E": 90, "SE": 135, "S": 180, "SW": 225, "W": 270, "NW": 315}
+# elements without end tag, they do not change nesting depth
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+NUMBER_PATTERN = re.compile(r"[+-]?\d+(?:[.,]\d+)?")
+TIME_PATTERN = re.compile(r"(\d{1,2})\s*:\s*(\d{2})")
+DATE_PATTERN = re.compile(r"(\d{4}-\d{2}-\d{2})$")
+DAY_ID_PATTERN = re.compile(r"bd\d+$")
+CYRILLIC_PATTERN = re.compile(r"[\u0400-\u04ff]")
+# Sinoptik shows pressure in mm Hg, WeatherData keeps it in hPa
+MM_HG_PER_HPA = 0.75006
+
+
+def _parse_number(text: str) -> Optional[float]:
+    match = NUMBER_PATTERN.search(text.replace("−", "-"))
+    if match is None:
+        return None
+    number = float(match.group().replace(",", "."))
+    return int(number) if number.is_integer() else number
+
+
+def _parse_time(text: str) -> Optional[str]:
+    match = TIME_PATTERN.search(text)
+    if match is None:
+        return None
+    return f"{int(match.group(1)):02d}:{match.group(2)}"
+
+
+def _get_weather_code(classes: List[str]) -> Optional[str]:
+    """Returns weather code of "weatherIco d210" element without day/night prefix."""
+    for class_name in classes:
+        if len(class_name) == 4 and class_name[0] in "dn" and class_name[1:].isdigit():
+            return class_name[1:]
+    return None
+
+
+class SinoptikPageParser(HTMLParser):
+    """Streaming parser of sinoptik.ua forecast page, page is fed in chunks while it is downloaded.
+
+    Parser keeps only the state of the element it collects text of, the rest of the markup is skipped.
+    'weather_response' holds collected values: current weather, daily forecast tabs, hourly details of today and
+    daylight times. 'complete' is set once hourly details and daylight times are collected, the rest of the page
+    is not needed.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.weather_response = {"date": None, "time": None, "temperature": None, "sunrise": None, "sunset": None,
+                                 "days": [], "hours": {name: [] for name in HOURLY_VALUES}}
+        self.complete = False
+        # value text of current element is collected for and nesting depth within the element
+        self._capture: Optional[str] = None
+        self._capture_depth = 0
+        self._text: List[str] = []
+        self._in_details = False
+        self._details_done = False
+        # index of the row in details table body, None outside of it
+        self._details_row: Optional[int] = None
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if self._capture is not None:
+            if tag not in VOID_ELEMENTS:
+                self._capture_depth += 1
+            if self._capture == "wind":
+                self._handle_wind_direction(attrs)
+            return
+        classes = element_id = data_link = None
+        for name, value in attrs:
+            if name == "class":
+                classes = value.split() if value else None
+            elif name == "id":
+                element_id = value
+            elif name == "data-link":
+                data_link = value
+        if self._in_details:
+            self._handle_details_tag(tag, classes)
+        elif not classes:
+            return
+        elif tag == "table" and "weatherDetails" in classes and not self._details_done:
+            self._in_details = True
+        elif tag == "div" and "main" in classes and element_id and DAY_ID_PATTERN.match(element_id):
+            self.weather_response["days"].append({"date": None, "weather_code": None, "min_temperature": None,
+                                                  "max_temperature": None})
+        elif not self.weather_response["days"]:
+            return
+        elif "day-link" in classes and data_link:
+            date_match = DATE_PATTERN.search(data_link.rstrip("/"))
+            self.weather_response["days"][-1]["date"] = date_match.group(1) if date_match else None
+        elif "weatherIco" in classes and not self._details_done:
+            day = self.weather_response["days"][-1]
+            if day["weather_code"] is None:
+                day["weather_code"] = _get_weather_code(classes)
+        elif tag == "div" and "min" in classes:
+            self._start_capture("min_temperature")
+        elif tag == "div" and "max" in classes:
+            self._start_capture("max_temperature")
+        elif "today-time" in classes:
+            self._start_capture("today_time")
+        elif "today-temp" in classes:
+            self._start_capture("today_temperature")
+        elif "infoDaylight" in classes:
+            self._start_capture("daylight")
+
+    def _handle_details_tag(self, tag: str, classes: Optional[List[str]]) -> None:
+        hours = self.weather_response["hours"]
+        if tag == "tbody":
+            self._details_row = -1
+        elif self._details_row is None:
+            return
+        elif tag == "tr":
+            self._details_row += 1
+        elif tag == "td" and 0 <= self._details_row < len(HOURLY_ROWS):
+            row_name = HOURLY_ROWS[self._details_row]
+            if row_name == "weather_code":
+                # the code is taken from the icon element class
+                hours["weather_code"].append(None)
+                return
+            if row_name == "wind":
+                hours["wind_direction"].append(None)
+            self._start_capture(row_name)
+        elif classes and "weatherIco" in classes and self._details_row == 1:
+            hours["weather_code"][-1] = _get_weather_code(classes)
+
+    def _handle_wind_direction(self, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        for name, value in attrs:
+            if name == "class" and value:
+                for class_name in value.split():
+                    if class_name.startswith("wind-"):
+                        self.weather_response["hours"]["wind_direction"][-1] = WIND_DIRECTIONS.get(class_name[5:])
+
+    def _start_capture(self, name: str) -> None:
+        self._capture = name
+        self._capture_depth = 1
+        self._text = []
+
+    def handle_data(self, data: str) -> None:
+        if self._capture is not None:
+            self._text.append(data)
+
+    def handle_endtag(self, tag: str) -> None:
+        if self._capture is not None:
+            self._capture_depth -= 1
+            if self._capture_depth == 0:
+                self._finish_capture()
+        elif self._in_details and tag == "table":
+            self._in_details = False
+            self._details_row = None
+            self._details_done = True
+            self.complete = self.weather_response["sunrise"] is not None
+
+    def _finish_capture(self) -> None:
+        name, text = self._capture, "".join(self._text)
+        self._capture = None
+        weather_response = self.weather_response
+        hours = weather_response["hours"]
+        if name in ("min_temperature", "max_temperature"):
+            weather_response["days"][-1][name] = _parse_number(text)
+        elif name == "today_time":
+            weather_response["date"] = weather_response["days"][0]["date"]
+            weather_response["time"] = _parse_time(text)
+        elif name == "today_temperature":
+            weather_response["temperature"] = _parse_number(text)
+        elif name == "daylight":
+            times = [f"{int(hour):02d}:{minutes}" for hour, minutes in TIME_PATTERN.findall(text)]
+            if len(times) == 2:
+                weather_response["sunrise"], weather_response["sunset"] = times
+            self.complete = self._details_done
+        elif name == "time":
+            hours["time"].append(_parse_time(text))
+        elif name == "wind":
+            hours["wind_speed"].append(_parse_number(text))
+        elif name in hours:
+            hours[name].append(_parse_number(text))
+
+
+def parse_page(page: str, chunk_size: int = PAGE_CHUNK_SIZE) -> dict:
+    """Returns values collected from the whole forecast page fed in 'chunk_size' chunks (e.g. saved page)."""
+    parser = SinoptikPageParser()
+    for start in range(0, len(page), chunk_size):
+        parser.feed(page[start:start + chunk_size])
+        if parser.complete:
+            break
+    parser.close()
+    return parser.weather_response
+
+
+def get_page_name(place_name: str) -> Optional[str]:
+    """Returns Sinoptik page name of the place by its Ukrainian name ("Біла Церква, Київська область" ->
+    "біла-церква"), None if the name is not Cyrillic (e.g. "Kyiv" or lat-lon), there is no page named so."""
+    place_name = place_name.split(",")[0].strip().lower()
+    if not CYRILLIC_PATTERN.search(place_name):
+        return None
+    return "-".join(place_name.replace("'", " ").replace("’", " ").split())
+
+
+def _local_timestamp(date: str, time: str = "00:00") -> int:
+    # page shows local time of the place, rendering shows timestamps in local time as well
+    year, month, day = date.split("-")
+    hour, minute = time.split(":")
+    return int(datetime(int(year), int(month), int(day), int(hour), int(minute)).timestamp())
+
+
+def _hpa(pressure_mm_hg: Optional[float]) -> Optional[float]:
+    return None if pressure_mm_hg is None else round(pressure_mm_hg / MM_HG_PER_HPA)
+
+
+def _create_page_names_table(connection: sqlite3.Connection) -> None:
+    connection.execute(f"""CREATE TABLE IF NOT EXISTS {SINOPTIK_PAGES_TABLE_NAME} (LAT_LON TEXT PRIMARY KEY,
+    PAGE_NAME TEXT)""")
+    connection.commit()
+
+
+class SinoptikStrategy(WeatherProviderStrategy):
+    provider_name = WeatherProviderName.SINOPTIC.value
+    base_url = SINOPTIK_BASE_URL
+
+    def __init__(self, storage: Optional[AsyncSQLiteDB] = None):
+        # page names of requested places, so their forecast can be refreshed without user request, they are kept in
+        # 'storage' as well to survive restarts and to be shared by bot workers
+        self._page_names = LRUTTLCache(max_size=SINOPTIK_PAGE_NAMES_CACHE_SIZE, ttl=GEOCODING_CACHE_TTL,
+                                       name="sinoptik page names")
+        # place lat-lons of requested locations and their labels
+        self._places = LRUTTLCache(max_size=SINOPTIK_PAGE_NAMES_CACHE_SIZE, ttl=GEOCODING_CACHE_TTL,
+                                   name="sinoptik places")
+        self._storage = storage
+        if storage is not None:
+            storage.run_sync(_create_page_names_table)
+
+    async def get_cache_lat_lon(self, lat_lon: str, city_name: str) -> str:
+        """Returns lat-lon of the place which Sinoptik page serves the location: the nearest gazetteer place having
+        Ukrainian name or the location itself if it is labelled with Ukrainian name. Page name of the place is
+        saved, so its forecast is fetched by lat-lon later."""
+        timestamp = int(datetime.now().timestamp())
+        cache_lat_lon = self._places.get((lat_lon, city_name), current_timestamp=timestamp)
+        if cache_lat_lon is not None:
+            return cache_lat_lon
+        coordinates = Coordinates.from_lat_lon(lat_lon)
+        place = await fetch_local_place(coordinates.latitude, coordinates.longitude, SINOPTIK_PAGE_LANGUAGE,
+                                        SINOPTIK_PLACE_MAX_DISTANCE)
+        if place is not None:
+            cache_lat_lon = Coordinates(latitude=place.latitude, longitude=place.longitude).lat_lon
+            page_name = get_page_name(place.name)
+        else:
+            cache_lat_lon, page_name = coordinates.lat_lon, get_page_name(city_name)
+        if page_name is not None:
+            await self._save_page_name(cache_lat_lon, page_name, timestamp)
+        self._places.set((lat_lon, city_name), cache_lat_lon, timestamp=timestamp)
+        return cache_lat_lon
+
+    async def _save_page_name(self, lat_lon: str, page_name: str, timestamp: int) -> None:
+        if self._page_names.get(lat_lon, current_timestamp=timestamp) == page_name:
+            return
+        self._page_names.set(lat_lon, page_name, timestamp=timestamp)
+        if self._storage is None:
+            return
+        try:
+            await self._storage.execute(f"INSERT OR REPLACE INTO {SINOPTIK_PAGES_TABLE_NAME} values (?, ?)",
+                                        (lat_lon, page_name))
+        except sqlite3.Error as err:
+            logger.error(f"Failed to save Sinoptik page name '{page_name}' of lat-lon '{lat_lon}'.\n{err}")
+
+    async def _load_page_name(self, lat_lon: str) -> Optional[str]:
+        timestamp = int(datetime.now().timestamp())
+        page_name = self._page_names.get(lat_lon, current_timestamp=timestamp)
+        if page_name is not None or self._storage is None:
+            return page_name
+        try:
+            row = await self._storage.fetchone(f"SELECT PAGE_NAME FROM {SINOPTIK_PAGES_TABLE_NAME} WHERE LAT_LON = ?",
+                                               (lat_lon,))
+        except sqlite3.Error as err:
+            logger.error(f"Failed to load Sinoptik page name of lat-lon '{lat_lon}'.\n{err}")
+            return None
+        if row is None:
+            return None
+        self._page_names.set(lat_lon, row[0], timestamp=timestamp)
+        return row[0]
+
+    async def _get_weather_response(self, lat_lon: str) -> Optional[dict]:
+        """ Method asynchronously gets forecast page of the place previously resolved for the lat-lon with
+        'get_cache_lat_lon' and collects weather values from it while it is downloaded.
+
+        :param lat_lon: latitude and longitude of the place
+        :return:
+        """
+        page_name = await self._load_page_name(lat_lon)
+        if page_name is None:
+            logger.error(f"Sinoptik page of lat-lon '{lat_lon}' is unknown, location has no Ukrainian place name.")
+            return None
+        return await self._get_page_values(page_name)
+
+    async def _get_page_values(self, page_name: str) -> Optional[dict]:
+        parser = SinoptikPageParser()
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        try:
+            async with get_http_session().get(f"{self.base_url}/погода-{page_name}") as response:
+                if response.status != 200:
+                    logger.error(f"Response code is not equals to 200: <{response.status}>\n{response.reason}")
+                    return None
+                async for chunk in response.content.iter_chunked(PAGE_CHUNK_SIZE):
+                    parser.feed(decoder.decode(chunk))
+                    if parser.complete:
+                        break
+        except asyncio.TimeoutError:
+            logger.error(f"Request to '{self.base_url}' timed out for page '{page_name}'.")
+            return None
+        except aiohttp.ClientError as exception:
+            logger.error(exception)
+            return None
+        parser.close()
+        if not parser.weather_response["days"]:
+            logger.error(f"There is no forecast on Sinoptik page '{page_name}'.")
+            return None
+        return parser.weather_response
+
+    async def fetch_weather_data(self, lat_lon: str, city_name: str,
+                                 period: WeatherForecastType) -> Optional[Union[WeatherData, List[WeatherData]]]:
+
+        response = await self.fetch_weather_response(lat_lon=await self.get_cache_lat_lon(lat_lon, city_name))
+
+        if not response:
+            return None
+        return self.parse_weather_data(weather_response=response, lat_lon=lat_lon, city_name=city_name, period=period)
+
+    def parse_weather_data(self, weather_response: dict, lat_lon: str, city_name: str,
+                           period: WeatherForecastType) -> Optional[Union[WeatherData, List[WeatherData]]]:
+        if period is WeatherForecastType.CURRENT:
+            weather_data = self._parse_current_weather(city_name, weather_response=weather_response)
+        elif period in [WeatherForecastType.FIVE_DAYS, WeatherForecastType.TODAY]:
+            weather_data = self._parse_weather_forecast(city_name, weather_response=weather_response, period=period)
+        else:
+            logger.error(f"Incorrect 'period' parameter waw passed '{period}', possible options are:\n"
+                         f"{list(WeatherForecastType)}")
+            return None
+        if not weather_data:
+            return None
+        return weather_data
+
+    def _parse_current_weather(self, city_name, weather_response: dict) -> Optional[WeatherData]:
+        try:
+            date, time = weather_response["date"], weather_response["time"]
+            hours: Dict[str, list] = weather_response["hours"]
+            # conditions of the latest hourly column which already started, the first one before it
+            hour = max([index for index, hour_time in enumerate(hours["time"]) if hour_time and hour_time <= time],
+                       default=0)
+
+            def hourly(name: str):
+                return hours[name][hour] if hour < len(hours[name]) else None
+
+            weather_data = WeatherData(
+                timestamp=_local_timestamp(date, time),
+                weather_condition=get_weather_condition(
+                    weather_provider_name=self.provider_name,
+                    weather_code=hourly("weather_code") or weather_response["days"][0]["weather_code"]),
+                temperature=weather_response["temperature"] if weather_response["temperature"] is not None else
+                hourly("temperature"),
+                max_temperature=None,
+                min_temperature=None,
+                wind_speed=hourly("wind_speed"),
+                wind_direction=hourly("wind_direction"),
+                pressure=_hpa(hourly("pressure")),
+                precipitation=None,
+                humidity=hourly("humidity"),
+                sunrise=_local_timestamp(date, weather_response["sunrise"]) if weather_response["sunrise"] else None,
+                sunset=_local_timestamp(date, weather_response["sunset"]) if weather_response["sunset"] else None
+            )
+        except Exception as err:
+            logger.error(f"Failed to parse weather response because of following error:\n{err}")
+            return None
+        return weather_data
+
+    def _parse_weather_forecast(self, city_name, weather_response: dict, period: WeatherForecastType) -> \
+            Optional[List[WeatherData]]:
+        # only forecast tabs of days shown for the forecast type are parsed, daylight times are known for today
+        days = FORECAST_DAYS.get(period)
+        if days is None:
+            return None
+        try:
+            weather_data_list = []
+            for index, day in enumerate(weather_response["days"][days], start=days.start):
+                daylight = index == 0 and weather_response["sunrise"] and weather_response["sunset"]
+                weather_data = WeatherData(
+                    timestamp=_local_timestamp(day["date"]),
+                    weather_condition=get_weather_condition(weather_provider_name=self.provider_name,
+                                                            weather_code=day["weather_code"]),
+                    temperature=None,
+                    max_temperature=day["max_temperature"],
+                    min_temperature=day["min_temperature"],
+                    wind_speed=None,
+                    wind_direction=None,
+                    pressure=None,
+                    precipitation=None,
+                    humidity=None,
+                    sunrise=_local_timestamp(day["date"], weather_response["sunrise"]) if daylight else None,
+                    sunset=_local_timestamp(day["date"], weather_response["sunset"]) if daylight else None
+                )
+                weather_data_list.append(weather_data)
+        except Exception as err:
+            logger.error(f"Failed to parse weather response because of following error:\n{err}")
+            return None
+        if len(weather_data_list) != days.stop - days.start:
+            logger.error(f"Weather response contains only {len(weather_data_list)} of requested forecast days.")
+            return None
+        return weather_data_list
@@ -0,0 +1,272 @@
+"""Contains weather output templates compiled once into format strings, so weather data is rendered in one pass
+instead of searching and replacing every placeholder over the growing output. Weather cache keeps language
+independent numeric weather data, it is formatted and rendered per request in user language.
+
+Usage (rendering micro-benchmark):
+    python weather_rendering.py [--repeat 10000]
+"""
+
+import argparse
+import re
+import statistics
+import time
+from dataclasses import fields
+from datetime import datetime
+from functools import partial
+from operator import attrgetter
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from config import WEATHER_CACHE_TTL, WEATHER_RENDER_CACHE_SIZE
+from general_symbols import GeneralEmojis
+from utils import math_round, hpa_to_mm_hg_converter
+from weather_cache.memory_cache import LRUTTLCache
+from weather_emoji import get_weather_summary, get_weather_condition_emoji
+from weather_providers.weather_provider_strategy import WeatherData
+from wind_direction_emoji import get_wind_direction_emoji
+
+# {field which must be set to show the line: line}, '<name>' placeholders are WeatherData fields or names formatted
+# by 'get_rendered_values'
+WEATHER_DODY_TEMPLATE_DICT = {
+    "timestamp": "<b>Погода на:</b> \t<date>\n==================================",
+    "weather_condition": "<b>Погода</b>:\t<weather_emoji>\t<weather_summary>",
+    "temperature": "<b>Температура повітря</b>:\t<temperature> С°",
+    "max_temperature": "<b>Максимальна температура повітря</b>:\t<max_temperature> С°",
+    "min_temperature": "<b>Мінімальна температура повітря</b>:\t<min_temperature> С°",
+    "wind_speed": "<b>Швидкість вітру</b>:\t<wind_speed> м/с\t<wind_direction>",
+    "pressure": "<b>Атмосферний тиск</b>:\t<pressure> мм рт.ст.",
+    "precipitation": "<b>Опади</b>:\t<precipitation> мм",
+    "humidity": "<b>Відносна вологість </b>:\t<humidity> %",
+    "sunrise": "<b>Схід сонця</b>: <sunrise>",
+    "sunset": "<b>Захід сонця</b>: <sunset>",
+}
+WEATHER_BODY_TEMPLATE_DICT_EN = {
+    "timestamp": "<b>Weather for:</b> \t<date>\n==================================",
+    "weather_condition": "<b>Weather</b>:\t<weather_emoji>\t<weather_summary>",
+    "temperature": "<b>Air temperature</b>:\t<temperature> °C",
+    "max_temperature": "<b>Max air temperature</b>:\t<max_temperature> °C",
+    "min_temperature": "<b>Min air temperature</b>:\t<min_temperature> °C",
+    "wind_speed": "<b>Wind speed</b>:\t<wind_speed> m/s\t<wind_direction>",
+    "pressure": "<b>Atmospheric pressure</b>:\t<pressure> mmHg",
+    "precipitation": "<b>Precipitation</b>:\t<precipitation> mm",
+    "humidity": "<b>Relative humidity</b>:\t<humidity> %",
+    "sunrise": "<b>Sunrise</b>: <sunrise>",
+    "sunset": "<b>Sunset</b>: <sunset>",
+}
+WEATHER_BODY_SEPARATOR = "=================================="
+FRESHNESS_MARKER_TEXT = {"uk": "Дані станом на", "en": "Data as of"}
+
+DEFAULT_LANGUAGE = "uk"
+# user 'language' option (flag chosen in settings) to output language
+USER_LANGUAGE_OPTIONS = {GeneralEmojis.UA_FLAG.value: "uk", GeneralEmojis.US_FLAG.value: "en"}
+
+
+# layouts differ in date format: current weather is shown for observation time, forecasts - for the day. Formats
+# are %-style ones over leading 'time.struct_time' items, which is several times faster than datetime.strftime
+CURRENT_LAYOUT = "current"
+DAILY_LAYOUT = "daily"
+DATE_FORMATS = {CURRENT_LAYOUT: "%d-%02d-%02d %02d:%02d", DAILY_LAYOUT: "%d-%02d-%02d"}
+TIME_FORMAT = "%d-%02d-%02d %02d:%02d:%02d"
+
+
+def get_timestamp_formatter(time_format: str) -> Callable[[int], str]:
+    """Returns function formatting epoch timestamp in local time with 'time_format' (year, month, day, hour,
+    minute, second - as many of them as the format has)."""
+    items_count = time_format.count("%")
+    return lambda timestamp: time_format % time.localtime(timestamp)[:items_count]
+
+
+def get_rendered_values(language: str, layout: str) -> Dict[str, Tuple[str, Callable[[Any], str]]]:
+    """Returns {placeholder: (WeatherData field, function formatting its value)} for language and layout,
+    fields without formatter are rendered as is."""
+    return {
+        "date": ("timestamp", get_timestamp_formatter(DATE_FORMATS[layout])),
+        "weather_emoji": ("weather_condition", get_weather_condition_emoji),
+        "weather_summary": ("weather_condition", partial(get_weather_summary, language=language)),
+        "temperature": ("temperature", math_round),
+        "max_temperature": ("max_temperature", math_round),
+        "min_temperature": ("min_temperature", math_round),
+        "wind_direction": ("wind_direction", get_wind_direction_emoji),
+        "pressure": ("pressure", hpa_to_mm_hg_converter),
+        "sunrise": ("sunrise", get_timestamp_formatter(TIME_FORMAT)),
+        "sunset": ("sunset", get_timestamp_formatter(TIME_FORMAT)),
+    }
+
+
+class WeatherTemplate:
+    """Weather output template compiled from {field name: line} dict. Line is rendered only if its field is set,
+    '<name>' placeholders are substituted with weather data fields, formatted with 'rendered_values' functions if
+    placeholder has one.
+
+    Lines of every combination of set fields met are compiled into one bound 'str.format' of the whole record, so
+    rendering a record is a single format call over the values its formatters return."""
+
+    def __init__(self, template_dict: Dict[str, str],
+                 rendered_values: Optional[Dict[str, Tuple[str, Callable[[Any], str]]]] = None):
+        self._template_dict = template_dict
+        self._rendered_values = rendered_values or {}
+        placeholder_names = {field.name for field in fields(WeatherData)} | set(self._rendered_values)
+        # only known names are placeholders, so HTML tags like <b> stay untouched
+        self._placeholder_pattern = re.compile(f"<({'|'.join(sorted(placeholder_names))})>")
+        self._get_line_fields = attrgetter(*template_dict)
+        self._compiled: Dict[Tuple[bool, ...], Tuple[Callable[..., str], Tuple[tuple, ...]]] = {}
+
+    def _compile(self, set_fields: Tuple[bool, ...]) -> Tuple[Callable[..., str], Tuple[tuple, ...]]:
+        formatters = []
+
+        def compile_placeholder(match: re.Match) -> str:
+            name = match.group(1)
+            if name not in self._rendered_values:
+                return f"{{0.{name}}}"
+            field_name, format_value = self._rendered_values[name]
+            formatters.append((attrgetter(field_name), format_value))
+            return f"{{{len(formatters)}}}"
+
+        # plain attributes are looked up by str.format itself, formatted values are passed as positional arguments
+        lines = "\n".join(line for line, is_set in zip(self._template_dict.values(), set_fields) if is_set)
+        record_format = self._placeholder_pattern.sub(compile_placeholder,
+                                                      lines.replace("{", "{{").replace("}", "}}"))
+        return record_format.format, tuple(formatters)
+
+    def render(self, weather_data: WeatherData) -> str:
+        """Returns rendered lines of the fields weather data has."""
+        set_fields = tuple(value is not None for value in self._get_line_fields(weather_data))
+        compiled = self._compiled.get(set_fields)
+        if compiled is None:
+            compiled = self._compiled[set_fields] = self._compile(set_fields)
+        render_record, formatters = compiled
+        return render_record(weather_data, *[format_value(get_value(weather_data))
+                                             for get_value, format_value in formatters])
+
+
+weather_body_templates = {
+    (language, layout): WeatherTemplate(template_dict, rendered_values=get_rendered_values(language, layout))
+    for language, template_dict in (("uk", WEATHER_DODY_TEMPLATE_DICT), ("en", WEATHER_BODY_TEMPLATE_DICT_EN))
+    for layout in DATE_FORMATS}
+
+
+def get_output_language(user_language: Optional[str]) -> str:
+    """Returns output language for user 'language' option, DEFAULT_LANGUAGE if option is not set or unknown."""
+    return USER_LANGUAGE_OPTIONS.get(user_language, DEFAULT_LANGUAGE)
+
+
+# rendered records per template and record values: forecast days and current weather of the cached data are rendered
+# once per language and layout, even if they are shown in several outputs
+rendered_records_cache = LRUTTLCache(max_size=WEATHER_RENDER_CACHE_SIZE, ttl=WEATHER_CACHE_TTL, name="rendered records")
+_get_record_values = attrgetter(*WeatherData.__slots__)
+
+
+def render_weather_record(weather_data: WeatherData, language: str, layout: str) -> str:
+    """Returns weather data record rendered with the template of 'language' and 'layout', memoized per record values."""
+    rendered_key = (language, layout, _get_record_values(weather_data))
+    timestamp = int(time.time())
+    rendered_record = rendered_records_cache.get(rendered_key, current_timestamp=timestamp)
+    if rendered_record is None:
+        rendered_record = weather_body_templates[(language, layout)].render(weather_data)
+        rendered_records_cache.set(rendered_key, rendered_record, timestamp=timestamp)
+    return rendered_record
+
+
+def render_weather_body(weather_data: Union[WeatherData, List[WeatherData]], language: str = DEFAULT_LANGUAGE) -> str:
+    """Returns HTML pre-formatted weather output body (without location header) in 'language'."""
+    if isinstance(weather_data, WeatherData):
+        return f"{render_weather_record(weather_data, language, CURRENT_LAYOUT)}\n{WEATHER_BODY_SEPARATOR}"
+    return "".join(f"{render_weather_record(item, language, DAILY_LAYOUT)}\n{WEATHER_BODY_SEPARATOR}\n\n"
+                   for item in weather_data)
+
+
+def render_weather_header(city_name: str) -> str:
+    return f"<b>** {city_name} **</b>\n"
+
+
+def render_freshness_marker(timestamp: int, language: str = DEFAULT_LANGUAGE) -> str:
+    return f"<i>{GeneralEmojis.WARNING.value} {FRESHNESS_MARKER_TEXT[language]} " \
+           f"{datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M')}</i>"
+
+
+def _sample_weather_data(day: int, temperature: Optional[float]) -> WeatherData:
+    timestamp = 1651708800 + day * 86400
+    return WeatherData(timestamp=timestamp, weather_condition="SUN_BEHIND_CLOUD", temperature=temperature,
+                       max_temperature=17.3, min_temperature=8.1, wind_speed=4.12, wind_direction=41, pressure=1016,
+                       precipitation=None, humidity=61, sunrise=timestamp + 11982, sunset=timestamp + 66067)
+
+
+# legacy template keys of the fields which replaced pre-formatted 'date' and 'weather_emoji' fields
+LEGACY_TEMPLATE_KEYS = {"timestamp": "date", "weather_condition": "weather_emoji"}
+
+
+def _preformat_legacy_weather_data(weather_data: WeatherData, language: str, layout: str) -> SimpleNamespace:
+    """Returns record of pre-formatted strings, the way providers produced them before weather data was cached
+    in numeric form, for the former rendering."""
+    rendered_values = get_rendered_values(language, layout)
+    legacy_data = {field.name: getattr(weather_data, field.name) for field in fields(WeatherData)}
+    for name, (field_name, format_value) in rendered_values.items():
+        value = getattr(weather_data, field_name)
+        legacy_data[name] = None if value is None else format_value(value)
+    del legacy_data["timestamp"], legacy_data["weather_condition"]
+    return SimpleNamespace(**legacy_data)
+
+
+def _render_with_replace(weather_data: Union[SimpleNamespace, List[SimpleNamespace]], language: str) -> str:
+    """Former rendering of pre-formatted records which replaces placeholders one by one over the whole output, kept
+    for benchmark only."""
+    template_dict = {LEGACY_TEMPLATE_KEYS.get(key, key): line for key, line in
+                     (WEATHER_DODY_TEMPLATE_DICT if language == "uk" else WEATHER_BODY_TEMPLATE_DICT_EN).items()}
+    final_string = ""
+    for item in weather_data if isinstance(weather_data, list) else [weather_data]:
+        weather_body_string = "\n".join(
+            v for k, v in template_dict.items() if item.__getattribute__(k) is not None)
+        for key, value in item.__dict__.items():
+            if key in weather_body_string:
+                weather_body_string = weather_body_string.replace(f"<{key}>", str(value))
+        if not isinstance(weather_data, list):
+            return f"{weather_body_string}\n{WEATHER_BODY_SEPARATOR}"
+        final_string += f"{weather_body_string}\n{WEATHER_BODY_SEPARATOR}\n\n"
+    return final_string
+
+
+def _percentiles(timings: List[float]) -> str:
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    return f"median {statistics.median(timings) * 1e6:.1f} us, p95 {p95 * 1e6:.1f} us"
+
+
+def _time_rendering(render: Callable[[], Any], repeat: int, before: Optional[Callable[[], Any]] = None) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        render()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def benchmark_rendering(repeat: int = 10000) -> None:
+    """Prints rendering latency per forecast type and language: of compiled templates without rendered records cache
+    ('cold'), with it ('cached') and of the former str.replace rendering of pre-formatted records ('str.replace')."""
+    samples = {
+        "CURRENT": _sample_weather_data(0, 12.4),
+        "TODAY": [_sample_weather_data(0, None)],
+        "FIVE_DAYS": [_sample_weather_data(day, None) for day in range(1, 6)],
+    }
+    for name, weather_data in samples.items():
+        layout = CURRENT_LAYOUT if isinstance(weather_data, WeatherData) else DAILY_LAYOUT
+        for language in ("uk", "en"):
+            legacy_data = _preformat_legacy_weather_data(weather_data, language, layout) \
+                if isinstance(weather_data, WeatherData) else \
+                [_preformat_legacy_weather_data(item, language, layout) for item in weather_data]
+            for timing_name, timings in (
+                    ("cold", _time_rendering(partial(render_weather_body, weather_data, language), repeat,
+                                             before=rendered_records_cache.clear)),
+                    ("cached", _time_rendering(partial(render_weather_body, weather_data, language), repeat)),
+                    ("str.replace", _time_rendering(partial(_render_with_replace, legacy_data, language), repeat))):
+                print(f"{name} {language} {timing_name}: {_percentiles(timings)}")
+            if render_weather_body(weather_data, language) != _render_with_replace(legacy_data, language):
+                print(f"{name} {language}: compiled and str.replace outputs differ!")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python weather_rendering.py", description="Weather rendering benchmark.")
+    parser.add_argument("--repeat", type=int, default=10000)
+    benchmark_rendering(parser.parse_args().repeat)
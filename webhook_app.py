@@ -0,0 +1,162 @@
+"""Contains aiohttp application which serves Telegram updates in webhook mode.
+
+Updates are accepted on WEBHOOK_PATH only with valid 'X-Telegram-Bot-Api-Secret-Token' header (if
+WEBHOOK_SECRET_TOKEN is set). Locally the app can be fed with recorded updates, e.g.:
+    BOT_MODE=webhook python main.py
+    curl -X POST localhost:8080/webhook -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET_TOKEN" -d @update.json
+"""
+
+import asyncio
+import hmac
+from typing import Awaitable, Callable, Optional
+
+from aiohttp import web
+from aiogram import Dispatcher
+from aiogram.bot import api
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from aiogram.dispatcher.webhook import WebhookRequestHandler, BOT_DISPATCHER_KEY
+from loguru import logger
+
+from config import WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN, WEBHOOK_HEALTH_PATH, WEBAPP_HOST, WEBAPP_PORT, \
+    WEBHOOK_DRAIN_TIMEOUT
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class UpdatesDrain:
+    """Counts updates being processed, so the app stops only after they are finished."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.draining = False
+        self._idle: Optional[asyncio.Event] = None
+
+    @property
+    def idle(self) -> asyncio.Event:
+        # created lazily, so it is bound to the loop the app runs in
+        if self._idle is None:
+            self._idle = asyncio.Event()
+            self._idle.set()
+        return self._idle
+
+    def start(self) -> None:
+        self.in_flight += 1
+        self.idle.clear()
+
+    def finish(self) -> None:
+        self.in_flight -= 1
+        if not self.in_flight:
+            self.idle.set()
+
+    async def drain(self, timeout: float = WEBHOOK_DRAIN_TIMEOUT) -> None:
+        """Stops accepting new updates and waits for ones in progress at most 'timeout' seconds."""
+        self.draining = True
+        # updates already passed to the dispatcher start being counted on their first step
+        await asyncio.sleep(0)
+        logger.info(f"Draining {self.in_flight} in-flight updates...")
+        try:
+            await asyncio.wait_for(self.idle.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.in_flight} updates are still processed after {timeout} seconds drain timeout.")
+
+
+updates_drain = UpdatesDrain()
+
+
+class UpdatesDrainMiddleware(BaseMiddleware):
+    """Counts update as in-flight from the moment dispatcher starts processing it until the processing task is done.
+
+    Webhook request handler responds to Telegram once processing takes longer than aiogram response timeout, but
+    dispatcher keeps processing the update in background, so it is counted at the dispatcher level rather than per
+    webhook request."""
+
+    def __init__(self, drain: UpdatesDrain):
+        super().__init__()
+        self._drain = drain
+
+    async def on_pre_process_update(self, update, data: dict) -> None:
+        self._drain.start()
+        # done callback finishes the update however processing ends, including cancellation by other middlewares
+        asyncio.current_task().add_done_callback(lambda _: self._drain.finish())
+
+
+def check_secret_token(request: web.Request) -> None:
+    """Raises HTTPUnauthorized if WEBHOOK_SECRET_TOKEN is set and request does not carry it."""
+    received_token = request.headers.get(SECRET_TOKEN_HEADER, "")
+    if WEBHOOK_SECRET_TOKEN and not hmac.compare_digest(received_token, WEBHOOK_SECRET_TOKEN):
+        logger.warning(f"Rejected webhook request with invalid secret token from '{request.remote}'.")
+        raise web.HTTPUnauthorized()
+
+
+class SecretTokenWebhookRequestHandler(WebhookRequestHandler):
+    """Webhook handler which rejects requests without valid secret token and new updates while draining."""
+
+    async def post(self):
+        check_secret_token(self.request)
+        if updates_drain.draining:
+            # Telegram keeps the update and retries it later
+            raise web.HTTPServiceUnavailable()
+        return await super().post()
+
+
+async def health_handler(request: web.Request) -> web.Response:
+    status = 503 if updates_drain.draining else 200
+    health = {"status": "draining" if updates_drain.draining else "ok", "in_flight": updates_drain.in_flight}
+    storage = request.app[BOT_DISPATCHER_KEY].storage
+    if hasattr(storage, "stats"):
+        health["fsm"] = storage.stats()
+    return web.json_response(health, status=status)
+
+
+async def register_webhook(dispatcher: Dispatcher) -> None:
+    """Points Telegram to WEBHOOK_URL together with secret token it should send with every update."""
+    if not WEBHOOK_URL:
+        logger.warning("WEBHOOK_URL is not set, webhook is not registered in Telegram.")
+        return
+    if not WEBHOOK_SECRET_TOKEN:
+        logger.warning("WEBHOOK_SECRET_TOKEN is not set, webhook requests are not authenticated.")
+    payload = {"url": f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}"}
+    if WEBHOOK_SECRET_TOKEN:
+        payload["secret_token"] = WEBHOOK_SECRET_TOKEN
+    await dispatcher.bot.request(api.Methods.SET_WEBHOOK, payload)
+    logger.info(f"Webhook is set to '{payload['url']}'.")
+
+
+def create_webhook_app(dispatcher: Dispatcher, on_startup: Callable[[Dispatcher], Awaitable],
+                       on_shutdown: Callable[[Dispatcher], Awaitable], register: bool = True) -> web.Application:
+    """Returns web application serving updates for the dispatcher. On stop it first drains in-flight updates, then
+    runs 'on_shutdown' callback, which closes dispatcher storage together with the application DB, and closes bot
+    session. Webhook is registered in Telegram on startup unless 'register' is False (worker processes behind
+    supervisor)."""
+    app = web.Application()
+    app[BOT_DISPATCHER_KEY] = dispatcher
+    dispatcher.middleware.setup(UpdatesDrainMiddleware(updates_drain))
+    app.router.add_route("*", WEBHOOK_PATH, SecretTokenWebhookRequestHandler)
+    app.router.add_get(WEBHOOK_HEALTH_PATH, health_handler)
+
+    async def _on_startup(_):
+        await on_startup(dispatcher)
+        if register:
+            await register_webhook(dispatcher)
+
+    async def _on_shutdown(_):
+        await updates_drain.drain()
+        await on_shutdown(dispatcher)
+        await (await dispatcher.bot.get_session()).close()
+
+    app.on_startup.append(_on_startup)
+    app.on_shutdown.append(_on_shutdown)
+    return app
+
+
+def run_webhook(dispatcher: Dispatcher, on_startup: Callable[[Dispatcher], Awaitable],
+                on_shutdown: Callable[[Dispatcher], Awaitable], path: Optional[str] = None,
+                register: bool = True) -> None:
+    """Serves webhook on WEBAPP_HOST:WEBAPP_PORT or on unix socket 'path' if it is provided."""
+    app = create_webhook_app(dispatcher, on_startup, on_shutdown, register)
+    if path:
+        logger.info(f"Serving webhook on unix socket '{path}'...")
+        web.run_app(app, path=path, shutdown_timeout=WEBHOOK_DRAIN_TIMEOUT, print=None)
+    else:
+        logger.info(f"Serving webhook on {WEBAPP_HOST}:{WEBAPP_PORT}{WEBHOOK_PATH}...")
+        web.run_app(app, host=WEBAPP_HOST, port=WEBAPP_PORT, shutdown_timeout=WEBHOOK_DRAIN_TIMEOUT, print=None)
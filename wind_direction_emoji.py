@@ -1,3 +1,5 @@
+from typing import Dict, List, Optional, Tuple
+
 WIND_DIRECTION_EMOJI = {
     "\U00002B06": [(338, 360), (0, 23)],
     "\U00002197": [(23, 68)],
@@ -8,21 +10,26 @@ WIND_DIRECTION_EMOJI = {
     "\U00002B05": [(248, 293)],
     "\U00002196": [(293, 338)]
 }
+UNKNOWN_WIND_DIRECTION_EMOJI = "\U0000262F"
+
+
+def compile_wind_direction_table(direction_ranges: Dict[str, List[Tuple[int, int]]]) -> Tuple[str, ...]:
+    """Returns 360 items table with emoji of every whole degree, degrees outside of given [start, end) ranges get
+    UNKNOWN_WIND_DIRECTION_EMOJI."""
+    table = [UNKNOWN_WIND_DIRECTION_EMOJI] * 360
+    for emoji, degree_ranges in direction_ranges.items():
+        for degree_range in degree_ranges:
+            for degree in range(*degree_range):
+                table[degree % 360] = emoji
+    return tuple(table)
 
 
-def check_presense(wind_direction, degree_range):
-    if wind_direction in range(*degree_range):
-        return True
-    return False
+WIND_DIRECTION_TABLE = compile_wind_direction_table(WIND_DIRECTION_EMOJI)
 
 
-def get_wind_direction_emoji(wind_direction):
-    if wind_direction is None:
-        return "\U0000262F"
-    for key, value in WIND_DIRECTION_EMOJI.items():
-        result = []
-        for item in value:
-            result.append(check_presense(wind_direction=wind_direction, degree_range=item))
-        if any(result):
-            return key
-    return "\U0000262F"
+def get_wind_direction_emoji(wind_direction: Optional[float]) -> str:
+    """Returns emoji of wind direction given in degrees (any real number, e.g. 359.6 or -10)."""
+    if wind_direction is None or wind_direction != wind_direction:
+        # None or NaN
+        return UNKNOWN_WIND_DIRECTION_EMOJI
+    return WIND_DIRECTION_TABLE[int(wind_direction % 360)]
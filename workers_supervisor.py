@@ -0,0 +1,172 @@
+"""Contains supervisor which runs several bot worker processes in webhook mode and routes every update to one of them
+by chat id, so conversation state of a chat always stays in the same worker.
+
+Supervisor accepts Telegram webhook requests on WEBAPP_HOST:WEBAPP_PORT and forwards them unchanged to workers
+listening on unix sockets, each worker runs its own event loop (see 'webhook_app.run_webhook').
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+from multiprocessing.process import BaseProcess
+from typing import Callable, List, Optional
+
+from aiogram import Dispatcher
+from aiohttp import web, ClientError, ClientSession, ClientTimeout, UnixConnector
+from loguru import logger
+
+from config import WEBAPP_HOST, WEBAPP_PORT, WEBHOOK_PATH, WEBHOOK_HEALTH_PATH, WEBHOOK_DRAIN_TIMEOUT, \
+    BOT_WORKER_START_TIMEOUT
+from webhook_app import UpdatesDrain, SECRET_TOKEN_HEADER, check_secret_token, register_webhook
+
+# Telegram waits for webhook response about a minute, workers answer within 55 seconds
+FORWARD_TIMEOUT = 60
+
+
+def get_update_chat_id(update: dict) -> int:
+    """Returns id of the chat update belongs to, id of the user for updates without chat (e.g. inline queries)."""
+    for value in update.values():
+        if not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        user = value.get("from") or value.get("user")
+        if user:
+            return user["id"]
+    return update.get("update_id", 0)
+
+
+def get_update_worker_index(update: dict, workers: int) -> int:
+    # chat id itself is a stable key, unlike str hash() which is randomized per process
+    return get_update_chat_id(update) % workers
+
+
+class WorkersSupervisor:
+    """Starts 'workers' processes running worker_target(index, socket_path), restarts the ones which died and
+    forwards webhook updates to them."""
+
+    def __init__(self, dispatcher: Dispatcher, workers: int, worker_target: Callable[[int, str], None]):
+        self._dispatcher = dispatcher
+        self._workers = workers
+        self._worker_target = worker_target
+        # workers must not inherit supervisor DB connections and threads
+        self._context = multiprocessing.get_context("spawn")
+        self._sockets_dir = tempfile.mkdtemp(prefix="weather-bot-")
+        self._processes: List[Optional[BaseProcess]] = [None] * workers
+        self._sessions: List[ClientSession] = []
+        self._drain = UpdatesDrain()
+        self._monitor_task: Optional[asyncio.Task] = None
+
+    def _socket_path(self, index: int) -> str:
+        return os.path.join(self._sockets_dir, f"worker-{index}.sock")
+
+    def _start_worker(self, index: int) -> None:
+        socket_path = self._socket_path(index)
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        process = self._context.Process(target=self._worker_target, args=(index, socket_path),
+                                        name=f"bot-worker-{index}")
+        process.start()
+        self._processes[index] = process
+        logger.info(f"Started bot worker {index} with pid {process.pid}.")
+
+    async def _wait_workers_ready(self) -> None:
+        deadline = asyncio.get_running_loop().time() + BOT_WORKER_START_TIMEOUT
+        while not all(os.path.exists(self._socket_path(index)) for index in range(self._workers)):
+            if asyncio.get_running_loop().time() > deadline:
+                raise RuntimeError(f"Bot workers did not start in {BOT_WORKER_START_TIMEOUT} seconds.")
+            await asyncio.sleep(0.1)
+
+    async def _monitor_workers(self) -> None:
+        while True:
+            await asyncio.sleep(1)
+            for index, process in enumerate(self._processes):
+                if not process.is_alive():
+                    logger.error(f"Bot worker {index} exited with code {process.exitcode}, restarting it...")
+                    self._start_worker(index)
+
+    async def forward_update(self, request: web.Request) -> web.Response:
+        check_secret_token(request)
+        if self._drain.draining:
+            raise web.HTTPServiceUnavailable()
+        body = await request.read()
+        try:
+            update = json.loads(body)
+        except ValueError:
+            raise web.HTTPBadRequest()
+        index = get_update_worker_index(update, self._workers)
+        headers = {"Content-Type": "application/json"}
+        if SECRET_TOKEN_HEADER in request.headers:
+            headers[SECRET_TOKEN_HEADER] = request.headers[SECRET_TOKEN_HEADER]
+        self._drain.start()
+        try:
+            async with self._sessions[index].post(f"http://worker-{index}{WEBHOOK_PATH}", data=body,
+                                                  headers=headers) as response:
+                return web.Response(body=await response.read(), status=response.status,
+                                    content_type=response.content_type)
+        except (ClientError, asyncio.TimeoutError) as err:
+            logger.error(f"Failed to forward update {update.get('update_id')} to bot worker {index}.\n{err}")
+            # Telegram retries the update later
+            raise web.HTTPServiceUnavailable()
+        finally:
+            self._drain.finish()
+
+    async def health(self, _: web.Request) -> web.Response:
+        workers_alive = [process is not None and process.is_alive() for process in self._processes]
+        if self._drain.draining:
+            status = "draining"
+        else:
+            status = "ok" if all(workers_alive) else "degraded"
+        return web.json_response({"status": status, "in_flight": self._drain.in_flight, "workers": workers_alive},
+                                 status=200 if status == "ok" else 503)
+
+    async def _on_startup(self, _) -> None:
+        for index in range(self._workers):
+            self._start_worker(index)
+        await self._wait_workers_ready()
+        timeout = ClientTimeout(total=FORWARD_TIMEOUT)
+        self._sessions = [ClientSession(connector=UnixConnector(path=self._socket_path(index)), timeout=timeout)
+                          for index in range(self._workers)]
+        self._monitor_task = asyncio.get_running_loop().create_task(self._monitor_workers())
+        await register_webhook(self._dispatcher)
+
+    async def _on_shutdown(self, _) -> None:
+        await self._drain.drain()
+        if self._monitor_task is not None:
+            self._monitor_task.cancel()
+        for session in self._sessions:
+            await session.close()
+        # every worker drains its own in-flight updates on SIGTERM
+        for process in self._processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        loop = asyncio.get_running_loop()
+        for index, process in enumerate(self._processes):
+            if process is None:
+                continue
+            await loop.run_in_executor(None, process.join, WEBHOOK_DRAIN_TIMEOUT + 5)
+            if process.is_alive():
+                logger.warning(f"Bot worker {index} did not stop in time, killing it...")
+                process.kill()
+        await (await self._dispatcher.bot.get_session()).close()
+        shutil.rmtree(self._sockets_dir, ignore_errors=True)
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(WEBHOOK_PATH, self.forward_update)
+        app.router.add_get(WEBHOOK_HEALTH_PATH, self.health)
+        app.on_startup.append(self._on_startup)
+        app.on_shutdown.append(self._on_shutdown)
+        return app
+
+
+def run_supervisor(dispatcher: Dispatcher, workers: int, worker_target: Callable[[int, str], None]) -> None:
+    """Serves webhook on WEBAPP_HOST:WEBAPP_PORT and routes updates between 'workers' worker processes."""
+    logger.info(f"Serving webhook on {WEBAPP_HOST}:{WEBAPP_PORT}{WEBHOOK_PATH} with {workers} bot workers...")
+    supervisor = WorkersSupervisor(dispatcher, workers, worker_target)
+    web.run_app(supervisor.create_app(), host=WEBAPP_HOST, port=WEBAPP_PORT,
+                shutdown_timeout=WEBHOOK_DRAIN_TIMEOUT, print=None)